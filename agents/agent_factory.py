@@ -4,6 +4,7 @@ from .flights_agent import FlightsAgent
 from .hotels_agent import HotelsAgent
 from .general_agent import GeneralAgent
 from .package_agent import PackageAgent
+from .request_parser import RequestParser
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("AgentFactory")
@@ -12,24 +13,34 @@ class AgentFactory:
     """Factory class for creating and managing agent instances."""
     
     @staticmethod
-    def create_agent_system():
+    def create_agent_system(providers=None, **master_options):
         """
         Create and initialize the complete agent system with a master agent
         and all specialized agents.
         
+        Args:
+            providers (dict, optional): Inventory providers keyed "flights"
+                and "hotels" (see agents.providers.create_providers);
+                defaults to the mock inventory
+            **master_options: Fan-out settings passed to MasterAgent
+                (max_workers, agent_timeout, total_budget)
+        
         Returns:
             MasterAgent: The master agent with all specialized agents registered
         """
         logger.info("Creating agent system")
         
-        # Create master agent
-        master_agent = MasterAgent()
-        
-        # Create specialized agents
-        flights_agent = FlightsAgent()
-        hotels_agent = HotelsAgent()
+        # Create specialized agents; the package agent reuses the flight and
+        # hotel agents rather than building its own
+        providers = providers or {}
+        flights_agent = FlightsAgent(providers.get("flights"))
+        hotels_agent = HotelsAgent(providers.get("hotels"))
         general_agent = GeneralAgent()
-        package_agent = PackageAgent()
+        package_agent = PackageAgent(flights_agent, hotels_agent)
+        
+        # Create master agent, which parses each request once for all agents
+        parser = RequestParser(flights_agent, hotels_agent, package_agent)
+        master_agent = MasterAgent(parser=parser, **master_options)
         
         # Register specialized agents with the master agent
         master_agent.register_agent("flights", flights_agent)
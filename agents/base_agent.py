@@ -1,9 +1,20 @@
+import asyncio
+from .intent_router import IntentRouter
+
 class BaseAgent:
-    """Base class for all agents in the Rahalah system."""
+    """
+    Base class for all agents in the Rahalah system.
+    
+    Agents are stateless and shared across requests and threads; any
+    per-conversation state is passed in through ``context``.
+    """
+    
+    # Agents that read the shared ParsedRequest; the master agent only
+    # parses a request when one of them is selected
+    uses_parsed_request = False
     
     def __init__(self, name):
         self.name = name
-        self.context = {}
     
     def process_request(self, request, context=None):
         """
@@ -11,17 +22,53 @@ class BaseAgent:
         
         Args:
             request (str): The user's request text
-            context (dict, optional): Additional context information
+            context (dict, optional): Per-request context information
             
         Returns:
             dict: The agent's response
         """
-        if context:
-            self.context.update(context)
-        
         # This method should be implemented by all subclasses
         raise NotImplementedError("Subclasses must implement process_request")
     
+    @staticmethod
+    def parsed_request(context):
+        """
+        Return the ParsedRequest the master agent shared for this request.
+        
+        Args:
+            context (dict, optional): The context passed to process_request
+            
+        Returns:
+            ParsedRequest: The shared parse, or None when called without one
+        """
+        return context.get("parsed_request") if context else None
+    
+    async def aprocess_request(self, request, context=None):
+        """
+        Awaitable version of process_request.
+        
+        The default runs process_request in a worker thread so CPU-bound or
+        blocking agents never stall the event loop; agents that perform
+        native async I/O can override it.
+        
+        Returns:
+            dict: The agent's response
+        """
+        return await asyncio.to_thread(self.process_request, request, context)
+    
+    def routing_signals(self):
+        """
+        Describe the keyword, city and pattern signals used to score requests.
+        
+        Agents that return signals are scored by the master agent's
+        IntentRouter in one shared scan; agents that return None must
+        override can_handle instead.
+        
+        Returns:
+            RoutingSignals: The agent's scoring rules, or None
+        """
+        return None
+    
     def can_handle(self, request):
         """
         Determine if this agent can handle the given request.
@@ -32,5 +79,12 @@ class BaseAgent:
         Returns:
             float: Confidence score between 0.0 and 1.0
         """
-        # This method should be implemented by all subclasses
-        raise NotImplementedError("Subclasses must implement can_handle")
+        router = self.__dict__.get('_router')
+        if router is None:
+            if self.routing_signals() is None:
+                # Subclasses must either provide routing signals or override this method
+                raise NotImplementedError("Subclasses must implement can_handle")
+            router = IntentRouter()
+            router.register(self.name, self)
+            self._router = router
+        return router.score(request)[self.name]
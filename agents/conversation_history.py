@@ -0,0 +1,156 @@
+import sys
+import time
+
+
+class Turn:
+    """A single conversation turn stored compactly."""
+
+    __slots__ = ('role', 'content', 'created_at')
+
+    def __init__(self, role, content, created_at):
+        self.role = role
+        self.content = content
+        self.created_at = created_at
+
+    def to_dict(self):
+        """Return the turn in the ``{"role", "content"}`` message format."""
+        return {"role": self.role, "content": self.content}
+
+    def __repr__(self):
+        return f"Turn({self.role!r}, {self.content!r})"
+
+
+def summarize_turns(summary, turns, max_items=5, max_length=80):
+    """
+    Default compaction hook: keep a short digest of the user's requests.
+
+    Args:
+        summary (str): The previous summary, or None
+        turns (list): The Turn records being compacted, oldest first
+        max_items (int): Maximum number of requests kept in the digest
+        max_length (int): Maximum characters kept per request
+
+    Returns:
+        str: The new summary
+    """
+    items = summary[len("Earlier requests: "):].split(" | ") if summary else []
+    for turn in turns:
+        if turn.role == "user":
+            content = turn.content
+            items.append(content if len(content) <= max_length else content[:max_length - 3] + "...")
+    return "Earlier requests: " + " | ".join(items[-max_items:])
+
+
+class ConversationHistory:
+    """
+    Fixed-capacity ring buffer of conversation turns.
+
+    Once ``capacity`` turns are stored, each new turn replaces the oldest.
+    If a ``compactor`` is set, the oldest ``compact_batch`` turns are instead
+    collapsed into a single summary record (role ``"summary"``) that is kept
+    ahead of the regular turns.
+
+    Assistant replies are mostly repeated boilerplate (greetings, apologies,
+    prompts for missing details), so they are interned by default and every
+    session shares one copy of each string.
+    """
+
+    SUMMARY_ROLE = "summary"
+
+    def __init__(self, capacity=50, compactor=None, compact_batch=None, intern_assistant=True):
+        """
+        Args:
+            capacity (int): Maximum number of regular turns kept
+            compactor (callable, optional): ``compactor(summary, turns) -> str``
+                that folds the oldest turns into the running summary
+            compact_batch (int, optional): Turns compacted at a time
+                (default: half the capacity)
+            intern_assistant (bool): Intern assistant replies
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.compactor = compactor
+        self.compact_batch = max(1, min(compact_batch or capacity // 2 or 1, capacity))
+        self.intern_assistant = intern_assistant
+        self.summary = None
+        self._turns = [None] * capacity
+        self._head = 0
+        self._size = 0
+
+    def append(self, role, content):
+        """
+        Add a turn, compacting or dropping the oldest turns when full.
+
+        Args:
+            role (str): "user" or "assistant"
+            content (str): The message text
+        """
+        if self._size == self.capacity:
+            if self.compactor is not None:
+                self._compact(self.compact_batch)
+            else:
+                self._drop(1)
+
+        role = sys.intern(role)
+        if self.intern_assistant and role == "assistant" and type(content) is str:
+            content = sys.intern(content)
+
+        self._turns[(self._head + self._size) % self.capacity] = Turn(role, content, time.time())
+        self._size += 1
+
+    def _drop(self, count):
+        """Remove the ``count`` oldest turns and return them."""
+        dropped = []
+        for _ in range(min(count, self._size)):
+            dropped.append(self._turns[self._head])
+            self._turns[self._head] = None
+            self._head = (self._head + 1) % self.capacity
+            self._size -= 1
+        return dropped
+
+    def _compact(self, count):
+        """Fold the ``count`` oldest turns into the summary record."""
+        turns = self._drop(count)
+        previous = self.summary.content if self.summary is not None else None
+        content = self.compactor(previous, turns)
+        self.summary = Turn(self.SUMMARY_ROLE, content, turns[-1].created_at)
+
+    def turns(self):
+        """Return the regular turns, oldest first."""
+        return [self._turns[(self._head + i) % self.capacity] for i in range(self._size)]
+
+    def __iter__(self):
+        if self.summary is not None:
+            yield self.summary
+        for turn in self.turns():
+            yield turn
+
+    def __len__(self):
+        return self._size
+
+    def to_list(self):
+        """Return the history, summary first, in the ``{"role", "content"}`` message format."""
+        return [turn.to_dict() for turn in self]
+
+    def clear(self):
+        """Remove all turns and the summary."""
+        self._turns = [None] * self.capacity
+        self._head = 0
+        self._size = 0
+        self.summary = None
+
+    def memory_usage(self):
+        """
+        Approximate the memory held by this history in bytes.
+
+        Interned assistant strings are shared between sessions and counted
+        here in full, so the figure is an upper bound.
+
+        Returns:
+            int: Bytes used by the buffer, the turn records and their content
+        """
+        total = sys.getsizeof(self._turns)
+        for turn in self:
+            total += sys.getsizeof(turn) + sys.getsizeof(turn.content)
+        return total
@@ -0,0 +1,450 @@
+import re
+import bisect
+import calendar
+from datetime import date, timedelta
+from .gazetteer import normalize_name
+from .extraction_patterns import register
+
+# Every table below is built once at import, so parsing a message is one
+# regex scan plus dictionary lookups and integer arithmetic on ordinals;
+# nothing goes through strptime.
+
+_ARABIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+
+GREGORIAN_MONTHS = {
+    "january": 1, "jan": 1, "february": 2, "feb": 2, "march": 3, "mar": 3,
+    "april": 4, "apr": 4, "may": 5, "june": 6, "jun": 6, "july": 7, "jul": 7,
+    "august": 8, "aug": 8, "september": 9, "sept": 9, "sep": 9,
+    "october": 10, "oct": 10, "november": 11, "nov": 11, "december": 12, "dec": 12,
+    # Arabic, as used in Egypt and the Gulf
+    "يناير": 1, "فبراير": 2, "مارس": 3, "أبريل": 4, "إبريل": 4, "مايو": 5,
+    "يونيو": 6, "يونيه": 6, "يوليو": 7, "يوليه": 7, "أغسطس": 8, "سبتمبر": 9,
+    "أكتوبر": 10, "نوفمبر": 11, "ديسمبر": 12,
+    # Arabic, as used in the Levant and Iraq
+    "كانون الثاني": 1, "شباط": 2, "آذار": 3, "نيسان": 4, "أيار": 5, "حزيران": 6,
+    "تموز": 7, "أيلول": 9, "تشرين الأول": 10, "تشرين الثاني": 11, "كانون الأول": 12,
+}
+
+HIJRI_MONTHS = {
+    "muharram": 1, "safar": 2,
+    "rabi al-awwal": 3, "rabi al awwal": 3, "rabi ul awwal": 3, "rabi i": 3,
+    "rabi al-thani": 4, "rabi al thani": 4, "rabi al-akhir": 4, "rabi ul akhir": 4, "rabi ii": 4,
+    "jumada al-ula": 5, "jumada al-awwal": 5, "jumada al ula": 5, "jumada i": 5,
+    "jumada al-akhirah": 6, "jumada al-thani": 6, "jumada al akhirah": 6, "jumada ii": 6,
+    "rajab": 7, "shaban": 8, "sha'ban": 8, "ramadan": 9, "ramadhan": 9, "shawwal": 10,
+    "dhu al-qadah": 11, "dhul qadah": 11, "dhul-qadah": 11, "dhu al-qa'dah": 11, "dhu al qadah": 11,
+    "dhu al-hijjah": 12, "dhul hijjah": 12, "dhul-hijjah": 12, "dhu al hijjah": 12,
+    "محرم": 1, "صفر": 2, "ربيع الأول": 3, "ربيع الثاني": 4, "ربيع الآخر": 4,
+    "جمادى الأولى": 5, "جمادى الآخرة": 6, "جمادى الثانية": 6, "رجب": 7, "شعبان": 8,
+    "رمضان": 9, "شوال": 10, "ذو القعدة": 11, "ذو الحجة": 12,
+}
+
+WEEKDAYS = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4, "saturday": 5, "sunday": 6,
+    "الاثنين": 0, "الإثنين": 0, "الثلاثاء": 1, "الأربعاء": 2, "الخميس": 3, "الجمعة": 4, "السبت": 5, "الأحد": 6,
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "couple of": 2, "a couple of": 2,
+    "واحد": 1, "ثلاث": 3, "ثلاثة": 3, "أربع": 4, "أربعة": 4, "خمس": 5, "خمسة": 5, "ست": 6, "ستة": 6,
+    "سبع": 7, "سبعة": 7, "ثماني": 8, "ثمانية": 8, "تسع": 9, "تسعة": 9, "عشر": 10, "عشرة": 10,
+}
+
+# Words after "May 2" showing the number is a count, not a day
+_NOT_A_DAY = r"(?!\s*(?:adults?|people|persons?|guests?|travell?ers?|kids?|child(?:ren)?|nights?|days?|weeks?|stars?)\b)"
+
+# Unit -> (days, months); Arabic duals such as "يومين" carry their count
+UNITS = {
+    "day": (1, 0), "days": (1, 0), "night": (1, 0), "nights": (1, 0),
+    "week": (7, 0), "weeks": (7, 0), "month": (0, 1), "months": (0, 1),
+    "يوم": (1, 0), "أيام": (1, 0), "ليلة": (1, 0), "ليال": (1, 0), "ليالي": (1, 0),
+    "أسبوع": (7, 0), "أسابيع": (7, 0), "شهر": (0, 1), "أشهر": (0, 1), "شهور": (0, 1),
+    "يومين": (2, 0), "ليلتين": (2, 0), "أسبوعين": (14, 0), "شهرين": (0, 2),
+}
+
+# Words introducing an offset from today ("in 3 days") or a length of stay
+OFFSET_WORDS = ("بعد",)
+DURATION_WORDS = ("لمدة",)
+NIGHTS = ("night", "nights", "ليلة", "ليال", "ليالي")
+
+# Relative day words -> (days from today, nights implied for a stay)
+RELATIVE_DAYS = {
+    "today": (0, 1), "tonight": (0, 1), "tomorrow": (1, None), "day after tomorrow": (2, None),
+    "next week": (7, None),
+    "اليوم": (0, 1), "الليلة": (0, 1), "غدا": (1, None), "غداً": (1, None), "بكرة": (1, None),
+    "بعد غد": (2, None), "بعد بكرة": (2, None),
+    "الأسبوع القادم": (7, None), "الأسبوع المقبل": (7, None),
+}
+NEXT_MONTH = ("next month", "الشهر القادم", "الشهر المقبل")
+WEEKEND = ("this weekend", "next weekend", "weekend", "نهاية الأسبوع", "الويكند")
+
+RANGE_CONNECTORS = ("to", "until", "till", "through", "thru", "and", "-", "–", "—", "إلى", "الى", "حتى", "لغاية")
+RETURN_MARKERS = ("return", "returning", "back", "coming back", "العودة", "عودة", "والعودة", "الرجوع", "رجوع")
+
+# Tabular Islamic calendar (30-year cycle); it can differ from the Umm
+# al-Qura calendar by a day, which is close enough for a travel search.
+# First day of every month from HIJRI_FIRST_YEAR, as proleptic Gregorian
+# ordinals, so conversions are a list index or a bisection.
+HIJRI_FIRST_YEAR = 1350
+HIJRI_LAST_YEAR = 1550
+_HIJRI_EPOCH = 227015  # date(622, 7, 19).toordinal(): 1 Muharram 1 AH
+
+
+def _hijri_month_start(year, month):
+    return (_HIJRI_EPOCH - 1 + (29 * (month - 1) + month // 2) + (year - 1) * 354
+            + (3 + 11 * year) // 30 + 1)
+
+
+_HIJRI_MONTH_STARTS = [
+    _hijri_month_start(year, month)
+    for year in range(HIJRI_FIRST_YEAR, HIJRI_LAST_YEAR + 2)
+    for month in range(1, 13)
+]
+
+
+def _normalize(text):
+    """Lowercase, fold Arabic letter variants and convert Arabic-Indic digits."""
+    return normalize_name(text).translate(_ARABIC_DIGITS)
+
+
+_SEPARATOR = re.compile(r"\\[ \-]")
+
+
+def _alternation(names):
+    """Regex alternation of normalized names, longest first, tolerant of spacing and hyphens."""
+    variants = sorted({_normalize(name) for name in names}, key=len, reverse=True)
+    return "|".join(_SEPARATOR.sub(r"[\\s\\-]+", re.escape(name)) for name in variants)
+
+
+def _lookup(table):
+    """Normalized-name lookup table with single spaces."""
+    return {" ".join(_normalize(name).replace("-", " ").split()): value for name, value in table.items()}
+
+
+_GREGORIAN = _lookup(GREGORIAN_MONTHS)
+_HIJRI = _lookup(HIJRI_MONTHS)
+_WEEKDAYS = _lookup(WEEKDAYS)
+_NUMBERS = _lookup(NUMBER_WORDS)
+_UNITS = _lookup(UNITS)
+_RELATIVE = _lookup(RELATIVE_DAYS)
+_NEXT_MONTH = {_normalize(word) for word in NEXT_MONTH}
+_CONNECTORS = {_normalize(word) for word in RANGE_CONNECTORS}
+
+_MONTH = _alternation(GREGORIAN_MONTHS)
+_HMONTH = _alternation(HIJRI_MONTHS)
+_DAY = r"(?:[12]\d|3[01]|0?[1-9])(?:st|nd|rd|th)?"
+_COUNT = r"\d{1,3}|" + _alternation(NUMBER_WORDS)
+_UNIT = _alternation(UNITS)
+_YEAR = r"\d{4}"
+_THROUGH = r"(?:\s*[-–]\s*|\s+(?:to|until|till|through|" + _alternation(("إلى", "حتى")) + r")\s+)"
+_HIJRI_SUFFIX = r"(?:\s*(?:ah|a\.h\.|هـ|ه)\b)?"
+
+# One alternation over every date expression; each alternative has its own
+# group names so a single finditer pass yields typed, pre-split matches.
+# Every expression starts a word, and checking that first lets the scan
+# skip the middle of words without trying each alternative there
+DATE_EXPRESSION = register("dates.expression", r"(?<!\w)(?:" + "|".join([
+    rf"(?P<iso>\b(?P<iso_y>\d{{4}})-(?P<iso_m>\d{{1,2}})-(?P<iso_d>\d{{1,2}})\b)",
+    rf"(?P<num>\b(?P<num_d>\d{{1,2}})/(?P<num_m>\d{{1,2}})(?:/(?P<num_y>\d{{4}}|\d{{2}}))?\b)",
+    rf"(?P<hdm>\b(?P<hdm_d>{_DAY})(?:\s+of)?\s+(?P<hdm_m>{_HMONTH})(?:,?\s+(?P<hdm_y>1[3-5]\d\d))?{_HIJRI_SUFFIX}(?!\w))",
+    rf"(?P<hmd>\b(?P<hmd_m>{_HMONTH})\s+(?P<hmd_d>{_DAY})(?:,?\s+(?P<hmd_y>1[3-5]\d\d))?{_HIJRI_SUFFIX}(?!\w))",
+    rf"(?P<dmr>\b(?P<dmr_d1>{_DAY}){_THROUGH}(?P<dmr_d2>{_DAY})\s+(?:of\s+)?(?P<dmr_m>{_MONTH})(?:,?\s+(?P<dmr_y>{_YEAR}))?(?!\w))",
+    rf"(?P<mdr>\b(?P<mdr_m>{_MONTH})\.?\s+(?P<mdr_d1>{_DAY}){_THROUGH}(?P<mdr_d2>{_DAY})(?:,?\s+(?P<mdr_y>{_YEAR}))?(?!\w))",
+    rf"(?P<dm>\b(?P<dm_d>{_DAY})(?:\s+of)?\s+(?P<dm_m>{_MONTH})(?:,?\s+(?P<dm_y>{_YEAR}))?(?!\w))",
+    rf"(?P<md>\b(?P<md_m>{_MONTH})\.?\s+(?P<md_d>{_DAY}){_NOT_A_DAY}(?:,?\s+(?P<md_y>{_YEAR}))?(?!\w))",
+    rf"(?P<off>(?<!\w)(?:in|{_alternation(OFFSET_WORDS)})\s+(?P<off_n>{_COUNT})?\s*(?P<off_u>{_UNIT})(?!\w))",
+    rf"(?P<dur>(?<!\w)(?:for|{_alternation(DURATION_WORDS)})\s+(?P<dur_n>{_COUNT})?\s*(?P<dur_u>{_UNIT})(?!\w))",
+    rf"(?P<ngt>\b(?P<ngt_n>\d{{1,2}}|{_alternation(NUMBER_WORDS)})\s+(?P<ngt_u>{_alternation(NIGHTS)})(?!\w))",
+    rf"(?P<nm>(?<!\w)(?:{_alternation(NEXT_MONTH)})(?!\w))",
+    rf"(?P<wkd>(?<!\w)(?:{_alternation(WEEKEND)})(?!\w))",
+    rf"(?P<rel>(?<!\w)(?P<rel_w>{_alternation(RELATIVE_DAYS)})(?!\w))",
+    rf"(?P<wd>(?<!\w)(?P<wd_next>next\s+)?(?:يوم\s+)?(?P<wd_w>{_alternation(WEEKDAYS)})(?!\w))",
+]) + ")")
+
+_RETURN_BEFORE = re.compile(
+    rf"(?<!\w)(?:{_alternation(RETURN_MARKERS)})\s*(?:on|in|at|by|في|يوم)?\s*$"
+)
+
+
+def _key(text):
+    return " ".join(text.replace("-", " ").split())
+
+
+def add_months(day, months):
+    """Add calendar months, clamping to the last day of the month (Jan 31 + 1 month = Feb 28/29)."""
+    month_index = day.month - 1 + months
+    year = day.year + month_index // 12
+    month = month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def hijri_to_gregorian(year, month, day):
+    """
+    Convert a Hijri date to a Gregorian date with the tabular Islamic calendar.
+
+    Returns:
+        date: The Gregorian date, or None if out of range or invalid
+    """
+    if not HIJRI_FIRST_YEAR <= year <= HIJRI_LAST_YEAR or not 1 <= month <= 12:
+        return None
+    index = (year - HIJRI_FIRST_YEAR) * 12 + month - 1
+    start = _HIJRI_MONTH_STARTS[index]
+    if not 1 <= day <= _HIJRI_MONTH_STARTS[index + 1] - start:
+        return None
+    return date.fromordinal(start + day - 1)
+
+
+def gregorian_to_hijri_year(day):
+    """Return the Hijri year containing a Gregorian date, or None if out of range."""
+    index = bisect.bisect_right(_HIJRI_MONTH_STARTS, day.toordinal()) - 1
+    if index < 0 or index >= len(_HIJRI_MONTH_STARTS) - 12:
+        return None
+    return HIJRI_FIRST_YEAR + index // 12
+
+
+def _day_number(text):
+    return int(text.rstrip("stndrh"))
+
+
+def _count(text):
+    if not text:
+        return 1
+    return int(text) if text.isdigit() else _NUMBERS.get(_key(text), 1)
+
+
+def _gregorian(year, month, day, today):
+    """Build a date; without a year, the next occurrence on or after today."""
+    try:
+        if year is not None:
+            return date(year, month, day), True
+        candidate = date(today.year, month, day)
+        if candidate < today:
+            candidate = date(today.year + 1, month, day)
+        return candidate, False
+    except ValueError:
+        return None, False
+
+
+def _hijri(year, month, day, today):
+    """Build a Hijri date; without a year, the next occurrence on or after today."""
+    if year is not None:
+        return hijri_to_gregorian(year, month, day), True
+    current = gregorian_to_hijri_year(today)
+    if current is None:
+        return None, False
+    for candidate_year in (current, current + 1):
+        candidate = hijri_to_gregorian(candidate_year, month, day)
+        if candidate is not None and candidate >= today:
+            return candidate, False
+    return None, False
+
+
+class DateMention:
+    """
+    One date expression found in a message.
+
+    Attributes:
+        start (int): Offset of the expression in the message
+        end (int): Offset just past the expression
+        kind (str): "date", "range", "offset" or "duration"
+        first (date): The date, or the first day of a range
+        last (date): The last day of a range, or None
+        days (int): Days of an offset or duration
+        months (int): Months of an offset or duration
+        nights (int): Nights a stay starting then implies (tonight: 1,
+            weekend: 2), or None
+        explicit_year (bool): Whether the year was written out
+    """
+
+    __slots__ = ('start', 'end', 'kind', 'first', 'last', 'days', 'months', 'nights', 'explicit_year')
+
+    def __init__(self, start, end, kind, first=None, last=None, days=0, months=0, nights=None,
+                 explicit_year=False):
+        self.start = start
+        self.end = end
+        self.kind = kind
+        self.first = first
+        self.last = last
+        self.days = days
+        self.months = months
+        self.nights = nights
+        self.explicit_year = explicit_year
+
+    def shift(self, anchor):
+        """Apply an offset or duration to a date."""
+        return add_months(anchor, self.months) + timedelta(days=self.days)
+
+    def __repr__(self):
+        return f"DateMention({self.kind!r}, {self.first}, {self.last}, days={self.days}, months={self.months})"
+
+
+class TravelDates:
+    """
+    The dates of a trip described in a message.
+
+    Attributes:
+        start (date): Departure or check-in date, or None
+        end (date): Return or check-out date when one was given as a range,
+            a duration or a "returning ..." phrase, or None
+        nights (int): Length of stay when stated or implied, or None
+        round_trip (bool): Whether a return was mentioned
+        mentions (tuple): Every DateMention found, in text order
+    """
+
+    __slots__ = ('start', 'end', 'nights', 'round_trip', 'mentions')
+
+    def __init__(self, start=None, end=None, nights=None, round_trip=False, mentions=()):
+        self.start = start
+        self.end = end
+        self.nights = nights
+        self.round_trip = round_trip
+        self.mentions = mentions
+
+    def __repr__(self):
+        return f"TravelDates(start={self.start}, end={self.end}, nights={self.nights}, round_trip={self.round_trip})"
+
+
+def find_dates(text, today):
+    """
+    Find every date expression in a message.
+
+    Args:
+        text (str): Normalized message text (see parse_dates)
+        today (date): Anchor for relative expressions
+
+    Returns:
+        list: DateMention records in text order
+    """
+    mentions = []
+    for match in DATE_EXPRESSION.finditer(text):
+        kind = match.lastgroup
+        group = match.group
+        start, end = match.span()
+        if kind == "iso" or kind == "num":
+            # Numeric dates are day first, as written across the region
+            year = group(f"{kind}_y")
+            year = int(year) if year else None
+            if year is not None and year < 100:
+                year += 2000
+            first, explicit = _gregorian(year, int(group(f"{kind}_m")), int(group(f"{kind}_d")), today)
+            if first is not None:
+                mentions.append(DateMention(start, end, "date", first, explicit_year=explicit))
+        elif kind in ("dm", "md"):
+            year = group(f"{kind}_y")
+            first, explicit = _gregorian(int(year) if year else None, _GREGORIAN[_key(group(f"{kind}_m"))],
+                                         _day_number(group(f"{kind}_d")), today)
+            if first is not None:
+                mentions.append(DateMention(start, end, "date", first, explicit_year=explicit))
+        elif kind in ("dmr", "mdr"):
+            year = group(f"{kind}_y")
+            month = _GREGORIAN[_key(group(f"{kind}_m"))]
+            first, explicit = _gregorian(int(year) if year else None, month, _day_number(group(f"{kind}_d1")), today)
+            if first is not None:
+                try:
+                    last = first.replace(day=_day_number(group(f"{kind}_d2")))
+                except ValueError:
+                    last = None
+                if last is not None and last > first:
+                    mentions.append(DateMention(start, end, "range", first, last, explicit_year=explicit))
+                else:
+                    mentions.append(DateMention(start, end, "date", first, explicit_year=explicit))
+        elif kind in ("hdm", "hmd"):
+            year = group(f"{kind}_y")
+            first, explicit = _hijri(int(year) if year else None, _HIJRI[_key(group(f"{kind}_m"))],
+                                     _day_number(group(f"{kind}_d")), today)
+            if first is not None:
+                mentions.append(DateMention(start, end, "date", first, explicit_year=explicit))
+        elif kind in ("off", "dur", "ngt"):
+            count = _count(group(f"{kind}_n"))
+            days, months = _UNITS[_key(group(f"{kind}_u"))]
+            mentions.append(DateMention(start, end, "offset" if kind == "off" else "duration",
+                                        days=days * count, months=months * count))
+        elif kind == "rel":
+            days, nights = _RELATIVE[_key(group("rel_w"))]
+            mentions.append(DateMention(start, end, "date", today + timedelta(days=days), nights=nights))
+        elif kind == "nm":
+            mentions.append(DateMention(start, end, "date", add_months(today, 1)))
+        elif kind == "wkd":
+            # The coming Saturday, or next week's if today is Saturday
+            days_until_saturday = (5 - today.weekday()) % 7 or 7
+            mentions.append(DateMention(start, end, "date", today + timedelta(days=days_until_saturday), nights=2))
+        elif kind == "wd":
+            days_ahead = (_WEEKDAYS[_key(group("wd_w"))] - today.weekday()) % 7
+            if group("wd_next") and days_ahead == 0:
+                days_ahead = 7
+            mentions.append(DateMention(start, end, "date", today + timedelta(days=days_ahead)))
+    return mentions
+
+
+def parse_dates(text, today=None):
+    """
+    Work out the travel dates described in a message.
+
+    Understands ISO and day/month/year dates, English and Arabic month
+    names (Gregorian and Hijri, with or without a year), ranges ("April
+    10-14", "from 10 May to 14 May"), durations ("for 3 nights"),
+    offsets ("in 2 weeks"), relative days ("tomorrow", "غدا"), weekdays and
+    weekends. The first date is the start; a date joined to it by "to",
+    "until" or "-" ends the range, and a date or offset after "return" or
+    "back" is the return date, offsets counting from the start.
+
+    Args:
+        text (str): The user's message, in any case
+        today (date, optional): Anchor for relative dates; defaults to the
+            current date
+
+    Returns:
+        TravelDates: The resolved dates
+    """
+    if today is None:
+        today = date.today()
+    normalized = _normalize(text)
+    mentions = find_dates(normalized, today)
+    result = TravelDates(mentions=tuple(mentions))
+    end_explicit_year = False
+    previous_end = 0
+
+    for mention in mentions:
+        between = normalized[previous_end:mention.start].strip()
+        previous_end = mention.end
+        is_return = _RETURN_BEFORE.search(normalized, max(0, mention.start - 30), mention.start) is not None
+
+        if mention.kind == "duration":
+            result.nights = mention.days + 30 * mention.months
+            continue
+
+        if is_return:
+            result.round_trip = True
+            if mention.kind == "offset":
+                if result.end is None:
+                    result.end = mention.shift(result.start or today)
+            elif result.end is None:
+                result.end, end_explicit_year = mention.first, mention.explicit_year
+            continue
+
+        if mention.kind == "offset":
+            first, last = mention.shift(today), None
+        else:
+            first, last = mention.first, mention.last
+
+        if result.start is None:
+            result.start, result.end = first, last
+            end_explicit_year = mention.explicit_year
+            if mention.nights is not None and result.nights is None:
+                result.nights = mention.nights
+        elif result.end is None and between in _CONNECTORS:
+            result.end, end_explicit_year = first, mention.explicit_year
+
+    if result.start is not None:
+        if result.end is not None and result.end <= result.start and not end_explicit_year:
+            # "Dec 28 to Jan 3": the end is in the following year
+            try:
+                result.end = result.end.replace(year=result.end.year + 1)
+            except ValueError:
+                result.end = result.end + timedelta(days=365)
+        if result.end is not None and result.end <= result.start:
+            result.end = None
+        if result.end is None and result.nights and any(m.kind == "duration" for m in mentions):
+            result.end = result.start + timedelta(days=result.nights)
+    return result
@@ -0,0 +1,57 @@
+import re
+
+# Every extraction pattern, compiled once at import and keyed by a dotted
+# name so the set can be listed and benchmarked. Most run on text the
+# extractor has lowercased once per request.
+PATTERNS = {}
+
+
+def register(name, regex, flags=0):
+    """
+    Compile a pattern and add it to the registry.
+
+    Args:
+        name (str): Unique dotted name, e.g. "flights.direct_route"
+        regex (str): The regular expression
+        flags (int): re flags
+
+    Returns:
+        re.Pattern: The compiled pattern
+    """
+    if name in PATTERNS:
+        raise ValueError(f"Pattern already registered: {name}")
+    compiled = re.compile(regex, flags)
+    PATTERNS[name] = compiled
+    return compiled
+
+
+# Flights: "DMM to RUH", "DMM-RUH"
+FLIGHT_DIRECT_ROUTE = register("flights.direct_route", r'\b([a-zA-Z]{3})\s*(?:to|-|>|→)\s*([a-zA-Z]{3})\b')
+FLIGHT_FROM = register("flights.from", r'from\s+([a-zA-Z\s]+)(?:\s+to|$)')
+FLIGHT_TO = register("flights.to", r'to\s+([a-zA-Z\s]+)')
+
+# Shared by the flight and hotel extractors
+PRICE_UNDER = register("common.price_under", r'under\s+\$?(\d+)')
+
+# Hotels
+HOTEL_LOCATION = register("hotels.location", r'(?:in|at|near|to)\s+([a-zA-Z\s]+)(?:\.|\?|$|\s+for)')
+HOTEL_GUESTS = register("hotels.guests", r'(\d+)\s+(?:guests?|people|persons?)')
+
+# Packages
+PACKAGE_ADULTS = register("packages.adults", r'(\d+)\s+(?:adult|person|people|traveler)')
+PACKAGE_CHILDREN = register("packages.children", r'(\d+)\s+(?:child|children|kid|kids)')
+PACKAGE_BUDGET = register("packages.budget", r'(?:under|less than|budget|max|maximum)\s+\$?(\d+)')
+PACKAGE_HOTEL_RATING = register("packages.hotel_rating", r'([1-5])[ -]star')
+
+# General inquiries; greetings are plain substring checks, as before
+GENERAL_GREETING = register("general.greeting", r'hello|hi|hey|greetings|howdy')
+GENERAL_DESTINATION = register("general.destination", r'(?:visit|go to|travel to|about)\s+([a-zA-Z\s]+)(?:\.|\?|$)')
+GENERAL_ACTIVITY = register("general.activity", r'(?:do|activities|things to do)\s+in\s+([a-zA-Z\s]+)(?:\.|\?|$)')
+
+# User preferences; these run on the original text, so they are case-sensitive
+PREFERENCE_LOCATIONS = register("preferences.locations", r'(?:from|to)\s+([A-Za-z\s]+)')
+PREFERENCE_DATES = register(
+    "preferences.dates",
+    r'(?:on|in|around|during)\s+([A-Za-z]+\s+\d{1,2}(?:st|nd|rd|th)?(?:\s*-\s*\d{1,2}(?:st|nd|rd|th)?)?)'
+)
+PREFERENCE_PRICE = register("preferences.price", r'(?:under|below|around|about)\s+\$?(\d+)')
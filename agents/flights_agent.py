@@ -1,8 +1,13 @@
 from .base_agent import BaseAgent
-import re
+from .intent_router import RoutingSignals, keywords, pattern, places
+from .gazetteer import default_gazetteer
+from .extraction_patterns import (
+    FLIGHT_DIRECT_ROUTE, FLIGHT_FROM, FLIGHT_TO, PRICE_UNDER
+)
+from .date_parser import parse_dates
+from .providers import MockFlightProvider
 import json
 import logging
-from datetime import datetime, timedelta
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("FlightsAgent")
@@ -10,68 +15,36 @@ logger = logging.getLogger("FlightsAgent")
 class FlightsAgent(BaseAgent):
     """Agent specialized in handling flight search and booking tasks."""
     
-    def __init__(self):
+    uses_parsed_request = True
+    
+    def __init__(self, provider=None):
+        """
+        Args:
+            provider (InventoryProvider, optional): Where flight offers come
+                from; defaults to the seeded mock inventory
+        """
         super().__init__(name="Flights Expert")
-        self.airport_codes = {
-            "dmm": "DMM", "dammam": "DMM",
-            "jed": "JED", "jeddah": "JED", 
-            "ruh": "RUH", "riyadh": "RUH",
-            "dxb": "DXB", "dubai": "DXB",
-            "bkk": "BKK", "bangkok": "BKK",
-            "ist": "IST", "istanbul": "IST",
-            "cai": "CAI", "cairo": "CAI",
-            "lhr": "LHR", "london": "LHR",
-            "cdg": "CDG", "paris": "CDG",
-            "jfk": "JFK", "new york": "JFK"
-        }
+        # Airports, cities and their aliases, shared with the other agents
+        self.gazetteer = default_gazetteer()
+        self.provider = provider or MockFlightProvider()
     
-    def can_handle(self, request):
+    def routing_signals(self):
         """
-        Determine if this agent can handle the given request.
+        Describe the signals the intent router uses to score flight requests.
         
-        Args:
-            request (str): The user's request text
-            
         Returns:
-            float: Confidence score between 0.0 and 1.0
+            RoutingSignals: Flight routing rules
         """
-        request_lower = request.lower()
-        
-        # High confidence keywords
-        high_confidence = ["flight", "fly", "plane", "airport", "airline", "ticket"]
-        
-        # Medium confidence keywords
-        medium_confidence = ["travel", "trip", "journey", "booking"]
-        
-        # Look for airport codes or city names
-        has_airport = False
-        for airport in self.airport_codes:
-            if airport in request_lower:
-                has_airport = True
-                break
-                
-        # Look for "from [X] to [Y]" pattern which strongly indicates flight search
-        from_to_pattern = re.search(r'from\s+\w+\s+to\s+\w+', request_lower)
-        
-        # Calculate confidence based on keywords and patterns
-        confidence = 0.0
-        
-        if from_to_pattern:
-            confidence += 0.6
-            
-        if has_airport:
-            confidence += 0.3
-            
-        for keyword in high_confidence:
-            if keyword in request_lower:
-                confidence += 0.2
-                
-        for keyword in medium_confidence:
-            if keyword in request_lower:
-                confidence += 0.1
-        
-        # Cap confidence at 1.0
-        return min(confidence, 1.0)
+        return RoutingSignals([
+            # "from [X] to [Y]" strongly indicates a flight search
+            pattern(r'from\s+\w+\s+to\s+\w+', 0.6),
+            # Airport codes or city names
+            places(self.gazetteer, 0.3),
+            # High confidence keywords
+            keywords(["flight", "fly", "plane", "airport", "airline", "ticket"], 0.2),
+            # Medium confidence keywords
+            keywords(["travel", "trip", "journey", "booking"], 0.1),
+        ])
     
     def process_request(self, request, context=None):
         """
@@ -84,16 +57,41 @@ class FlightsAgent(BaseAgent):
         Returns:
             dict: The agent's response
         """
-        if context:
-            self.context.update(context)
-            
-        # Extract flight parameters from the request
-        params = self._extract_flight_params(request)
+        params, response = self._prepare_response(request, context)
+        if params is not None:
+            response["results"] = self._search_flights(params)
+        return response
+    
+    async def aprocess_request(self, request, context=None):
+        """
+        Awaitable version of process_request that awaits the provider
+        directly instead of holding a worker thread through the search.
+        
+        Returns:
+            dict: The agent's response
+        """
+        params, response = self._prepare_response(request, context)
+        if params is not None:
+            response["results"] = await self._asearch_flights(params)
+        return response
+    
+    def _prepare_response(self, request, context):
+        """
+        Extract the search parameters and write the reply text.
+        
+        Returns:
+            tuple: (params, response); params is None when the request
+                cannot be searched yet and the response asks for details
+        """
+        # Extract flight parameters from the request, reusing the parse
+        # shared by every agent handling it when there is one
+        parsed = self.parsed_request(context)
+        params = parsed.flight_params() if parsed is not None else self._extract_flight_params(request)
         logger.info(f"Extracted flight parameters: {params}")
         
         # Validate the extracted parameters
         if not params.get('departure_id') or not params.get('arrival_id'):
-            return {
+            return None, {
                 "content": "I'd be happy to help you find flights! Could you please specify your departure and arrival cities or airports?",
                 "type": "text"
             }
@@ -108,26 +106,27 @@ class FlightsAgent(BaseAgent):
             
         response_content += ". Here are the best options:"
         
-        # Simulate flight results (in a real implementation, this would call the flight search API)
-        flight_results = self._get_mock_flight_results(params)
-        
-        return {
+        return params, {
             "content": response_content,
-            "type": "flights",
-            "results": flight_results
+            "type": "flights"
         }
         
-    def _extract_flight_params(self, request):
+    def _extract_flight_params(self, request, request_lower=None, today=None):
         """
         Extract flight search parameters from the request.
         
         Args:
             request (str): The user's request text
+            request_lower (str, optional): The request already lowercased,
+                so callers extracting several kinds of parameters lower it once
+            today (date, optional): Anchor for relative dates such as
+                "tomorrow"; defaults to the current date
             
         Returns:
             dict: Flight search parameters
         """
-        request_lower = request.lower()
+        if request_lower is None:
+            request_lower = request.lower()
         params = {
             'departure_id': None,
             'arrival_id': None,
@@ -137,190 +136,127 @@ class FlightsAgent(BaseAgent):
         }
         
         # First try to match direct airport code patterns like "DMM to RUH" or "DMM-RUH"
-        direct_pattern = re.search(r'\b([a-zA-Z]{3})\s*(?:to|-|>|→)\s*([a-zA-Z]{3})\b', request_lower)
+        direct_pattern = FLIGHT_DIRECT_ROUTE.search(request_lower)
         if direct_pattern:
-            departure_code = direct_pattern.group(1).strip().upper()
-            arrival_code = direct_pattern.group(2).strip().upper()
-            
-            # Verify these are valid airport codes in our system
-            if departure_code in self.airport_codes.values():
-                params['departure_id'] = departure_code
-            else:
-                # Try to match the code to our known airports
-                for code, iata in self.airport_codes.items():
-                    if code.lower() == departure_code.lower():
-                        params['departure_id'] = iata
-                        break
-                        
-            if arrival_code in self.airport_codes.values():
-                params['arrival_id'] = arrival_code
-            else:
-                # Try to match the code to our known airports
-                for code, iata in self.airport_codes.items():
-                    if code.lower() == arrival_code.lower():
-                        params['arrival_id'] = iata
-                        break
+            # Offsets in the lowercased text line up with the original, whose
+            # case decides whether a short word counts as an airport code
+            params['departure_id'] = self._resolve_code(request[direct_pattern.start(1):direct_pattern.end(1)])
+            params['arrival_id'] = self._resolve_code(request[direct_pattern.start(2):direct_pattern.end(2)])
         
         # If direct pattern didn't work, try the from/to pattern
         if not params['departure_id'] or not params['arrival_id']:
+            mentions = self.gazetteer.find_all(request)
+            
             # Extract departure and arrival airports/cities using from/to pattern
-            from_match = re.search(r'from\s+([a-zA-Z\s]+)(?:\s+to|$)', request_lower)
-            to_match = re.search(r'to\s+([a-zA-Z\s]+)', request_lower)
+            from_match = FLIGHT_FROM.search(request_lower)
+            to_match = FLIGHT_TO.search(request_lower)
             
             if from_match:
-                departure = from_match.group(1).strip()
-                for code, iata in self.airport_codes.items():
-                    if code in departure:
-                        params['departure_id'] = iata
-                        break
+                params['departure_id'] = self._code_within(request, mentions, from_match.span(1)) or params['departure_id']
             
             if to_match:
-                arrival = to_match.group(1).strip()
-                for code, iata in self.airport_codes.items():
-                    if code in arrival:
-                        params['arrival_id'] = iata
-                        break
-        
-        # If we still don't have departure and arrival, try to find any airport codes in the text
-        if not params['departure_id'] or not params['arrival_id']:
-            # Find all airport codes mentioned in the request
-            airport_mentions = []
-            for code, iata in self.airport_codes.items():
-                if code in request_lower:
-                    airport_mentions.append(iata)
-            
-            # If we found exactly two airports, assume the first is departure and second is arrival
-            if len(airport_mentions) == 2:
-                params['departure_id'] = airport_mentions[0]
-                params['arrival_id'] = airport_mentions[1]
-        
-        # Extract date information
-        today = datetime.now()
-        
-        # Check for specific time frames
-        if "tomorrow" in request_lower:
-            outbound_date = today + timedelta(days=1)
-            params['outbound_date'] = outbound_date.strftime('%Y-%m-%d')
-        elif "next week" in request_lower:
-            outbound_date = today + timedelta(days=7)
-            params['outbound_date'] = outbound_date.strftime('%Y-%m-%d')
-        elif "next month" in request_lower:
-            outbound_date = today + timedelta(days=30)
-            params['outbound_date'] = outbound_date.strftime('%Y-%m-%d')
-        
-        # Check for specific time offsets
-        time_offset_match = re.search(r'in\s+(\d+)\s+(days?|weeks?|months?)', request_lower)
-        if time_offset_match:
-            amount = int(time_offset_match.group(1))
-            unit = time_offset_match.group(2)
+                params['arrival_id'] = self._code_within(request, mentions, to_match.span(1)) or params['arrival_id']
             
-            if 'day' in unit:
-                outbound_date = today + timedelta(days=amount)
-            elif 'week' in unit:
-                outbound_date = today + timedelta(days=amount*7)
-            elif 'month' in unit:
-                outbound_date = today + timedelta(days=amount*30)
-                
-            params['outbound_date'] = outbound_date.strftime('%Y-%m-%d')
+            # If we still don't have both, and exactly two places are
+            # mentioned, assume the first is departure and second is arrival
+            if not params['departure_id'] or not params['arrival_id']:
+                codes = []
+                for mention in mentions:
+                    if mention.place.code and mention.place.code not in codes:
+                        codes.append(mention.place.code)
+                if len(codes) == 2:
+                    params['departure_id'], params['arrival_id'] = codes
+        
+        # Extract date information: "tomorrow", "15 May", "April 10-14",
+        # "in 3 days", "returning in 2 weeks", ...
+        dates = parse_dates(request, today)
+        if dates.start is not None:
+            params['outbound_date'] = dates.start.strftime('%Y-%m-%d')
         
         # Extract price limit
-        price_match = re.search(r'under\s+\$?(\d+)', request_lower)
+        price_match = PRICE_UNDER.search(request_lower)
         if price_match:
             params['max_price'] = int(price_match.group(1))
         
-        # Determine if it's a round trip
-        if "round trip" in request_lower or "return" in request_lower:
+        # Determine if it's a round trip; a return date or a date range
+        # implies one
+        if "round trip" in request_lower or "return" in request_lower or dates.round_trip or dates.end:
             params['flight_type'] = 'round_trip'
-            
-            # Try to extract return date
-            return_match = re.search(r'return(?:ing)?\s+(?:on|in)\s+(\d+)\s+(days?|weeks?|months?)', request_lower)
-            if return_match and params['outbound_date']:
-                amount = int(return_match.group(1))
-                unit = return_match.group(2)
-                
-                outbound_date = datetime.strptime(params['outbound_date'], '%Y-%m-%d')
-                
-                if 'day' in unit:
-                    return_date = outbound_date + timedelta(days=amount)
-                elif 'week' in unit:
-                    return_date = outbound_date + timedelta(days=amount*7)
-                elif 'month' in unit:
-                    return_date = outbound_date + timedelta(days=amount*30)
-                    
-                params['return_date'] = return_date.strftime('%Y-%m-%d')
+            if dates.end is not None:
+                params['return_date'] = dates.end.strftime('%Y-%m-%d')
         
         return params
     
-    def _get_mock_flight_results(self, params):
+    def _resolve_code(self, token):
         """
-        Generate mock flight results based on the parameters.
-        In a real implementation, this would call the flight search API.
+        Resolve a three-letter token from a "DMM to RUH" style route.
         
         Args:
-            params (dict): Flight search parameters
+            token (str): The token as written in the request
             
         Returns:
-            list: Mock flight results
+            str: The airport code, or None if the token is not a known code
         """
-        # Generate some realistic mock data based on the parameters
-        departure_id = params.get('departure_id', 'DMM')
-        arrival_id = params.get('arrival_id', 'JED')
-        
-        # Base price influenced by route
-        base_prices = {
-            ('DMM', 'JED'): 200,
-            ('DMM', 'RUH'): 150,
-            ('DMM', 'DXB'): 300,
-            ('DMM', 'BKK'): 450,
-            ('JED', 'DMM'): 200,
-            ('JED', 'RUH'): 180,
-            ('JED', 'DXB'): 280,
-            ('RUH', 'DMM'): 150,
-            ('RUH', 'JED'): 180,
-            ('RUH', 'DXB'): 250,
-            ('RUH', 'IST'): 380
-        }
-        
-        # Default base price if route not found
-        base_price = base_prices.get((departure_id, arrival_id), 350)
-        
-        # Generate between 2-4 flight options
-        import random
-        num_flights = random.randint(2, 4)
-        
-        airlines = ['Saudi Arabian Airlines', 'Emirates', 'Qatar Airways', 'Turkish Airlines', 'Etihad Airways']
+        place = self.gazetteer.by_code(token)
+        if place is None or not self.gazetteer.code_allowed(place, token):
+            return None
+        return place.code
+    
+    def _code_within(self, request, mentions, span):
+        """
+        Return the code of the first airport mentioned inside a span of the request.
         
-        flight_results = []
+        Falls back to typo-tolerant matching when no place is named exactly,
+        so "from riyahd" still finds Riyadh.
         
-        for i in range(num_flights):
-            # Randomize price within a range
-            price_variation = random.uniform(0.8, 1.2)
-            price = int(base_price * price_variation)
-            
-            # Random duration between 2-12 hours
-            duration_hours = random.randint(1, 8)
-            duration_minutes = random.randint(0, 59)
-            duration = f"{duration_hours}h {duration_minutes}m"
-            
-            # Random departure time
-            hour = random.randint(6, 22)
-            minute = random.choice([0, 15, 30, 45])
-            departure_time = f"{hour:02d}:{minute:02d}"
-            
-            # Select a random airline
-            airline = random.choice(airlines)
+        Args:
+            request (str): The user's request text
+            mentions (list): PlaceMatch records for the request
+            span (tuple): Start and end offsets
             
-            flight_results.append({
-                "from": departure_id,
-                "to": arrival_id,
-                "price": price,
-                "duration": duration,
-                "departure": f"2025-04-15 {departure_time}",
-                "airline": airline,
-                "bookingUrl": "#"
-            })
-        
-        # Sort by price
-        flight_results.sort(key=lambda x: x["price"])
+        Returns:
+            str: The airport code, or None
+        """
+        start, end = span
+        for mention in mentions:
+            if mention.start >= start and mention.end <= end and mention.place.code:
+                return mention.place.code
+        match = self.gazetteer.resolve(request[start:end])
+        if match is None or not match.place.code:
+            return None
+        if match.confidence < 1.0:
+            logger.info(f"Read '{match.text}' as {match.place.city} (confidence {match.confidence:.2f})")
+        return match.place.code
+    
+    def _search_flights(self, params):
+        """
+        Search the flight provider.
         
-        return flight_results
+        Args:
+            params (dict): Flight search parameters
+            
+        Returns:
+            list: Normalized flight offers, cheapest first; empty when the
+                provider fails, so the reply still goes out
+        """
+        try:
+            result = self.provider.search(params)
+        except Exception as e:
+            logger.warning(f"Flight search failed on {self.provider.name}: {e}")
+            return []
+        return self._offers(result)
+    
+    async def _asearch_flights(self, params):
+        """Awaitable version of _search_flights."""
+        try:
+            result = await self.provider.asearch(params)
+        except Exception as e:
+            logger.warning(f"Flight search failed on {self.provider.name}: {e}")
+            return []
+        return self._offers(result)
+    
+    @staticmethod
+    def _offers(result):
+        if not result.ok:
+            logger.warning(f"Flight search on {result.provider} returned {result.status}: {result.error}")
+        return result.offers
@@ -0,0 +1,172 @@
+import bisect
+from collections import Counter
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal string alignment distance between two strings, with a cutoff.
+
+    Counts insertions, deletions, substitutions and transpositions of
+    adjacent characters, which covers most typing mistakes.
+
+    Args:
+        a (str): First string
+        b (str): Second string
+        max_distance (int): Largest distance of interest
+
+    Returns:
+        int: The distance, or max_distance + 1 if it is larger
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        char_a = a[i - 1]
+        for j in range(1, len(b) + 1):
+            cost = 0 if char_a == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and j > 1 and char_a == b[j - 2]
+                    and a[i - 2] == b[j - 1]):
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+def trigrams(term):
+    """Return the padded character trigrams of a term."""
+    padded = f"$${term}$$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def default_max_distance(term):
+    """Edits allowed for a term: none up to three characters, one up to six, then two."""
+    if len(term) <= 3:
+        return 0
+    if len(term) <= 6:
+        return 1
+    return 2
+
+
+class FuzzyMatch:
+    """The closest indexed term to a query."""
+
+    __slots__ = ('term', 'distance', 'confidence')
+
+    def __init__(self, term, distance, confidence):
+        self.term = term
+        self.distance = distance
+        self.confidence = confidence
+
+    def __repr__(self):
+        return f"FuzzyMatch({self.term!r}, {self.distance}, {self.confidence:.2f})"
+
+
+class TrigramIndex:
+    """
+    Trigram inverted index for typo-tolerant lookups.
+
+    Terms are stored sorted by length, so each posting list can be cut down
+    to the terms whose length is within the allowed distance with two
+    bisections. Candidates come from the query's rarest trigrams and are
+    verified in descending order of trigrams shared; since one edit changes
+    at most four trigrams, that count bounds the distance from below and
+    the scan stops as soon as no remaining candidate can beat the best
+    match. Lookups take a few hundred microseconds at 30,000 names.
+    """
+
+    def __init__(self, terms):
+        """
+        Args:
+            terms (iterable): Terms to index; duplicates are ignored
+        """
+        self.terms = sorted(set(terms), key=lambda term: (len(term), term))
+        self._lengths = [len(term) for term in self.terms]
+        self._postings = {}
+        for term_id, term in enumerate(self.terms):
+            for gram in trigrams(term):
+                self._postings.setdefault(gram, []).append(term_id)
+
+    def best(self, query, max_distance=None):
+        """
+        Find the indexed term closest to the query.
+
+        Args:
+            query (str): Normalized query term
+            max_distance (int, optional): Largest edit distance accepted;
+                defaults to default_max_distance(query)
+
+        Returns:
+            FuzzyMatch: The closest term, or None if none is close enough.
+                Ties go to the term sharing the most trigrams.
+        """
+        if max_distance is None:
+            max_distance = default_max_distance(query)
+        low = bisect.bisect_left(self._lengths, len(query) - max_distance)
+        high = bisect.bisect_right(self._lengths, len(query) + max_distance)
+        if low >= high:
+            return None
+        if len(query) + 2 <= 4 * max_distance:
+            # Too short for the trigram bound to rule anything out
+            return self.linear_best(query, max_distance)
+
+        # Each edit removes at most four of the query's trigrams, so a term
+        # within max_distance shares at least one of any 4 * max_distance + 1
+        # of them; counting only the rarest ones keeps the work small and
+        # still gives a valid lower bound on the distance
+        slices = []
+        for gram in trigrams(query):
+            posting = self._postings.get(gram, ())
+            start = bisect.bisect_left(posting, low)
+            end = bisect.bisect_left(posting, high, start)
+            slices.append((end - start, start, end, posting))
+        slices.sort(key=lambda item: item[0])
+        counted = slices[:4 * max_distance + 1]
+        counts = Counter()
+        for _, start, end, posting in counted:
+            counts.update(posting[start:end])
+
+        best_id = None
+        best_distance = max_distance + 1
+        for term_id, shared in counts.most_common():
+            # Ceiling of the missing counted trigrams over four
+            if (len(counted) - shared + 3) // 4 >= best_distance:
+                break
+            distance = edit_distance(query, self.terms[term_id], best_distance - 1)
+            if distance < best_distance:
+                best_id, best_distance = term_id, distance
+                if distance == 0:
+                    break
+        if best_id is None:
+            return None
+        term = self.terms[best_id]
+        return FuzzyMatch(term, best_distance, 1.0 - best_distance / max(len(query), len(term)))
+
+    def linear_best(self, query, max_distance=None):
+        """
+        Find the closest term by comparing the query with every term.
+
+        Finds a term at the same distance as ``best`` (ties may differ);
+        kept as the reference implementation and benchmark baseline.
+        """
+        if max_distance is None:
+            max_distance = default_max_distance(query)
+        best_term = None
+        best_distance = max_distance + 1
+        for term in self.terms:
+            distance = edit_distance(query, term, best_distance - 1)
+            if distance < best_distance:
+                best_term, best_distance = term, distance
+        if best_term is None:
+            return None
+        return FuzzyMatch(best_term, best_distance, 1.0 - best_distance / max(len(query), len(best_term)))
+
+    def __len__(self):
+        return len(self.terms)
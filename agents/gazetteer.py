@@ -0,0 +1,369 @@
+import os
+import re
+import mmap
+import logging
+import threading
+from .intent_router import KeywordAutomaton
+from .fuzzy_index import TrigramIndex
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("Gazetteer")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "places.tsv")
+
+# Typo-corrected names below this confidence are not trusted
+MIN_FUZZY_CONFIDENCE = 0.75
+
+# Longest run of words tried as one place name when resolving a phrase
+MAX_NAME_WORDS = 3
+
+WORD = re.compile(r'\w+')
+
+HUB = "hub"
+COMMON = "common"
+WORD_CODE = "wordcode"
+
+# Spelling variants folded together so Arabic names match however the
+# hamza and final letters are written; every mapping is one character to
+# one character, so offsets in normalized text match the original
+_ARABIC_FOLDING = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ة": "ه",
+})
+
+
+def normalize_name(text):
+    """
+    Normalize a place name or free text for matching.
+
+    Lowercases and folds Arabic letter variants while keeping the length of
+    the text, so match offsets can be mapped back to the original.
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # A few characters (e.g. "İ") lowercase to two; keep those as they are
+        lowered = "".join(char if len(char.lower()) != 1 else char.lower() for char in text)
+    return lowered.translate(_ARABIC_FOLDING)
+
+
+class Place:
+    """
+    One airport, or a city without its own airport.
+
+    Attributes:
+        iata (str): IATA airport code, or None
+        icao (str): ICAO airport code, or None
+        city (str): Canonical city name
+        country (str): ISO 3166-1 alpha-2 country code
+        airport (str): Airport name, or None
+        aliases (tuple): Alternate spellings and Arabic names
+        flags (frozenset): Matching flags (hub, common, wordcode)
+    """
+
+    __slots__ = ('iata', 'icao', 'city', 'country', 'airport', 'aliases', 'flags')
+
+    def __init__(self, iata, icao, city, country, airport=None, aliases=(), flags=()):
+        self.iata = iata or None
+        self.icao = icao or None
+        self.city = city
+        self.country = country
+        self.airport = airport or None
+        self.aliases = tuple(aliases)
+        self.flags = frozenset(flags)
+
+    @property
+    def code(self):
+        """The IATA code, falling back to the ICAO code."""
+        return self.iata or self.icao
+
+    def names(self):
+        """Return the city name followed by every alias."""
+        return (self.city,) + self.aliases
+
+    def to_dict(self):
+        """Return a JSON-serializable view of the place."""
+        return {
+            "iata": self.iata,
+            "icao": self.icao,
+            "city": self.city,
+            "country": self.country,
+            "airport": self.airport,
+            "aliases": list(self.aliases)
+        }
+
+    def __repr__(self):
+        return f"Place({self.code!r}, {self.city!r})"
+
+
+class PlaceMatch:
+    """
+    A place mentioned in a text, with its character offsets.
+
+    ``confidence`` is 1.0 for names matched exactly and lower for names
+    matched despite typos.
+    """
+
+    __slots__ = ('start', 'end', 'text', 'place', 'confidence')
+
+    def __init__(self, start, end, text, place, confidence=1.0):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.place = place
+        self.confidence = confidence
+
+    def __repr__(self):
+        return f"PlaceMatch({self.start}, {self.end}, {self.text!r}, {self.place!r}, {self.confidence:.2f})"
+
+
+class Gazetteer:
+    """
+    Airports and cities with their codes, aliases and Arabic names.
+
+    Places are found inside free text with one Aho-Corasick pass over every
+    name, alias and code. Matches must start and end on word boundaries, so
+    "ist" in "list" is not Istanbul. Because so many IATA codes are also
+    short words, a code only matches when written in upper case, or in any
+    case for airports flagged as hubs; codes flagged as words never match
+    in free text, and city names flagged as common words must be
+    capitalized.
+    """
+
+    def __init__(self, places):
+        """
+        Args:
+            places (iterable): Place records; when a name or code is shared,
+                the first place wins
+        """
+        self.places = list(places)
+        self._by_code = {}
+        self._by_name = {}
+        for place in self.places:
+            for code in (place.iata, place.icao):
+                if code:
+                    self._by_code.setdefault(code.upper(), place)
+            for name in place.names():
+                self._by_name.setdefault(normalize_name(name), place)
+        self._automaton = None
+        self._terms = None
+        self._fuzzy = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        """
+        Load places from a tab-separated data file.
+
+        The file is memory-mapped and parsed line by line rather than read
+        into one large string, which keeps loading a full airport database
+        cheap.
+
+        Args:
+            path (str): Path to the data file (see agents/data/places.tsv)
+
+        Returns:
+            Gazetteer: The loaded gazetteer
+        """
+        places = []
+        with open(path, "rb") as data_file:
+            if os.fstat(data_file.fileno()).st_size == 0:
+                return cls(places)
+            with mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for raw_line in iter(data.readline, b""):
+                    if raw_line.startswith(b"#") or not raw_line.strip():
+                        continue
+                    fields = raw_line.decode("utf-8").rstrip("\r\n").split("\t")
+                    fields += [""] * (7 - len(fields))
+                    iata, icao, city, country, airport, aliases, flags = fields[:7]
+                    places.append(Place(
+                        iata, icao, city, country, airport,
+                        [alias for alias in aliases.split(",") if alias],
+                        [flag for flag in flags.split(",") if flag]
+                    ))
+        logger.info(f"Loaded {len(places)} places from {path}")
+        return cls(places)
+
+    def _compile(self):
+        """Build the matching automaton on first use."""
+        with self._lock:
+            if self._automaton is not None:
+                return self._automaton, self._terms
+            terms = {}
+            for place in self.places:
+                for name in place.names():
+                    terms.setdefault(normalize_name(name), (place, False))
+                for code in (place.iata, place.icao):
+                    if code:
+                        terms.setdefault(code.lower(), (place, True))
+            self._terms = list(terms.values())
+            self._automaton = KeywordAutomaton(list(terms))
+            return self._automaton, self._terms
+
+    def code_allowed(self, place, token):
+        """
+        Decide whether a code written as ``token`` refers to ``place``.
+
+        Hub codes match in any case; other codes must be upper case and not
+        flagged as ordinary words.
+        """
+        if HUB in place.flags:
+            return True
+        return token.isupper() and WORD_CODE not in place.flags
+
+    def find_all(self, text):
+        """
+        Find the places mentioned in a text.
+
+        Overlapping mentions are resolved leftmost-longest, so "new york city"
+        is one match rather than "new york" plus "york".
+
+        Args:
+            text (str): Free text in any case
+
+        Returns:
+            list: PlaceMatch records in text order
+        """
+        automaton, terms = self._compile()
+        normalized = normalize_name(text)
+        length = len(normalized)
+        candidates = []
+        for end, term_id in automaton.iter_matches(normalized):
+            term = automaton.keywords[term_id]
+            start = end - len(term)
+            if start > 0 and normalized[start - 1].isalnum():
+                continue
+            if end < length and normalized[end].isalnum():
+                continue
+            place, is_code = terms[term_id]
+            token = text[start:end]
+            if is_code:
+                if not self.code_allowed(place, token):
+                    continue
+            elif COMMON in place.flags and not token[:1].isupper():
+                continue
+            candidates.append((start, -end, place, token))
+
+        matches = []
+        position = 0
+        for start, negative_end, place, token in sorted(candidates, key=lambda c: (c[0], c[1])):
+            if start >= position:
+                matches.append(PlaceMatch(start, -negative_end, token, place))
+                position = -negative_end
+        return matches
+
+    def _fuzzy_index(self):
+        """Build the typo-tolerant name index on first use."""
+        if self._fuzzy is None:
+            with self._lock:
+                if self._fuzzy is None:
+                    self._fuzzy = TrigramIndex(self._by_name)
+        return self._fuzzy
+
+    def fuzzy_lookup(self, name, min_confidence=MIN_FUZZY_CONFIDENCE):
+        """
+        Find the place whose name is closest to ``name``, allowing typos.
+
+        Codes are not matched fuzzily; one wrong letter in a code is
+        usually another airport.
+
+        Args:
+            name (str): A place name as written, e.g. "riyahd"
+            min_confidence (float): Lowest confidence accepted
+
+        Returns:
+            PlaceMatch: The place, with offsets spanning ``name``, or None
+        """
+        normalized = normalize_name(name.strip())
+        place = self._by_name.get(normalized)
+        if place is not None:
+            return PlaceMatch(0, len(name), name, place)
+        match = self._fuzzy_index().best(normalized)
+        if match is None or match.confidence < min_confidence:
+            return None
+        return PlaceMatch(0, len(name), name, self._by_name[match.term], match.confidence)
+
+    def resolve(self, phrase, min_confidence=MIN_FUZZY_CONFIDENCE):
+        """
+        Resolve a free-text location phrase such as "dammma tomorrow".
+
+        Exact mentions win. Otherwise runs of up to MAX_NAME_WORDS words are
+        looked up fuzzily, and like exact mentions the leftmost match wins;
+        among runs starting at the same word the most confident one does.
+
+        Args:
+            phrase (str): Text expected to contain one place name
+            min_confidence (float): Lowest confidence accepted
+
+        Returns:
+            PlaceMatch: The place with offsets into ``phrase``, or None
+        """
+        matches = self.find_all(phrase)
+        if matches:
+            return matches[0]
+
+        words = list(WORD.finditer(phrase))
+        for first in range(len(words)):
+            best = None
+            for last in range(first, min(first + MAX_NAME_WORDS, len(words))):
+                start, end = words[first].start(), words[last].end()
+                match = self.fuzzy_lookup(phrase[start:end], min_confidence)
+                if match is not None and (best is None or match.confidence > best.confidence):
+                    best = PlaceMatch(start, end, match.text, match.place, match.confidence)
+            if best is not None:
+                return best
+        return None
+
+    def first(self, text):
+        """Return the first place mentioned in a text, or None."""
+        matches = self.find_all(text)
+        return matches[0].place if matches else None
+
+    def by_code(self, code):
+        """Return the place for an IATA or ICAO code (any case), or None."""
+        return self._by_code.get(code.upper()) if code else None
+
+    def lookup(self, name):
+        """Return the place for an exact name, alias or code, or None."""
+        if not name:
+            return None
+        return self._by_name.get(normalize_name(name.strip())) or self.by_code(name.strip())
+
+    def city_name(self, code, default=None):
+        """
+        Return the canonical city name for a code.
+
+        Args:
+            code (str): IATA or ICAO code
+            default: Value returned for unknown codes
+
+        Returns:
+            str: The city name, or ``default``
+        """
+        place = self.by_code(code)
+        return place.city if place is not None else default
+
+    def __len__(self):
+        return len(self.places)
+
+    def __iter__(self):
+        return iter(self.places)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_gazetteer():
+    """
+    Return the gazetteer shared by all agents, loading it on first use.
+
+    The data file can be replaced with a larger one (see
+    utils/build_gazetteer.py) through the RAHALAH_GAZETTEER environment
+    variable.
+    """
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = Gazetteer.load(os.environ.get("RAHALAH_GAZETTEER", DEFAULT_PATH))
+    return _default
@@ -1,5 +1,7 @@
 from .base_agent import BaseAgent
-import re
+from .intent_router import RoutingSignals, any_of, places
+from .gazetteer import default_gazetteer
+from .extraction_patterns import GENERAL_GREETING, GENERAL_DESTINATION, GENERAL_ACTIVITY
 import logging
 import random
 
@@ -12,12 +14,8 @@ class GeneralAgent(BaseAgent):
     def __init__(self):
         super().__init__(name="Travel Assistant")
         
-        # Common travel destinations
-        self.destinations = [
-            "Paris", "London", "New York", "Tokyo", "Dubai", "Istanbul", 
-            "Rome", "Bangkok", "Singapore", "Barcelona", "Sydney", "Cairo",
-            "Riyadh", "Jeddah", "Dammam", "Madinah", "Makkah"
-        ]
+        # Travel destinations, shared with the other agents
+        self.gazetteer = default_gazetteer()
         
         # Common travel activities
         self.activities = [
@@ -34,18 +32,13 @@ class GeneralAgent(BaseAgent):
             "Greetings! I'm ready to assist with all your travel needs. What can I help you with today?"
         ]
     
-    def can_handle(self, request):
+    def routing_signals(self):
         """
-        Determine if this agent can handle the given request.
+        Describe the signals the intent router uses to score general requests.
         
-        Args:
-            request (str): The user's request text
-            
         Returns:
-            float: Confidence score between 0.0 and 1.0
+            RoutingSignals: General routing rules
         """
-        request_lower = request.lower()
-        
         # General travel-related keywords
         travel_keywords = [
             "travel", "trip", "vacation", "holiday", "journey", "tour",
@@ -58,38 +51,14 @@ class GeneralAgent(BaseAgent):
             "good evening", "howdy", "what's up", "how are you"
         ]
         
-        # Calculate confidence based on keywords
-        confidence = 0.0
-        
-        # Check for greetings (high confidence for handling greetings)
-        for keyword in greeting_keywords:
-            if keyword in request_lower:
-                confidence += 0.7
-                break
-                
-        # Check for travel keywords
-        for keyword in travel_keywords:
-            if keyword in request_lower:
-                confidence += 0.1
-                break
-                
-        # Check for destinations
-        for destination in self.destinations:
-            if destination.lower() in request_lower:
-                confidence += 0.1
-                break
-                
-        # Check for activities
-        for activity in self.activities:
-            if activity in request_lower:
-                confidence += 0.1
-                break
-        
-        # Always provide a minimum confidence for fallback
-        confidence = max(confidence, 0.1)
-        
-        # Cap confidence at 1.0
-        return min(confidence, 1.0)
+        # Greetings get high confidence; the 0.1 floor keeps this agent
+        # available as the fallback
+        return RoutingSignals([
+            any_of(greeting_keywords, 0.7),
+            any_of(travel_keywords, 0.1),
+            places(self.gazetteer, 0.1),
+            any_of(self.activities, 0.1),
+        ], floor=0.1)
     
     def process_request(self, request, context=None):
         """
@@ -102,32 +71,26 @@ class GeneralAgent(BaseAgent):
         Returns:
             dict: The agent's response
         """
-        if context:
-            self.context.update(context)
-            
         request_lower = request.lower()
         
         # Check for greetings
-        greeting_keywords = ["hello", "hi", "hey", "greetings", "howdy"]
-        is_greeting = any(keyword in request_lower for keyword in greeting_keywords)
-        
-        if is_greeting:
+        if GENERAL_GREETING.search(request_lower):
             return {
                 "content": random.choice(self.greetings),
                 "type": "text"
             }
             
         # Check for destination inquiries
-        destination_match = re.search(r'(?:visit|go to|travel to|about)\s+([a-zA-Z\s]+)(?:\.|\?|$)', request_lower)
+        destination_match = GENERAL_DESTINATION.search(request_lower)
         if destination_match:
-            destination = destination_match.group(1).strip().title()
-            return self._get_destination_info(destination)
+            destination = destination_match.group(1).strip()
+            return self._get_destination_info(self._display_name(destination))
             
         # Check for activity inquiries
-        activity_match = re.search(r'(?:do|activities|things to do)\s+in\s+([a-zA-Z\s]+)(?:\.|\?|$)', request_lower)
+        activity_match = GENERAL_ACTIVITY.search(request_lower)
         if activity_match:
-            location = activity_match.group(1).strip().title()
-            return self._get_activity_info(location)
+            location = activity_match.group(1).strip()
+            return self._get_activity_info(self._display_name(location))
             
         # General travel inquiry
         return {
@@ -135,6 +98,11 @@ class GeneralAgent(BaseAgent):
             "type": "text"
         }
         
+    def _display_name(self, name):
+        """Return the canonical city name for a known place, else the name in title case."""
+        place = self.gazetteer.lookup(name)
+        return place.city if place is not None else name.title()
+        
     def _get_destination_info(self, destination):
         """Generate information about a travel destination."""
         # In a real implementation, this would fetch data from a travel API or database
@@ -0,0 +1,371 @@
+import re
+import threading
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("IntentRouter")
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton that finds every keyword occurring in a text
+    in a single left-to-right pass.
+
+    Matching is plain substring matching (the same semantics as
+    ``keyword in text``), so callers are expected to pass text that has
+    already been normalized the same way as the keywords.
+    """
+
+    def __init__(self, keywords):
+        """
+        Build the automaton.
+
+        Args:
+            keywords (list): Keyword strings; the index of each keyword is
+                the id reported by ``find_all``
+        """
+        self.keywords = list(keywords)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [()]
+
+        for keyword_id, keyword in enumerate(self.keywords):
+            if not keyword:
+                continue
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._output[state] = self._output[state] + (keyword_id,)
+
+        # Breadth-first pass to set failure links and merge outputs so that
+        # every state reports all keywords ending at it
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                if self._output[self._fail[next_state]]:
+                    self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        """
+        Yield ``(end_index, keyword_id)`` for every keyword occurrence.
+
+        Args:
+            text (str): The text to scan
+
+        Yields:
+            tuple: Exclusive end offset of the match and the keyword id
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for index, char in enumerate(text):
+            while True:
+                next_state = goto[state].get(char)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            for keyword_id in output[state]:
+                yield index + 1, keyword_id
+
+    def find_all(self, text):
+        """
+        Return the ids of all keywords that occur in the text.
+
+        Args:
+            text (str): The text to scan
+
+        Returns:
+            set: Keyword ids found in the text
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        found = set()
+        state = 0
+        for char in text:
+            while True:
+                next_state = goto[state].get(char)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if not state:
+                    break
+                state = fail[state]
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class Signal:
+    """
+    A single scoring rule contributed by an agent.
+
+    Kinds:
+        each: add ``weight`` once for every term found in the request
+        any: add ``weight`` once if at least one term is found
+        all: add ``weight`` once if every group has at least one term found
+        pattern: add ``weight`` once if the regex matches the request
+        places: add ``weight`` once if the gazetteer finds a place in the
+            request
+    """
+
+    __slots__ = ('kind', 'terms', 'weight')
+
+    def __init__(self, kind, terms, weight):
+        self.kind = kind
+        self.terms = terms
+        self.weight = weight
+
+    def __repr__(self):
+        return f"Signal({self.kind!r}, {self.terms!r}, {self.weight!r})"
+
+
+def keywords(terms, weight):
+    """Add ``weight`` for each of ``terms`` present in the request."""
+    return Signal('each', tuple(terms), weight)
+
+
+def any_of(terms, weight):
+    """Add ``weight`` once if any of ``terms`` is present in the request."""
+    return Signal('any', tuple(terms), weight)
+
+
+def all_of(groups, weight):
+    """Add ``weight`` once if every group in ``groups`` has a term present."""
+    return Signal('all', tuple(tuple(group) for group in groups), weight)
+
+
+def pattern(regex, weight):
+    """Add ``weight`` once if ``regex`` matches anywhere in the request."""
+    return Signal('pattern', regex, weight)
+
+
+def places(gazetteer, weight):
+    """Add ``weight`` once if ``gazetteer`` finds any place in the request."""
+    return Signal('places', gazetteer, weight)
+
+
+class RoutingSignals:
+    """
+    The complete set of scoring rules for one agent.
+
+    Signals are applied in declaration order, then the total is clamped
+    to ``[floor, cap]``.
+    """
+
+    def __init__(self, signals, floor=0.0, cap=1.0):
+        self.signals = list(signals)
+        self.floor = floor
+        self.cap = cap
+
+
+class IntentRouter:
+    """
+    Scores a request against every registered agent with one scan.
+
+    All keyword terms from all agents are compiled into a single
+    ``KeywordAutomaton`` and all patterns into one combined regex, so the
+    request is lowercased once and scanned once no matter how many agents
+    or terms are registered; place names are found by the shared gazetteer
+    in one more pass. Agents that do not provide routing signals fall back
+    to their own ``can_handle``.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._lock = threading.Lock()
+        self._compiled = None
+
+    def register(self, agent_id, agent):
+        """
+        Register an agent's routing signals.
+
+        Args:
+            agent_id (str): The id the agent is registered under
+            agent (BaseAgent): The agent instance
+        """
+        entry = (agent_id, agent, agent.routing_signals())
+        with self._lock:
+            # Re-registering keeps the original position, like a dict key
+            for index, existing in enumerate(self._entries):
+                if existing[0] == agent_id:
+                    self._entries[index] = entry
+                    break
+            else:
+                self._entries.append(entry)
+            self._compiled = None
+
+    def _compile(self):
+        """Compile the registered signals into an automaton, a regex and per-agent plans."""
+        with self._lock:
+            if self._compiled is not None:
+                return self._compiled
+
+            term_ids = {}
+            pattern_ids = {}
+
+            def term_id(term):
+                return term_ids.setdefault(term.lower(), len(term_ids))
+
+            def pattern_id(regex):
+                return pattern_ids.setdefault(regex, len(pattern_ids))
+
+            plans = []
+            for agent_id, agent, routing in self._entries:
+                if routing is None:
+                    plans.append((agent_id, agent, None, None))
+                    continue
+                steps = []
+                for signal in routing.signals:
+                    if signal.kind == 'each':
+                        steps.append(('each', tuple(term_id(t) for t in signal.terms), signal.weight))
+                    elif signal.kind == 'any':
+                        steps.append(('any', frozenset(term_id(t) for t in signal.terms), signal.weight))
+                    elif signal.kind == 'all':
+                        groups = tuple(frozenset(term_id(t) for t in group) for group in signal.terms)
+                        steps.append(('all', groups, signal.weight))
+                    elif signal.kind == 'pattern':
+                        steps.append(('pattern', pattern_id(signal.terms), signal.weight))
+                    elif signal.kind == 'places':
+                        steps.append(('places', signal.terms, signal.weight))
+                    else:
+                        raise ValueError(f"Unknown signal kind: {signal.kind}")
+                plans.append((agent_id, agent, (routing.floor, routing.cap), steps))
+
+            automaton = KeywordAutomaton(sorted(term_ids, key=term_ids.get))
+
+            # Zero-width lookaheads let every pattern be tested at every
+            # position in one finditer pass without consuming text
+            patterns = sorted(pattern_ids, key=pattern_ids.get)
+            combined = None
+            group_patterns = {}
+            if patterns:
+                combined = re.compile('|'.join(f'(?=(?P<p{i}>{regex}))' for i, regex in enumerate(patterns)))
+                group_patterns = {combined.groupindex[f'p{i}']: i for i in range(len(patterns))}
+            single = [re.compile(regex) for regex in patterns]
+
+            self._compiled = (automaton, (combined, group_patterns, single), plans)
+            logger.info(f"Compiled intent router: {len(term_ids)} terms, {len(patterns)} patterns, {len(plans)} agents")
+            return self._compiled
+
+    @staticmethod
+    def _match_patterns(compiled_patterns, text):
+        """Return the ids of all patterns that match somewhere in the text."""
+        combined, group_patterns, single = compiled_patterns
+        matched = set()
+        if combined is None:
+            return matched
+        total = len(single)
+        for match in combined.finditer(text):
+            first = group_patterns[match.lastindex]
+            matched.add(first)
+            # The alternation reports only the first pattern matching at this
+            # position, so check the later ones here explicitly
+            position = match.start()
+            for pattern_index in range(first + 1, total):
+                if pattern_index not in matched and single[pattern_index].match(text, position):
+                    matched.add(pattern_index)
+            if len(matched) == total:
+                break
+        return matched
+
+    def score(self, request):
+        """
+        Score the request for every registered agent.
+
+        Args:
+            request (str): The user's request text
+
+        Returns:
+            dict: Mapping of agent_id to confidence score (0.0 to 1.0), in
+                registration order
+        """
+        automaton, compiled_patterns, plans = self._compiled or self._compile()
+
+        request_lower = request.lower()
+        found = automaton.find_all(request_lower)
+        matched = self._match_patterns(compiled_patterns, request_lower)
+        # Agents usually share one gazetteer, so each is only run once
+        place_hits = {}
+
+        scores = {}
+        for agent_id, agent, bounds, steps in plans:
+            if steps is None:
+                scores[agent_id] = agent.can_handle(request)
+                continue
+            confidence = 0.0
+            for kind, ids, weight in steps:
+                if kind == 'each':
+                    for term in ids:
+                        if term in found:
+                            confidence += weight
+                elif kind == 'any':
+                    if not ids.isdisjoint(found):
+                        confidence += weight
+                elif kind == 'all':
+                    if all(not group.isdisjoint(found) for group in ids):
+                        confidence += weight
+                elif kind == 'places':
+                    hit = place_hits.get(id(ids))
+                    if hit is None:
+                        hit = place_hits[id(ids)] = bool(ids.find_all(request))
+                    if hit:
+                        confidence += weight
+                elif ids in matched:
+                    confidence += weight
+            floor, cap = bounds
+            scores[agent_id] = min(max(confidence, floor), cap)
+        return scores
+
+
+class RoutingResult:
+    """
+    The routing decision for one request.
+
+    Produced by ``MasterAgent.route`` and accepted by
+    ``MasterAgent.process_request`` so a request is only routed once, while
+    callers such as the server and debug tools can still inspect the scores.
+
+    Attributes:
+        request (str): The request text that was routed
+        scores (dict): Mapping of agent_id to confidence score
+        selected_agent (str): The highest scoring agent_id, or None
+        timings (dict): Stage name to duration in seconds ("routing" is
+            always present; "processing" is added by process_request)
+    """
+
+    __slots__ = ('request', 'scores', 'selected_agent', 'timings')
+
+    def __init__(self, request, scores, routing_time=0.0):
+        self.request = request
+        self.scores = scores
+        self.selected_agent = max(scores.items(), key=lambda x: x[1])[0] if scores else None
+        self.timings = {'routing': routing_time}
+
+    def to_dict(self):
+        """Return a JSON-serializable view of the routing decision."""
+        return {
+            'scores': dict(self.scores),
+            'selected_agent': self.selected_agent,
+            'timings': dict(self.timings)
+        }
+
+    def __repr__(self):
+        return f"RoutingResult(selected_agent={self.selected_agent!r}, scores={self.scores!r})"
@@ -1,6 +1,12 @@
 from .base_agent import BaseAgent
-import re
+from .intent_router import IntentRouter, RoutingResult
+from .extraction_patterns import PREFERENCE_LOCATIONS, PREFERENCE_DATES, PREFERENCE_PRICE
+import time
+import asyncio
+import contextvars
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("MasterAgent")
@@ -9,20 +15,59 @@ class MasterAgent(BaseAgent):
     """
     Master Agent responsible for coordinating the conversation flow 
     and delegating tasks to specialized agents.
+    
+    The master agent holds no per-user state: conversation history, context
+    and preferences live in the Session passed to process_request, so one
+    instance can serve every client concurrently.
+    
+    When several agents qualify for a request they run concurrently on a
+    bounded thread pool (or as asyncio tasks on the async path). Each agent
+    has its own deadline and the whole fan-out a total budget; agents that
+    miss them are abandoned and the response is marked as partial.
     """
     
-    def __init__(self):
+    def __init__(self, max_workers=8, agent_timeout=10.0, total_budget=15.0, parser=None):
+        """
+        Args:
+            max_workers (int): Size of the thread pool shared by all requests;
+                0 runs agents one after another without deadlines
+            agent_timeout (float): Default seconds each agent may take
+            total_budget (float): Seconds after which every agent still
+                running is abandoned
+            parser (RequestParser, optional): Parses each request once for
+                the selected agents; without one every agent extracts its
+                own parameters
+        """
         super().__init__(name="Master")
         self.specialized_agents = {}
-        self.conversation_history = []
-        self.user_preferences = {}
+        self.agent_timeouts = {}
+        self.router = IntentRouter()
+        self.max_workers = max_workers
+        self.agent_timeout = agent_timeout
+        self.total_budget = total_budget
+        self.parser = parser
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        
+    def register_agent(self, agent_id, agent, timeout=None):
+        """
+        Register a specialized agent with the master agent.
         
-    def register_agent(self, agent_id, agent):
-        """Register a specialized agent with the master agent."""
+        Args:
+            agent_id (str): The id used for routing and in responses
+            agent (BaseAgent): The agent
+            timeout (float, optional): Deadline for this agent, overriding
+                the master agent's agent_timeout
+        """
         logger.info(f"Registering agent: {agent_id} ({agent.name})")
         self.specialized_agents[agent_id] = agent
+        self.router.register(agent_id, agent)
+        if timeout is not None:
+            self.agent_timeouts[agent_id] = timeout
+        else:
+            self.agent_timeouts.pop(agent_id, None)
         
-    def process_request(self, request, context=None):
+    def process_request(self, request, context=None, routing=None, session=None):
         """
         Process a user request by routing to appropriate agents and 
         ensuring a coherent response.
@@ -30,57 +75,152 @@ class MasterAgent(BaseAgent):
         Args:
             request (str): The user's request text
             context (dict, optional): Additional context information
+            routing (RoutingResult, optional): A routing decision already made
+                for this request by route(); computed here if not given. Its
+                "processing" timing is filled in once the request completes.
+            session (Session, optional): The client's conversation state; the
+                request is handled without history when omitted
             
         Returns:
             dict: The consolidated response
         """
+        process_start_time = time.perf_counter()
         try:
-            # Update context and history
-            if context:
-                self.context.update(context)
-            
-            # Add request to conversation history
-            self.conversation_history.append({"role": "user", "content": request})
-            
-            # Analyze request and determine which agents to invoke
-            agent_scores = self._analyze_request(request)
-            logger.info(f"Agent scores for request: {agent_scores}")
+            request_context, routing = self._begin_request(request, context, routing, session)
             
             # Get responses from appropriate agents
-            responses = self._collect_agent_responses(request, agent_scores)
+            responses = self._collect_agent_responses(request, routing.scores, request_context)
             
-            # Check if we got any valid responses
-            if not responses:
-                logger.warning("No agent was able to provide a response")
-                apology_response = {
-                    "content": "I apologize, but I couldn't find a suitable response to your query. Could you please rephrase or provide more details about what you're looking for?",
-                    "type": "text"
-                }
-                self.conversation_history.append({"role": "assistant", "content": apology_response["content"]})
-                return apology_response
+            return self._finish_request(responses, session)
             
-            # Consolidate and validate responses
-            final_response = self._consolidate_responses(responses)
+        except Exception as e:
+            return self._error_response(e, session)
+        finally:
+            if routing is not None:
+                routing.timings['processing'] = time.perf_counter() - process_start_time
+    
+    async def aprocess_request(self, request, context=None, routing=None, session=None):
+        """
+        Awaitable version of process_request for the async serving path.
+        
+        Routing and consolidation are identical; specialized agents are
+        awaited through their aprocess_request.
+        
+        Returns:
+            dict: The consolidated response
+        """
+        process_start_time = time.perf_counter()
+        try:
+            request_context, routing = self._begin_request(request, context, routing, session)
             
-            # Add response to conversation history
-            self.conversation_history.append({"role": "assistant", "content": final_response["content"]})
+            # Get responses from appropriate agents
+            responses = await self._acollect_agent_responses(request, routing.scores, request_context)
             
-            return final_response
+            return self._finish_request(responses, session)
             
         except Exception as e:
-            # Log the error
-            logger.error(f"Error processing request: {str(e)}")
-            
-            # Create an apology response
+            return self._error_response(e, session)
+        finally:
+            if routing is not None:
+                routing.timings['processing'] = time.perf_counter() - process_start_time
+    
+    def _begin_request(self, request, context, routing, session):
+        """
+        Prepare a request: merge context, record the user turn and route.
+        
+        Returns:
+            tuple: The context for this request and the RoutingResult
+        """
+        # Merge new context into the session and build this request's context
+        request_context = {}
+        if session is not None:
+            if context:
+                session.context.update(context)
+            request_context.update(session.context)
+        elif context:
+            request_context.update(context)
+        
+        # Add request to conversation history
+        self._record_turn(session, "user", request)
+        
+        # Analyze request and determine which agents to invoke
+        if routing is None:
+            routing = self.route(request)
+        logger.info(f"Agent scores for request: {routing.scores}")
+        
+        return request_context, routing
+    
+    def _finish_request(self, responses, session):
+        """Consolidate agent responses and record the assistant turn."""
+        timed_out = [resp["agent_id"] for resp in responses if resp.get("timed_out")]
+        if timed_out:
+            responses = [resp for resp in responses if not resp.get("timed_out")]
+        
+        # Check if we got any valid responses
+        if not responses:
+            if timed_out:
+                logger.warning(f"Every selected agent timed out: {timed_out}")
+                content = "I apologize, but the search is taking longer than expected. Please try again in a moment."
+            else:
+                logger.warning("No agent was able to provide a response")
+                content = "I apologize, but I couldn't find a suitable response to your query. Could you please rephrase or provide more details about what you're looking for?"
             apology_response = {
-                "content": f"I apologize, but I encountered an issue while processing your request. Please try again or rephrase your question. Error: {str(e)}",
+                "content": content,
                 "type": "text"
             }
-            
-            # Still add to history so we maintain context
-            self.conversation_history.append({"role": "assistant", "content": apology_response["content"]})
-            
+            if timed_out:
+                apology_response["partial"] = True
+                apology_response["timed_out_agents"] = timed_out
+            self._record_turn(session, "assistant", apology_response["content"])
             return apology_response
+        
+        # Consolidate and validate responses
+        final_response = self._consolidate_responses(responses)
+        
+        # Flag answers that are missing some agents' contributions
+        if timed_out:
+            final_response = dict(final_response, partial=True, timed_out_agents=timed_out)
+        
+        # Add response to conversation history
+        self._record_turn(session, "assistant", final_response["content"])
+        
+        return final_response
+    
+    def _error_response(self, error, session):
+        """Build the apology returned when processing fails."""
+        # Log the error
+        logger.error(f"Error processing request: {str(error)}")
+        
+        # Create an apology response
+        apology_response = {
+            "content": f"I apologize, but I encountered an issue while processing your request. Please try again or rephrase your question. Error: {str(error)}",
+            "type": "text"
+        }
+        
+        # Still add to history so we maintain context
+        self._record_turn(session, "assistant", apology_response["content"])
+        
+        return apology_response
+    
+    @staticmethod
+    def _record_turn(session, role, content):
+        """Add a turn to the session's conversation history, if there is a session."""
+        if session is not None:
+            session.add_turn(role, content)
+    
+    def route(self, request):
+        """
+        Decide which specialized agents should handle the request.
+        
+        Args:
+            request (str): The user's request text
+            
+        Returns:
+            RoutingResult: Agent scores, the selected agent and routing time
+        """
+        start_time = time.perf_counter()
+        agent_scores = self._analyze_request(request)
+        return RoutingResult(request, agent_scores, time.perf_counter() - start_time)
     
     def _analyze_request(self, request):
         """
@@ -91,9 +231,8 @@ class MasterAgent(BaseAgent):
         """
         agent_scores = {}
         
-        # Have each agent evaluate if it can handle this request
-        for agent_id, agent in self.specialized_agents.items():
-            confidence = agent.can_handle(request)
+        # Score every agent in a single pass over the request
+        for agent_id, confidence in self.router.score(request).items():
             if confidence > 0.0:
                 agent_scores[agent_id] = confidence
         
@@ -103,55 +242,191 @@ class MasterAgent(BaseAgent):
             
         return agent_scores
     
-    def _collect_agent_responses(self, request, agent_scores):
+    def _select_agents(self, agent_scores):
         """
-        Collect responses from appropriate agents based on confidence scores.
+        Pick the agents that should respond, highest confidence first.
         
         Args:
-            request (str): The user's request
             agent_scores (dict): Mapping of agent_id to confidence score
             
         Returns:
-            list: Responses from individual agents
+            list: (agent_id, score, agent) tuples
         """
-        responses = []
-        
         # Sort agents by confidence score
         sorted_agents = sorted(agent_scores.items(), key=lambda x: x[1], reverse=True)
         
         # Get response from the top agent(s)
         threshold = 0.5  # Only consider agents with confidence > 0.5
         
-        for agent_id, score in sorted_agents:
-            if score < threshold:
-                continue
-                
-            if agent_id in self.specialized_agents:
-                agent = self.specialized_agents[agent_id]
-                response = agent.process_request(request, self.context)
+        return [
+            (agent_id, score, self.specialized_agents[agent_id])
+            for agent_id, score in sorted_agents
+            if score >= threshold and agent_id in self.specialized_agents
+        ]
+    
+    def _share_parsed_request(self, request, selected, context):
+        """
+        Parse the request once and add it to the context the selected agents get.
+        
+        Returns:
+            dict: The context to pass to the agents
+        """
+        if self.parser is None or not any(agent.uses_parsed_request for _, _, agent in selected):
+            return context
+        try:
+            parsed = self.parser.parse(request)
+        except Exception as e:
+            # Agents fall back to their own extraction
+            logger.error(f"Error parsing request: {str(e)}")
+            return context
+        return dict(context or {}, parsed_request=parsed)
+    
+    @staticmethod
+    def _fallback_responses():
+        """Responses used when no agent was selected."""
+        # If we have no responses, provide a fallback with an apology
+        return [{
+            "agent_id": "fallback",
+            "confidence": 1.0,
+            "response": {
+                "content": "I apologize, but I'm not sure how to help with that specific request. Could you please provide more details about what you're looking for, or try a different query?",
+                "type": "text"
+            }
+        }]
+    
+    def _timeout_for(self, agent_id):
+        """Return the deadline in seconds for an agent."""
+        return self.agent_timeouts.get(agent_id, self.agent_timeout)
+    
+    def _get_executor(self):
+        """Create the shared agent thread pool on first use."""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix="agent")
+        return self._executor
+    
+    @staticmethod
+    def _timed_out_entry(agent_id, score):
+        """Placeholder for an agent that missed its deadline."""
+        return {
+            "agent_id": agent_id,
+            "confidence": score,
+            "response": None,
+            "timed_out": True
+        }
+    
+    def _collect_agent_responses(self, request, agent_scores, context=None):
+        """
+        Collect responses from appropriate agents based on confidence scores.
+        
+        The selected agents run concurrently. Results are merged in selection
+        order (highest confidence first) whatever order they finish in; an
+        agent that misses its deadline or the total budget is recorded with
+        "timed_out" set instead of a response.
+        
+        Args:
+            request (str): The user's request
+            agent_scores (dict): Mapping of agent_id to confidence score
+            context (dict, optional): Context to pass to each agent
+            
+        Returns:
+            list: Responses from individual agents
+        """
+        selected = self._select_agents(agent_scores)
+        if not selected:
+            return self._fallback_responses()
+        context = self._share_parsed_request(request, selected, context)
+        
+        if not self.max_workers:
+            return [
+                {"agent_id": agent_id, "confidence": score, "response": agent.process_request(request, context)}
+                for agent_id, score, agent in selected
+            ]
+        
+        start_time = time.monotonic()
+        budget_deadline = start_time + self.total_budget
+        executor = self._get_executor()
+        # Agents run with the caller's context variables (e.g. the current
+        # trace), as they do under asyncio.to_thread on the async path
+        futures = [
+            (agent_id, score, executor.submit(contextvars.copy_context().run, agent.process_request, request, context))
+            for agent_id, score, agent in selected
+        ]
+        
+        responses = []
+        try:
+            for agent_id, score, future in futures:
+                deadline = min(start_time + self._timeout_for(agent_id), budget_deadline)
+                try:
+                    response = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except FuturesTimeoutError:
+                    # A running thread cannot be stopped; its result is simply discarded
+                    future.cancel()
+                    logger.warning(f"Agent {agent_id} timed out after {time.monotonic() - start_time:.2f}s")
+                    responses.append(self._timed_out_entry(agent_id, score))
+                    continue
                 responses.append({
                     "agent_id": agent_id,
                     "confidence": score,
                     "response": response
                 })
+        except BaseException:
+            for _, _, future in futures:
+                future.cancel()
+            raise
         
-        # If we have no responses, provide a fallback with an apology
-        if not responses:
+        return responses
+    
+    async def _acollect_agent_responses(self, request, agent_scores, context=None):
+        """Awaitable version of _collect_agent_responses using asyncio tasks."""
+        selected = self._select_agents(agent_scores)
+        if not selected:
+            return self._fallback_responses()
+        context = self._share_parsed_request(request, selected, context)
+        
+        if not self.max_workers:
+            return [
+                {"agent_id": agent_id, "confidence": score, "response": await agent.aprocess_request(request, context)}
+                for agent_id, score, agent in selected
+            ]
+        
+        tasks = [
+            asyncio.ensure_future(asyncio.wait_for(agent.aprocess_request(request, context),
+                                                   self._timeout_for(agent_id)))
+            for agent_id, _, agent in selected
+        ]
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=self.total_budget)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        
+        responses = []
+        for (agent_id, score, _), task in zip(selected, tasks):
+            if task in pending or isinstance(task.exception(), asyncio.TimeoutError):
+                logger.warning(f"Agent {agent_id} timed out")
+                responses.append(self._timed_out_entry(agent_id, score))
+                continue
             responses.append({
-                "agent_id": "fallback",
-                "confidence": 1.0,
-                "response": {
-                    "content": "I apologize, but I'm not sure how to help with that specific request. Could you please provide more details about what you're looking for, or try a different query?",
-                    "type": "text"
-                }
+                "agent_id": agent_id,
+                "confidence": score,
+                "response": task.result()
             })
-            
+        
         return responses
     
     def _consolidate_responses(self, responses):
         """
         Consolidate multiple agent responses into a coherent final response.
         
+        The responses arrive highest confidence first. The first one with
+        typed results (flights, hotels or packages) lends its type and
+        results to the consolidated response, so they can still be paged
+        and projected; the other agents' content is appended to it.
+        
         Args:
             responses (list): List of agent responses
             
@@ -166,11 +441,17 @@ class MasterAgent(BaseAgent):
         consolidated_content = ""
         flight_results = []
         hotel_results = []
+        primary = None
         
         for resp in responses:
             agent_id = resp["agent_id"]
             agent_response = resp["response"]
             
+            # Keep the top-scoring agent's typed results
+            if (primary is None and agent_response.get("type") in ("flights", "hotels", "packages")
+                    and "results" in agent_response):
+                primary = agent_response
+            
             # Extract results from different agents
             if agent_id == "flights" and "results" in agent_response:
                 flight_results.extend(agent_response["results"])
@@ -188,6 +469,9 @@ class MasterAgent(BaseAgent):
             "content": consolidated_content,
             "type": "text"
         }
+        if primary is not None:
+            final_response["type"] = primary["type"]
+            final_response["results"] = primary["results"]
         
         # Add any results
         if flight_results:
@@ -197,21 +481,34 @@ class MasterAgent(BaseAgent):
             
         return final_response
     
-    def extract_user_preferences(self, request):
-        """Extract and update user preferences from the request."""
+    def extract_user_preferences(self, request, preferences=None):
+        """
+        Extract user preferences from the request.
+        
+        Args:
+            request (str): The user's request text
+            preferences (dict, optional): Existing preferences to update in
+                place, typically ``session.user_preferences``
+            
+        Returns:
+            dict: The updated preferences
+        """
+        if preferences is None:
+            preferences = {}
+        
         # Extract location preferences
-        locations = re.findall(r'(?:from|to)\s+([A-Za-z\s]+)', request)
+        locations = PREFERENCE_LOCATIONS.findall(request)
         if locations:
-            self.user_preferences["locations"] = locations
+            preferences["locations"] = locations
             
         # Extract date preferences
-        date_match = re.search(r'(?:on|in|around|during)\s+([A-Za-z]+\s+\d{1,2}(?:st|nd|rd|th)?(?:\s*-\s*\d{1,2}(?:st|nd|rd|th)?)?)', request)
+        date_match = PREFERENCE_DATES.search(request)
         if date_match:
-            self.user_preferences["dates"] = date_match.group(1)
+            preferences["dates"] = date_match.group(1)
             
         # Extract price preferences
-        price_match = re.search(r'(?:under|below|around|about)\s+\$?(\d+)', request)
+        price_match = PREFERENCE_PRICE.search(request)
         if price_match:
-            self.user_preferences["max_price"] = int(price_match.group(1))
+            preferences["max_price"] = int(price_match.group(1))
             
-        return self.user_preferences
+        return preferences
@@ -0,0 +1,488 @@
+import os
+import zlib
+import threading
+from datetime import date, timedelta
+import numpy as np
+from .offers import flight_offer, hotel_offer
+
+# Provider name recorded on generated offers
+PROVIDER = 'mock'
+
+AIRLINES = ['Saudi Arabian Airlines', 'Emirates', 'Qatar Airways', 'Turkish Airlines', 'Etihad Airways']
+PACKAGE_AIRLINES = [
+    'Saudi Airlines', 'Emirates', 'Qatar Airways', 'Etihad Airways',
+    'Turkish Airlines', 'Gulf Air', 'Flynas', 'Flyadeal'
+]
+CABIN_CLASSES = ['Economy', 'Economy Plus', 'Business', 'First']
+STOPOVERS = [None, '1 stop in Dubai', '1 stop in Istanbul', '1 stop in Doha']
+
+HOTEL_CHAINS = [
+    "Hilton", "Marriott", "Hyatt", "Sheraton", "Four Seasons",
+    "Ritz-Carlton", "Westin", "Holiday Inn", "InterContinental",
+    "Radisson", "Fairmont", "Waldorf Astoria", "St. Regis", "W Hotels"
+]
+PACKAGE_HOTELS = [
+    'Grand Hyatt', 'Marriott Hotel', 'Four Seasons', 'The Ritz-Carlton',
+    'Hilton Hotel', 'Shangri-La', 'Radisson Blu', 'Intercontinental',
+    'Holiday Inn', 'Crowne Plaza', 'Mövenpick', 'Novotel'
+]
+ROOM_TYPES = ['Standard', 'Deluxe', 'Suite', 'Executive', 'Family']
+BOARD_TYPES = ['Room Only', 'Breakfast Included', 'Half Board', 'Full Board', 'All Inclusive']
+
+AMENITIES = [
+    "Free WiFi", "Swimming pool", "Fitness center", "Restaurant",
+    "Room service", "Spa", "Airport shuttle", "Business center",
+    "Free parking", "Breakfast included", "Air conditioning",
+    "Concierge service", "Hot tub", "Bar/Lounge"
+]
+
+# Neighbourhoods used in hotel names
+AREAS = {
+    "DMM": ["Dammam", "Corniche", "Al Khobar", "Dhahran", "Eastern Province"],
+    "JED": ["Jeddah", "Red Sea", "Al Balad", "Corniche", "Andalus"],
+    "RUH": ["Riyadh", "Kingdom Centre", "Olaya", "Diplomatic Quarter", "Al Faisaliah"],
+    "DXB": ["Dubai", "Marina", "Downtown", "Palm Jumeirah", "Business Bay"],
+    "BKK": ["Bangkok", "Sukhumvit", "Riverside", "Silom", "Siam"],
+    "IST": ["Istanbul", "Bosphorus", "Taksim", "Sultanahmet", "Beyoglu"],
+    "CAI": ["Cairo", "Nile", "Giza", "Heliopolis", "Zamalek"],
+    "LHR": ["London", "Westminster", "Kensington", "Mayfair", "Chelsea"],
+    "CDG": ["Paris", "Champs-Élysées", "Eiffel", "Opera", "Louvre"],
+    "JFK": ["New York", "Manhattan", "Times Square", "Central Park", "Broadway"]
+}
+DEFAULT_AREAS = ["City Center", "Downtown", "Plaza", "Boulevard", "Resort"]
+
+# One-way economy fares by route; other routes use DEFAULT_BASE_PRICE
+BASE_PRICES = {
+    ('DMM', 'JED'): 200,
+    ('DMM', 'RUH'): 150,
+    ('DMM', 'DXB'): 300,
+    ('DMM', 'BKK'): 450,
+    ('JED', 'DMM'): 200,
+    ('JED', 'RUH'): 180,
+    ('JED', 'DXB'): 280,
+    ('RUH', 'DMM'): 150,
+    ('RUH', 'JED'): 180,
+    ('RUH', 'DXB'): 250,
+    ('RUH', 'IST'): 380
+}
+DEFAULT_BASE_PRICE = 350
+
+# A round trip costs this much more than one way
+ROUND_TRIP_FACTOR = 1.8
+
+_QUARTER_HOURS = np.array([0, 15, 30, 45])
+
+
+def _to_date(value, default):
+    """Accept a date, an ISO date string or None."""
+    if value is None:
+        return default
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return default
+
+
+def _durations(minutes):
+    """Format minute counts as "5h 6m"."""
+    return [f"{total // 60}h {total % 60}m" for total in minutes.tolist()]
+
+
+def _clock(minutes):
+    """Format minutes after midnight as "HH:MM"."""
+    return [f"{total // 60:02d}:{total % 60:02d}" for total in minutes.tolist()]
+
+
+def _timestamps(values):
+    """Format datetime64 values as "YYYY-MM-DD HH:MM"."""
+    return [value.replace("T", " ") for value in np.datetime_as_string(values, unit="m").tolist()]
+
+
+def decode(table, codes):
+    """Look up the labels of a categorical column."""
+    return [table[code] for code in codes.tolist()]
+
+
+def _departure_minutes(rng, count, first_hour, last_hour):
+    """Minutes after midnight on the quarter hour, between two hours."""
+    return rng.integers(first_hour, last_hour, count) * 60 + _QUARTER_HOURS[rng.integers(0, 4, count)]
+
+
+def _amenity_sets(rng, count, fewest, most):
+    """
+    Draw an amenity set per offer as a count x len(AMENITIES) boolean matrix.
+
+    Each row gets between ``fewest`` and ``most`` distinct amenities: a
+    random permutation per row is drawn with one argsort and its first k
+    positions are switched on.
+    """
+    order = rng.random((count, len(AMENITIES))).argsort(axis=1)
+    chosen = np.arange(len(AMENITIES)) < rng.integers(fewest, most + 1, count)[:, None]
+    offered = np.empty((count, len(AMENITIES)), dtype=bool)
+    np.put_along_axis(offered, order, chosen, axis=1)
+    return offered
+
+
+def records(columns, limit=None):
+    """
+    Turn a column batch into a list of row dicts.
+
+    Args:
+        columns (dict): Column name -> NumPy array or list, all one length
+        limit (int, optional): Convert only the first ``limit`` rows
+
+    Returns:
+        list: One dict per row, holding plain Python values
+    """
+    names = list(columns)
+    values = [column[:limit].tolist() if hasattr(column, "tolist") else list(column[:limit])
+              for column in columns.values()]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+class MockInventory:
+    """
+    Synthetic flights, hotels and packages for demos and load tests.
+
+    Offers are sampled column by column with NumPy, so a batch of a million
+    costs a handful of array operations rather than a million Python loop
+    iterations. Every batch draws from a generator seeded with the
+    inventory seed plus a stable hash of the route or location and the
+    travel date, so the same search always returns the same offers while
+    different routes and dates differ. Prices, dates, stay lengths and
+    requested amenities follow the search parameters.
+
+    Batches are dicts of equal-length NumPy columns, sorted by price.
+    Categorical columns hold indexes into the module's tables (AIRLINES,
+    HOTEL_CHAINS, ...) rather than strings, which keeps them compact;
+    ``records`` and ``decode`` turn them into plain values, and the
+    ``*_results`` methods return the dicts the agents have always shown.
+    """
+
+    def __init__(self, seed=0):
+        """
+        Args:
+            seed (int): Base seed; inventories with the same seed generate
+                identical offers
+        """
+        self.seed = seed
+        self._amenity_index = {name.lower(): i for i, name in enumerate(AMENITIES)}
+
+    def rng(self, *key):
+        """
+        Return a generator seeded for one search.
+
+        Args:
+            *key: Values identifying the search, e.g. ("flights", "DMM", "JED", "2026-05-01")
+
+        Returns:
+            numpy.random.Generator: A fresh generator; equal keys give equal streams
+        """
+        digest = zlib.crc32("\x1f".join(str(part) for part in key).encode("utf-8"))
+        return np.random.default_rng([self.seed, digest])
+
+    def flights(self, departure, arrival, outbound_date=None, count=1000, return_date=None, max_price=None):
+        """
+        Generate flight offers for one route and day.
+
+        Args:
+            departure (str): Departure airport code
+            arrival (str): Arrival airport code
+            outbound_date (date or str, optional): Day of departure; defaults to today
+            count (int): Offers to sample before the price filter
+            return_date (date or str, optional): Makes every offer a round trip
+            max_price (int, optional): Drop offers above this price
+
+        Returns:
+            dict: Columns "airline" (AIRLINES index), "flight_number",
+                "price", "departure" (datetime64[m]), "duration_minutes"
+                and, for round trips, "return" (datetime64[m])
+        """
+        day = _to_date(outbound_date, date.today())
+        back = _to_date(return_date, None)
+        rng = self.rng("flights", departure, arrival, day.isoformat(), back)
+
+        base_price = BASE_PRICES.get((departure, arrival), DEFAULT_BASE_PRICE)
+        if back is not None:
+            base_price *= ROUND_TRIP_FACTOR
+        price = (base_price * rng.uniform(0.8, 1.2, count)).astype(np.int32)
+        columns = {
+            "airline": rng.integers(0, len(AIRLINES), count, dtype=np.int8),
+            "flight_number": rng.integers(100, 1000, count, dtype=np.int16),
+            "price": price,
+            "departure": np.datetime64(day, "m") + _departure_minutes(rng, count, 6, 23).astype("timedelta64[m]"),
+            "duration_minutes": (rng.integers(1, 9, count) * 60 + rng.integers(0, 60, count)).astype(np.int16),
+        }
+        if back is not None:
+            columns["return"] = np.datetime64(back, "m") + _departure_minutes(rng, count, 6, 23).astype("timedelta64[m]")
+        return self._select(columns, price, price <= max_price if max_price else None)
+
+    def hotels(self, location, check_in=None, check_out=None, count=1000, max_price=300, amenities=()):
+        """
+        Generate hotel offers for one location and stay.
+
+        Args:
+            location (str): Airport code or city name
+            check_in (date or str, optional): Defaults to tomorrow
+            check_out (date or str, optional): Defaults to three nights later
+            count (int): Offers to generate
+            max_price (int): Highest nightly price; offers fall between 70%
+                and 100% of it
+            amenities (iterable): Amenity names every offer must include
+
+        Returns:
+            dict: Columns "chain" (HOTEL_CHAINS index), "area" (index into
+                areas(location)), "price_per_night", "total_price",
+                "rating", "reviews" and "amenities" (a count x
+                len(AMENITIES) boolean matrix)
+        """
+        first_night = _to_date(check_in, date.today() + timedelta(days=1))
+        last_day = _to_date(check_out, first_night + timedelta(days=3))
+        nights = max((last_day - first_night).days, 1)
+        rng = self.rng("hotels", location, first_night.isoformat())
+
+        price = (max_price * rng.uniform(0.7, 1.0, count)).astype(np.int32)
+        offered = _amenity_sets(rng, count, 4, 8)
+        required = [self._amenity_index[name.lower()] for name in amenities if name.lower() in self._amenity_index]
+        offered[:, required] = True
+        columns = {
+            "chain": rng.integers(0, len(HOTEL_CHAINS), count, dtype=np.int8),
+            "area": rng.integers(0, len(self.areas(location)), count, dtype=np.int8),
+            "price_per_night": price,
+            "total_price": price * nights,
+            "rating": np.round(rng.uniform(3.5, 5.0, count), 1),
+            "reviews": rng.integers(50, 1501, count, dtype=np.int16),
+            "amenities": offered,
+        }
+        return self._select(columns, price, None)
+
+    @staticmethod
+    def areas(location):
+        """Neighbourhood names used for hotels in a location."""
+        return AREAS.get(location, DEFAULT_AREAS)
+
+    def packages(self, departure, destination, outbound_date=None, return_date=None, count=1000, adults=1,
+                 children=0, max_price=None, hotel_rating=4, package_type='round_trip'):
+        """
+        Generate flight-plus-hotel packages for one route and date.
+
+        Args:
+            departure (str): Departure airport code
+            destination (str): Destination airport code or city
+            outbound_date (date or str, optional): Defaults to today
+            return_date (date or str, optional): Sets the number of nights;
+                without it each package lasts three to seven nights
+            count (int): Packages to sample before the price filter
+            adults (int): Adults travelling
+            children (int): Children travelling, charged at 70%
+            max_price (int, optional): Drop packages above this price
+            hotel_rating (int): Star rating asked for; hotels are within one star
+            package_type (str): "round_trip" or "one_way"
+
+        Returns:
+            dict: Columns "id", "airline" (PACKAGE_AIRLINES index),
+                "flight_number" (see flight_number_label), "departure_minute",
+                "arrival_minute", "duration_minutes", "cabin"
+                (CABIN_CLASSES index), "stopover" (STOPOVERS index), "hotel"
+                (PACKAGE_HOTELS index), "rating", "room_type" (ROOM_TYPES
+                index), "board_type" (BOARD_TYPES index), "amenities",
+                "nights", "price", "original_price", "savings" and
+                "savings_percent"
+        """
+        day = _to_date(outbound_date, date.today())
+        back = _to_date(return_date, None)
+        rng = self.rng("packages", departure, destination, day.isoformat(), back)
+
+        cabin = rng.integers(0, len(CABIN_CLASSES), count, dtype=np.int8)
+        rating = np.clip(hotel_rating + np.array([-1, 0, 0, 1])[rng.integers(0, 4, count)], 1, 5).astype(np.int8)
+        if back is not None and back > day:
+            nights = np.full(count, (back - day).days, dtype=np.int16)
+        else:
+            nights = rng.integers(3, 8, count, dtype=np.int16)
+
+        base_price = 300 + rating.astype(np.int32) * 100 + np.where(cabin != 0, 300, 0)
+        if package_type == 'round_trip':
+            base_price = base_price * ROUND_TRIP_FACTOR
+        variation = rng.uniform(0.85, 1.15, count)
+        price = np.round(base_price * variation * adults + base_price * 0.7 * variation * children).astype(np.int32)
+        original_price = np.round(price * rng.uniform(1.15, 1.3, count)).astype(np.int32)
+        savings = original_price - price
+
+        columns = {
+            "id": rng.integers(10000, 100000, count, dtype=np.int32),
+            "airline": rng.integers(0, len(PACKAGE_AIRLINES), count, dtype=np.int8),
+            "flight_number": rng.integers(0, 26 * 26 * 900, count, dtype=np.int32),
+            "departure_minute": _departure_minutes(rng, count, 0, 24).astype(np.int16),
+            "arrival_minute": _departure_minutes(rng, count, 0, 24).astype(np.int16),
+            "duration_minutes": (rng.integers(1, 9, count) * 60 + rng.integers(0, 56, count)).astype(np.int16),
+            "cabin": cabin,
+            "stopover": rng.integers(0, len(STOPOVERS), count, dtype=np.int8),
+            "hotel": rng.integers(0, len(PACKAGE_HOTELS), count, dtype=np.int8),
+            "rating": rating,
+            "room_type": rng.integers(0, len(ROOM_TYPES), count, dtype=np.int8),
+            "board_type": rng.integers(0, len(BOARD_TYPES), count, dtype=np.int8),
+            "amenities": _amenity_sets(rng, count, 3, 6),
+            "nights": nights,
+            "price": price,
+            "original_price": original_price,
+            "savings": savings,
+            "savings_percent": np.round(savings / original_price * 100).astype(np.int8),
+        }
+        return self._select(columns, price, price <= max_price if max_price else None)
+
+    @staticmethod
+    def flight_number_label(code):
+        """Format a package flight number code as e.g. "SV123"."""
+        letters, number = divmod(code, 900)
+        first, second = divmod(letters, 26)
+        return f"{chr(65 + first)}{chr(65 + second)}{100 + number}"
+
+    @staticmethod
+    def _select(columns, price, mask):
+        """Apply a row filter and sort every column by price."""
+        if mask is not None:
+            order = np.flatnonzero(mask)
+            order = order[np.argsort(price[order], kind="stable")]
+        else:
+            order = np.argsort(price, kind="stable")
+        return {name: column[order] for name, column in columns.items()}
+
+    def flight_results(self, params, count=None):
+        """
+        Flight results in the shape FlightsAgent returns.
+
+        Args:
+            params (dict): Flight search parameters
+            count (int, optional): Offers to sample; by default two to four,
+                drawn from the search's own generator
+
+        Returns:
+            list: Result dicts sorted by price
+        """
+        departure = params.get('departure_id') or 'DMM'
+        arrival = params.get('arrival_id') or 'JED'
+        return_date = params.get('return_date') if params.get('flight_type') == 'round_trip' else None
+        if count is None:
+            count = int(self.rng("flights.count", departure, arrival, params.get('outbound_date')).integers(2, 5))
+        columns = self.flights(departure, arrival, params.get('outbound_date'), count, return_date,
+                               params.get('max_price'))
+        departures = _timestamps(columns["departure"])
+        arrivals = _timestamps(columns["departure"] + columns["duration_minutes"].astype("timedelta64[m]"))
+        returns = _timestamps(columns["return"]) if "return" in columns else None
+        airlines = decode(AIRLINES, columns["airline"])
+        results = []
+        for i, row in enumerate(records(columns)):
+            results.append(flight_offer(
+                PROVIDER, f"{departure}{arrival}-{departures[i][:10]}-{row['airline']}{row['flight_number']}",
+                departure, arrival, airlines[i], departures[i], row["price"], row["duration_minutes"],
+                arrival=arrivals[i], return_departure=returns[i] if returns else None
+            ))
+        return results
+
+    def hotel_results(self, params, count=None):
+        """
+        Hotel results in the shape HotelsAgent returns.
+
+        Args:
+            params (dict): Hotel search parameters
+            count (int, optional): Offers to generate; two to four by default
+
+        Returns:
+            list: Result dicts sorted by price
+        """
+        location = params.get('location') or 'Unknown'
+        if count is None:
+            count = int(self.rng("hotels.count", location, params.get('check_in')).integers(2, 5))
+        columns = self.hotels(location, params.get('check_in'), params.get('check_out'), count,
+                              params.get('max_price') or 300, params.get('amenities') or ())
+        areas = self.areas(location)
+        display_location = location if len(location) == 3 else location.title()
+        results = []
+        for i, (row, offered) in enumerate(zip(records(columns), columns["amenities"])):
+            results.append(hotel_offer(
+                PROVIDER, f"{location}-{params.get('check_in')}-{i}",
+                f"{HOTEL_CHAINS[row['chain']]} {areas[row['area']]}", display_location,
+                row["price_per_night"], row["total_price"], row["rating"], row["reviews"],
+                [AMENITIES[j] for j in np.flatnonzero(offered)]
+            ))
+        return results
+
+    def package_results(self, params, city_name, count=None):
+        """
+        Package results in the shape PackageAgent returns.
+
+        Args:
+            params (dict): Package search parameters
+            city_name (str): Display name of the destination
+            count (int, optional): Packages to sample before the price
+                filter; three to five by default
+
+        Returns:
+            list: Result dicts sorted by price
+        """
+        if count is None:
+            count = int(self.rng("packages.count", params['departure'], params['destination'],
+                                 params.get('outbound_date')).integers(3, 6))
+        package_type = params.get('package_type', 'round_trip')
+        columns = self.packages(params['departure'], params['destination'], params.get('outbound_date'),
+                                params.get('return_date'), count, params['adults'], params['children'],
+                                params.get('max_price'), params['hotel_rating'], package_type)
+        departure_times = _clock(columns["departure_minute"])
+        arrival_times = _clock(columns["arrival_minute"])
+        durations = _durations(columns["duration_minutes"])
+        packages = []
+        for i, row in enumerate(records(columns)):
+            flight = {
+                'airline': PACKAGE_AIRLINES[row['airline']],
+                'flight_number': self.flight_number_label(row['flight_number']),
+                'departure_airport': params['departure'],
+                'arrival_airport': params['destination'],
+                'departure_time': departure_times[i],
+                'arrival_time': arrival_times[i],
+                'duration': durations[i],
+                'class': CABIN_CLASSES[row['cabin']],
+                'stopover': STOPOVERS[row['stopover']]
+            }
+            hotel = {
+                'name': PACKAGE_HOTELS[row['hotel']],
+                'rating': row['rating'],
+                'location': city_name,
+                'amenities': [AMENITIES[j] for j in np.flatnonzero(columns["amenities"][i])],
+                'room_type': ROOM_TYPES[row['room_type']],
+                'board_type': BOARD_TYPES[row['board_type']]
+            }
+            packages.append({
+                'id': f"PKG-{row['id']}",
+                'name': f"{flight['airline']} {hotel['name']} {params['destination']} Package",
+                'flight': flight,
+                'hotel': hotel,
+                'price': row['price'],
+                'original_price': row['original_price'],
+                'savings': row['savings'],
+                'savings_percent': row['savings_percent'],
+                'nights': row['nights'],
+                'package_type': package_type,
+                'outbound_date': params.get('outbound_date')
+            })
+        return packages
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_inventory():
+    """
+    Return the inventory shared by all agents, creating it on first use.
+
+    The base seed comes from the RAHALAH_INVENTORY_SEED environment
+    variable (default 0).
+    """
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = MockInventory(int(os.environ.get("RAHALAH_INVENTORY_SEED", "0")))
+    return _default
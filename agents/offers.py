@@ -0,0 +1,126 @@
+import re
+
+# Every inventory provider returns offers in this shape, which is also what
+# the chat frontend renders; keys a provider cannot fill are None
+
+FLIGHT_FIELDS = (
+    'id', 'provider', 'from', 'to', 'airline', 'departure', 'arrival', 'duration', 'duration_minutes',
+    'stops', 'price', 'currency', 'return', 'bookingUrl'
+)
+HOTEL_FIELDS = (
+    'id', 'provider', 'name', 'location', 'address', 'price', 'price_per_night', 'total_price', 'currency',
+    'rating', 'reviews', 'stars', 'amenities', 'image', 'bookingUrl'
+)
+
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)*')
+
+
+def format_duration(minutes):
+    """Format a duration in minutes as "5h 6m"."""
+    if minutes is None:
+        return None
+    return f"{minutes // 60}h {minutes % 60}m"
+
+
+def parse_price(value):
+    """
+    Read a price written as a number, "$120", "1,250 SAR" or a searchapi.io
+    price object ({"extracted_price": 120, ...}).
+
+    Returns:
+        int: The price, or None if there is none
+    """
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return parse_price(value.get('extracted_price', value.get('extracted_lowest', value.get('lowest'))))
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = _NUMBER.search(str(value))
+    if match is None:
+        return None
+    return int(float(match.group(0).replace(',', '')))
+
+
+def flight_offer(provider, offer_id, departure_id, arrival_id, airline, departure, price, duration_minutes=None,
+                 arrival=None, stops=0, currency='USD', return_departure=None, booking_url='#'):
+    """
+    Build a normalized flight offer.
+
+    Args:
+        provider (str): Name of the provider the offer came from
+        offer_id (str): Identifier, unique within the provider
+        departure_id (str): Departure airport code
+        arrival_id (str): Arrival airport code
+        airline (str): Operating airline of the first leg
+        departure (str): Departure time as "YYYY-MM-DD HH:MM"
+        price (int): Total price
+        duration_minutes (int, optional): Total travel time
+        arrival (str, optional): Arrival time as "YYYY-MM-DD HH:MM"
+        stops (int): Connections
+        currency (str): ISO currency code of the price
+        return_departure (str, optional): Departure time of the return flight
+        booking_url (str): Where the offer can be booked
+
+    Returns:
+        dict: The offer, with every key in FLIGHT_FIELDS
+    """
+    return {
+        'id': offer_id,
+        'provider': provider,
+        'from': departure_id,
+        'to': arrival_id,
+        'airline': airline,
+        'departure': departure,
+        'arrival': arrival,
+        'duration': format_duration(duration_minutes),
+        'duration_minutes': duration_minutes,
+        'stops': stops,
+        'price': price,
+        'currency': currency,
+        'return': return_departure,
+        'bookingUrl': booking_url
+    }
+
+
+def hotel_offer(provider, offer_id, name, location, price_per_night, total_price=None, rating=None, reviews=None,
+                amenities=(), stars=None, address=None, currency='USD', image='#', booking_url='#'):
+    """
+    Build a normalized hotel offer.
+
+    Args:
+        provider (str): Name of the provider the offer came from
+        offer_id (str): Identifier, unique within the provider
+        name (str): Hotel name
+        location (str): Airport code or city searched
+        price_per_night (int): Nightly price
+        total_price (int, optional): Price of the whole stay
+        rating (float, optional): Guest rating out of 5
+        reviews (int, optional): Number of reviews
+        amenities (iterable): Amenity names
+        stars (int, optional): Hotel class
+        address (str, optional): Street address
+        currency (str): ISO currency code of the prices
+        image (str): Thumbnail URL
+        booking_url (str): Where the offer can be booked
+
+    Returns:
+        dict: The offer, with every key in HOTEL_FIELDS
+    """
+    return {
+        'id': offer_id,
+        'provider': provider,
+        'name': name,
+        'location': location,
+        'address': address,
+        'price': price_per_night,
+        'price_per_night': price_per_night,
+        'total_price': total_price,
+        'currency': currency,
+        'rating': rating,
+        'reviews': reviews,
+        'stars': stars,
+        'amenities': list(amenities),
+        'image': image,
+        'bookingUrl': booking_url
+    }
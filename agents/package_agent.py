@@ -1,9 +1,10 @@
 from .base_agent import BaseAgent
 from .flights_agent import FlightsAgent
 from .hotels_agent import HotelsAgent
-import re
+from .intent_router import RoutingSignals, keywords, all_of, places
+from .extraction_patterns import PACKAGE_ADULTS, PACKAGE_CHILDREN, PACKAGE_BUDGET, PACKAGE_HOTEL_RATING
+from .mock_inventory import default_inventory
 import logging
-import random
 from datetime import datetime, timedelta
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -12,73 +13,43 @@ logger = logging.getLogger("PackageAgent")
 class PackageAgent(BaseAgent):
     """Agent specialized in handling combined flight and hotel packages."""
     
-    def __init__(self):
+    uses_parsed_request = True
+    
+    def __init__(self, flights_agent=None, hotels_agent=None):
+        """
+        Args:
+            flights_agent (FlightsAgent, optional): Agent whose extractor is
+                reused; AgentFactory passes the shared instance
+            hotels_agent (HotelsAgent, optional): Likewise for hotels
+        """
         super().__init__(name="Package Expert")
-        # Initialize flight and hotel agents to reuse their functionality
-        self.flights_agent = FlightsAgent()
-        self.hotels_agent = HotelsAgent()
+        # Reuse the flight and hotel agents' functionality; standalone
+        # instances get their own
+        self.flights_agent = flights_agent or FlightsAgent()
+        self.hotels_agent = hotels_agent or HotelsAgent()
+        self.inventory = default_inventory()
         
-    def can_handle(self, request):
+    def routing_signals(self):
         """
-        Determine if this agent can handle the given request.
+        Describe the signals the intent router uses to score package requests.
         
-        Args:
-            request (str): The user's request text
-            
         Returns:
-            float: Confidence score between 0.0 and 1.0
+            RoutingSignals: Package routing rules
         """
-        request_lower = request.lower()
-        
-        # High confidence keywords
-        high_confidence = ["package", "bundle", "combo", "travel package", "vacation package", "combo deal"]
-        
-        # Medium confidence keywords
-        medium_confidence = ["trip", "vacation", "journey", "getaway", "holiday", "both", "together", "flight and hotel"]
-        
-        # Check if the request contains both flight and hotel indicators
-        has_flight_indicators = False
-        has_hotel_indicators = False
-        
-        # Flight indicators
+        # Flight and hotel indicators
         flight_keywords = ["flight", "fly", "airline", "plane", "travel"]
-        for keyword in flight_keywords:
-            if keyword in request_lower:
-                has_flight_indicators = True
-                break
-                
-        # Hotel indicators
         hotel_keywords = ["hotel", "stay", "room", "accommodation", "resort"]
-        for keyword in hotel_keywords:
-            if keyword in request_lower:
-                has_hotel_indicators = True
-                break
-        
-        # Calculate confidence based on keywords and patterns
-        confidence = 0.0
-        
-        # High confidence if it explicitly mentions packages
-        for keyword in high_confidence:
-            if keyword in request_lower:
-                confidence += 0.4
-                
-        # Medium confidence for related keywords
-        for keyword in medium_confidence:
-            if keyword in request_lower:
-                confidence += 0.2
-                
-        # High confidence if it mentions both flights and hotels
-        if has_flight_indicators and has_hotel_indicators:
-            confidence += 0.5
-            
-        # Boost confidence if it mentions a city
-        for city in self.flights_agent.airport_codes:
-            if city in request_lower:
-                confidence += 0.1
-                break
         
-        # Cap confidence at 1.0
-        return min(confidence, 1.0)
+        return RoutingSignals([
+            # High confidence if it explicitly mentions packages
+            keywords(["package", "bundle", "combo", "travel package", "vacation package", "combo deal"], 0.4),
+            # Medium confidence for related keywords
+            keywords(["trip", "vacation", "journey", "getaway", "holiday", "both", "together", "flight and hotel"], 0.2),
+            # High confidence if it mentions both flights and hotels
+            all_of([flight_keywords, hotel_keywords], 0.5),
+            # Boost confidence if it mentions a city
+            places(self.flights_agent.gazetteer, 0.1),
+        ])
     
     def process_request(self, request, context=None):
         """
@@ -91,11 +62,9 @@ class PackageAgent(BaseAgent):
         Returns:
             dict: The agent's response
         """
-        if context:
-            self.context.update(context)
-            
-        # Extract package parameters from the request
-        params = self._extract_package_params(request)
+        # Extract package parameters from the request, or reuse the shared parse
+        parsed = self.parsed_request(context)
+        params = parsed.package_params() if parsed is not None else self._extract_package_params(request)
         logger.info(f"Extracted package parameters: {params}")
         
         # Validate the extracted parameters
@@ -112,12 +81,11 @@ class PackageAgent(BaseAgent):
             }
             
         # Format a response based on the parameters
-        destination_name = next((city for city, code in self.flights_agent.airport_codes.items() 
-                              if code == params['destination']), params['destination'])
-        departure_name = next((city for city, code in self.flights_agent.airport_codes.items() 
-                            if code == params['departure']), params['departure'])
+        gazetteer = self.flights_agent.gazetteer
+        destination_name = gazetteer.city_name(params['destination'], params['destination'])
+        departure_name = gazetteer.city_name(params['departure'], params['departure'])
         
-        response_content = f"I found some great travel packages from {departure_name.title()} to {destination_name.title()}"
+        response_content = f"I found some great travel packages from {departure_name} to {destination_name}"
         
         if params.get('outbound_date'):
             response_content += f" departing on {params['outbound_date']}"
@@ -136,19 +104,28 @@ class PackageAgent(BaseAgent):
             "results": package_results
         }
         
-    def _extract_package_params(self, request):
+    def _extract_package_params(self, request, today=None, flight_params=None, hotel_params=None):
         """
         Extract travel package parameters from the request.
         
         Args:
             request (str): The user's request text
+            today (date, optional): Anchor for relative dates
+            flight_params (dict, optional): Flight parameters already
+                extracted from the same request
+            hotel_params (dict, optional): Hotel parameters already
+                extracted from the same request
             
         Returns:
             dict: Package search parameters
         """
+        request_lower = request.lower()
+        
         # Leverage both flight and hotel agents to extract parameters
-        flight_params = self.flights_agent._extract_flight_params(request)
-        hotel_params = self.hotels_agent._extract_hotel_params(request)
+        if flight_params is None:
+            flight_params = self.flights_agent._extract_flight_params(request, request_lower, today)
+        if hotel_params is None:
+            hotel_params = self.hotels_agent._extract_hotel_params(request, request_lower, today)
         
         # Combine parameters
         params = {
@@ -177,24 +154,23 @@ class PackageAgent(BaseAgent):
         params['package_type'] = 'round_trip' if params.get('return_date') else 'one_way'
         
         # Extract number of travelers
-        travelers_match = re.search(r'(\d+)\s+(?:adult|person|people|traveler)', request.lower())
+        travelers_match = PACKAGE_ADULTS.search(request_lower)
         if travelers_match:
             params['adults'] = int(travelers_match.group(1))
             
-        children_match = re.search(r'(\d+)\s+(?:child|children|kid|kids)', request.lower())
+        children_match = PACKAGE_CHILDREN.search(request_lower)
         if children_match:
             params['children'] = int(children_match.group(1))
             
         # Extract budget constraints
-        budget_match = re.search(r'(?:under|less than|budget|max|maximum)\s+\$?(\d+)', request.lower())
+        budget_match = PACKAGE_BUDGET.search(request_lower)
         if budget_match:
             params['max_price'] = int(budget_match.group(1))
             
-        # Extract hotel quality preferences
-        for rating in range(5, 0, -1):
-            if f"{rating} star" in request.lower() or f"{rating}-star" in request.lower():
-                params['hotel_rating'] = rating
-                break
+        # Extract hotel quality preferences (the highest rating mentioned wins)
+        ratings = PACKAGE_HOTEL_RATING.findall(request_lower)
+        if ratings:
+            params['hotel_rating'] = int(max(ratings))
                 
         return params
         
@@ -206,81 +182,7 @@ class PackageAgent(BaseAgent):
             params (dict): The package search parameters
             
         Returns:
-            list: Mock package results
+            list: Mock package results, the same for the same route and dates
         """
-        # Generate 3-5 package options
-        num_packages = random.randint(3, 5)
-        packages = []
-        
-        for i in range(num_packages):
-            # Generate a flight for this package
-            flight = {
-                'airline': random.choice([
-                    'Saudi Airlines', 'Emirates', 'Qatar Airways', 'Etihad Airways', 
-                    'Turkish Airlines', 'Gulf Air', 'Flynas', 'Flyadeal'
-                ]),
-                'flight_number': f"{''.join(random.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(2))}{random.randint(100, 999)}",
-                'departure_airport': params['departure'],
-                'arrival_airport': params['destination'],
-                'departure_time': f"{random.randint(0, 23):02d}:{random.choice(['00', '15', '30', '45'])}",
-                'arrival_time': f"{random.randint(0, 23):02d}:{random.choice(['00', '15', '30', '45'])}",
-                'duration': f"{random.randint(1, 8)}h {random.randint(0, 55)}m",
-                'class': random.choice(['Economy', 'Economy Plus', 'Business', 'First']),
-                'stopover': random.choice([None, '1 stop in Dubai', '1 stop in Istanbul', '1 stop in Doha'])
-            }
-            
-            # Generate a hotel for this package
-            hotel = {
-                'name': random.choice([
-                    'Grand Hyatt', 'Marriott Hotel', 'Four Seasons', 'The Ritz-Carlton', 
-                    'Hilton Hotel', 'Shangri-La', 'Radisson Blu', 'Intercontinental', 
-                    'Holiday Inn', 'Crowne Plaza', 'Mövenpick', 'Novotel'
-                ]),
-                'rating': min(5, max(1, params['hotel_rating'] + random.choice([-1, 0, 0, 1]))),
-                'location': next((city for city, code in self.hotels_agent.city_codes.items() 
-                                if code == params['destination']), 'City Center'),
-                'amenities': random.sample(self.hotels_agent.amenities, k=random.randint(3, 6)),
-                'room_type': random.choice(['Standard', 'Deluxe', 'Suite', 'Executive', 'Family']),
-                'board_type': random.choice(['Room Only', 'Breakfast Included', 'Half Board', 'Full Board', 'All Inclusive'])
-            }
-            
-            # Calculate package price (flight + hotel + some random factor)
-            base_price = 300 + (hotel['rating'] * 100) + (300 if flight['class'] != 'Economy' else 0)
-            if params.get('package_type') == 'round_trip':
-                base_price *= 1.8  # Round trips are more expensive
-                
-            # Add some randomness
-            price_variation = random.uniform(0.85, 1.15)
-            total_price = round(base_price * price_variation * params['adults'] + 
-                              (base_price * 0.7 * price_variation * params['children']))
-            
-            # Cap at max price if specified
-            if params.get('max_price') and total_price > params['max_price']:
-                continue
-                
-            # Calculate savings
-            original_price = round(total_price * random.uniform(1.15, 1.3))
-            savings = original_price - total_price
-            savings_percent = round((savings / original_price) * 100)
-            
-            # Create the package object
-            package = {
-                'id': f"PKG-{random.randint(10000, 99999)}",
-                'name': f"{flight['airline']} {hotel['name']} {params['destination']} Package",
-                'flight': flight,
-                'hotel': hotel,
-                'price': total_price,
-                'original_price': original_price,
-                'savings': savings,
-                'savings_percent': savings_percent,
-                'nights': random.randint(3, 7),
-                'package_type': params.get('package_type', 'round_trip'),
-                'outbound_date': params.get('outbound_date')
-            }
-            
-            packages.append(package)
-            
-        # Sort packages by price
-        packages.sort(key=lambda x: x['price'])
-        
-        return packages
+        city_name = self.hotels_agent.gazetteer.city_name(params['destination'], 'City Center')
+        return self.inventory.package_results(params, city_name)
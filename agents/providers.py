@@ -0,0 +1,466 @@
+import json
+import time
+import asyncio
+import contextvars
+import logging
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from .gazetteer import default_gazetteer
+from .mock_inventory import default_inventory
+from .offers import flight_offer, hotel_offer, parse_price
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("InventoryProviders")
+
+FLIGHTS = "flights"
+HOTELS = "hotels"
+
+SEARCH_PATH = "/api/v1/search"
+
+
+class SearchResult:
+    """
+    The outcome of one inventory search.
+
+    Attributes:
+        provider (str): Provider name
+        kind (str): FLIGHTS or HOTELS
+        offers (list): Normalized offers (see agents/offers.py), cheapest first
+        status (int): HTTP-style status; 200 when the search succeeded, None
+            when the provider could not be reached
+        error (str): What went wrong, or None
+        elapsed (float): Seconds the search took
+    """
+
+    __slots__ = ('provider', 'kind', 'offers', 'status', 'error', 'elapsed')
+
+    def __init__(self, provider, kind, offers=(), status=200, error=None, elapsed=0.0):
+        self.provider = provider
+        self.kind = kind
+        self.offers = list(offers)
+        self.status = status
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        """Whether the search succeeded."""
+        return self.status == 200
+
+    def to_dict(self):
+        """Return a JSON-serializable view of the result."""
+        return {
+            "provider": self.provider,
+            "kind": self.kind,
+            "status": self.status,
+            "error": self.error,
+            "elapsed": self.elapsed,
+            "offers": self.offers
+        }
+
+    def __repr__(self):
+        return f"SearchResult({self.provider!r}, {self.kind!r}, {len(self.offers)} offers, status={self.status})"
+
+
+class InventoryProvider:
+    """
+    Base class for flight and hotel inventory sources.
+
+    A provider takes the parameter dicts the agents extract
+    (FlightsAgent._extract_flight_params, HotelsAgent._extract_hotel_params)
+    and returns a SearchResult of normalized offers. ``search`` and
+    ``asearch`` run one query; ``search_many`` and ``asearch_many`` run a
+    batch, sending each distinct query once. Subclasses implement
+    ``_search`` and, when they can do native async I/O, ``_asearch``.
+    """
+
+    name = None
+    kind = None
+    # Whether searches wait on the network and are worth running in parallel
+    remote = False
+
+    def search(self, params):
+        """
+        Run one search.
+
+        Args:
+            params (dict): Flight or hotel search parameters
+
+        Returns:
+            SearchResult: The offers found
+
+        Raises:
+            Whatever the underlying client raises when the provider cannot
+            be reached (e.g. CircuitOpenError, requests.Timeout)
+        """
+        start_time = time.perf_counter()
+        result = self._search(params)
+        result.elapsed = time.perf_counter() - start_time
+        return result
+
+    async def asearch(self, params):
+        """Awaitable version of search."""
+        start_time = time.perf_counter()
+        result = await self._asearch(params)
+        result.elapsed = time.perf_counter() - start_time
+        return result
+
+    def _search(self, params):
+        raise NotImplementedError("Subclasses must implement _search")
+
+    async def _asearch(self, params):
+        # Blocking providers run in a worker thread so the event loop stays free
+        return await asyncio.to_thread(self._search, params)
+
+    @staticmethod
+    def query_key(params):
+        """Return a hashable key identifying a query."""
+        return json.dumps(params, sort_keys=True, default=str)
+
+    def _failed(self, error, elapsed=0.0):
+        """Record a search that raised instead of returning."""
+        logger.warning(f"{self.name} {self.kind} search failed: {error}")
+        return SearchResult(self.name, self.kind, status=None, error=str(error) or type(error).__name__,
+                            elapsed=elapsed)
+
+    def search_many(self, queries, max_workers=8):
+        """
+        Run a batch of searches, sending each distinct query once.
+
+        Remote providers run the distinct queries on a thread pool; a query
+        that raises yields a failed SearchResult instead of failing the
+        batch.
+
+        Args:
+            queries (list): Search parameter dicts
+            max_workers (int): Searches in flight at once for remote providers
+
+        Returns:
+            list: One SearchResult per query, in order; repeated queries
+                share one result object
+        """
+        distinct = {}
+        for params in queries:
+            distinct.setdefault(self.query_key(params), params)
+
+        def run(params):
+            try:
+                return self.search(params)
+            except Exception as e:
+                return self._failed(e)
+
+        if self.remote and len(distinct) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(distinct))) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, run, params) for params in distinct.values()]
+                results = dict(zip(distinct, (future.result() for future in futures)))
+        else:
+            results = {key: run(params) for key, params in distinct.items()}
+        return [results[self.query_key(params)] for params in queries]
+
+    async def asearch_many(self, queries, concurrency=16):
+        """
+        Awaitable version of search_many, with at most ``concurrency``
+        searches in flight.
+        """
+        distinct = {}
+        for params in queries:
+            distinct.setdefault(self.query_key(params), params)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(params):
+            async with semaphore:
+                try:
+                    return await self.asearch(params)
+                except Exception as e:
+                    return self._failed(e)
+
+        results = dict(zip(distinct, await asyncio.gather(*(run(params) for params in distinct.values()))))
+        return [results[self.query_key(params)] for params in queries]
+
+
+class MockFlightProvider(InventoryProvider):
+    """Flights from the seeded synthetic inventory (agents/mock_inventory.py)."""
+
+    name = "mock"
+    kind = FLIGHTS
+
+    def __init__(self, inventory=None):
+        """
+        Args:
+            inventory (MockInventory, optional): Defaults to the shared inventory
+        """
+        self.inventory = inventory or default_inventory()
+
+    def _search(self, params):
+        return SearchResult(self.name, self.kind, self.inventory.flight_results(params))
+
+    async def _asearch(self, params):
+        # In memory and quick; a thread hop would cost more than the search
+        return self._search(params)
+
+
+class MockHotelProvider(MockFlightProvider):
+    """Hotels from the seeded synthetic inventory."""
+
+    kind = HOTELS
+
+    def _search(self, params):
+        return SearchResult(self.name, self.kind, self.inventory.hotel_results(params))
+
+
+class SearchApiProvider(InventoryProvider):
+    """
+    Base class for searchapi.io engines.
+
+    Requests go through the shared UpstreamClient (and AsyncUpstreamClient
+    on the ASGI path), so retries, timeouts and the circuit breaker apply;
+    pointing their base URL at utils/fake_searchapi.py runs everything
+    offline. ``fetch`` and ``afetch`` return the raw response in the form
+    the search cache stores, which the REST endpoints serve as is.
+    """
+
+    name = "searchapi"
+    engine = None
+    remote = True
+
+    def __init__(self, client, api_key=None, async_client=None):
+        """
+        Args:
+            client (UpstreamClient): Client for searchapi.io (or a stand-in)
+            api_key (str, optional): searchapi.io API key
+            async_client (AsyncUpstreamClient, optional): Used by asearch;
+                without one, asearch runs the sync client in a thread
+        """
+        self.client = client
+        self.api_key = api_key
+        self.async_client = async_client
+
+    def query_params(self, params):
+        """
+        Translate agent search parameters into a searchapi.io query.
+
+        Returns:
+            dict: The query string parameters
+        """
+        raise NotImplementedError("Subclasses must implement query_params")
+
+    def normalize(self, data, params):
+        """
+        Turn a searchapi.io response into normalized offers.
+
+        Returns:
+            list: Offers, cheapest first
+        """
+        raise NotImplementedError("Subclasses must implement normalize")
+
+    def fetch(self, query):
+        """
+        Send a query to searchapi.io.
+
+        Returns:
+            dict: {'status': 200, 'data': <JSON>} or {'status': <code>, 'details': <body>}
+        """
+        response = self.client.get(SEARCH_PATH, params=query)
+        if response.status_code == 200:
+            return {'status': 200, 'data': response.json()}
+        return {'status': response.status_code, 'details': response.text}
+
+    async def afetch(self, query):
+        """Awaitable version of fetch, through the async client."""
+        if self.async_client is None:
+            return await asyncio.to_thread(self.fetch, query)
+        response = await self.async_client.get(SEARCH_PATH, params=query)
+        if response.status_code == 200:
+            return {'status': 200, 'data': response.json()}
+        return {'status': response.status_code, 'details': response.text}
+
+    def parse_response(self, raw, params):
+        """
+        Turn a fetch result into a SearchResult.
+
+        Args:
+            raw (dict): What fetch or afetch returned (or the cached copy)
+            params (dict): Search parameters, used to fill gaps in the response
+
+        Returns:
+            SearchResult: Normalized offers, cheapest first, or the failure
+        """
+        if raw['status'] != 200:
+            return SearchResult(self.name, self.kind, status=raw['status'], error=raw.get('details'))
+        offers = self.normalize(raw['data'], params)
+        offers.sort(key=lambda offer: offer['price'] if offer['price'] is not None else float('inf'))
+        return SearchResult(self.name, self.kind, offers)
+
+    def _search(self, params):
+        return self.parse_response(self.fetch(self.query_params(params)), params)
+
+    async def _asearch(self, params):
+        return self.parse_response(await self.afetch(self.query_params(params)), params)
+
+
+def _searchapi_time(airport):
+    """Read "YYYY-MM-DD HH:MM" from a searchapi.io airport record."""
+    if not airport:
+        return None
+    if airport.get('date') and airport.get('time'):
+        return f"{airport['date']} {airport['time']}"
+    return airport.get('time')
+
+
+class SearchApiFlightProvider(SearchApiProvider):
+    """Flights from searchapi.io's google_flights engine."""
+
+    engine = "google_flights"
+    kind = FLIGHTS
+
+    def query_params(self, params):
+        outbound_date = params.get('outbound_date') or (date.today() + timedelta(days=1)).isoformat()
+        query = {
+            'engine': self.engine,
+            'departure_id': params.get('departure_id'),
+            'arrival_id': params.get('arrival_id'),
+            'outbound_date': outbound_date,
+            'flight_type': params.get('flight_type') or 'one_way',
+            'api_key': self.api_key,
+            'sort_by': 'price',
+            'currency': 'USD',
+            'adults': params.get('adults', 1),
+            'travel_class': 'economy',
+            'max_price': params.get('max_price') or 1000
+        }
+        if query['flight_type'] == 'round_trip' and params.get('return_date'):
+            query['return_date'] = params['return_date']
+        return query
+
+    def booking_url(self, data, token):
+        """Link to book a flight from its booking token."""
+        search_id = (data.get('search_metadata') or {}).get('id')
+        return f"https://www.searchapi.io/api/v1/searches/{search_id}?token={token}"
+
+    def normalize(self, data, params):
+        offers = []
+        for group in ('best_flights', 'other_flights'):
+            for position, item in enumerate(data.get(group) or []):
+                legs = item.get('flights') or [{}]
+                first, last = legs[0], legs[-1]
+                token = item.get('booking_token')
+                offers.append(flight_offer(
+                    self.name,
+                    token or f"{group}-{position}",
+                    (first.get('departure_airport') or {}).get('id') or params.get('departure_id'),
+                    (last.get('arrival_airport') or {}).get('id') or params.get('arrival_id'),
+                    first.get('airline'),
+                    _searchapi_time(first.get('departure_airport')),
+                    parse_price(item.get('price')),
+                    item.get('total_duration'),
+                    arrival=_searchapi_time(last.get('arrival_airport')),
+                    stops=max(len(legs) - 1, 0),
+                    currency=(data.get('search_parameters') or {}).get('currency', 'USD'),
+                    booking_url=self.booking_url(data, token) if token else '#'
+                ))
+        return offers
+
+
+class SearchApiHotelProvider(SearchApiProvider):
+    """
+    Hotels from searchapi.io's google_hotels engine, queried the way
+    js/hotels-api.js does ("Hotels in <city>").
+    """
+
+    engine = "google_hotels"
+    kind = HOTELS
+
+    def __init__(self, client, api_key=None, async_client=None, gazetteer=None):
+        """
+        Args:
+            client (UpstreamClient): Client for searchapi.io (or a stand-in)
+            api_key (str, optional): searchapi.io API key
+            async_client (AsyncUpstreamClient, optional): Used by asearch
+            gazetteer (Gazetteer, optional): Turns location codes into city
+                names; defaults to the shared gazetteer
+        """
+        super().__init__(client, api_key, async_client)
+        self.gazetteer = gazetteer or default_gazetteer()
+
+    def query_params(self, params):
+        location = params.get('location') or ''
+        city = self.gazetteer.city_name(location, location)
+        query = {
+            'engine': self.engine,
+            'api_key': self.api_key,
+            'q': f"Hotels in {city}" if city else "hotels",
+            'check_in': params.get('check_in'),
+            'check_out': params.get('check_out'),
+            'adults': params.get('guests'),
+            'max_price': params.get('max_price')
+        }
+        if params.get('amenities'):
+            query['amenities'] = ','.join(params['amenities'])
+        # Like js/hotels-api.js, leave out the filters that were not given
+        return {key: value for key, value in query.items() if value is not None}
+
+    def normalize(self, data, params):
+        nights = _nights(params.get('check_in'), params.get('check_out'))
+        location = params.get('location')
+        offers = []
+        # js/hotels-api.js reads hotel_results; current google_hotels
+        # responses call the list properties
+        for position, hotel in enumerate(data.get('hotel_results') or data.get('properties') or []):
+            nightly = parse_price(hotel.get('price_per_night') or hotel.get('price'))
+            total = parse_price(hotel.get('total_price'))
+            if total is None and nightly is not None:
+                total = nightly * nights
+            stars = hotel.get('stars') or hotel.get('extracted_hotel_class')
+            images = hotel.get('images') or [{}]
+            offers.append(hotel_offer(
+                self.name,
+                hotel.get('hotel_id') or hotel.get('property_token') or f"hotel-{position}",
+                hotel.get('name') or 'Unknown Hotel',
+                location,
+                nightly,
+                total,
+                float(hotel['rating']) if hotel.get('rating') else None,
+                hotel.get('reviews'),
+                hotel.get('amenities') or (),
+                stars=int(stars) if str(stars or '').isdigit() else None,
+                address=hotel.get('address'),
+                image=hotel.get('thumbnail') or images[0].get('thumbnail') or '#',
+                booking_url=hotel.get('link') or '#'
+            ))
+        return offers
+
+
+def _nights(check_in, check_out):
+    """Nights between two ISO dates, at least one."""
+    try:
+        return max((date.fromisoformat(check_out) - date.fromisoformat(check_in)).days, 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+PROVIDER_NAMES = ("mock", "searchapi")
+
+
+def create_providers(name="mock", client=None, api_key=None, async_client=None):
+    """
+    Create the flight and hotel providers for one source.
+
+    Args:
+        name (str): "mock" or "searchapi"
+        client (UpstreamClient, optional): Required for searchapi
+        api_key (str, optional): searchapi.io API key
+        async_client (AsyncUpstreamClient, optional): Used by asearch
+
+    Returns:
+        dict: {FLIGHTS: provider, HOTELS: provider}
+    """
+    if name == "mock":
+        return {FLIGHTS: MockFlightProvider(), HOTELS: MockHotelProvider()}
+    if name == "searchapi":
+        if client is None:
+            raise ValueError("The searchapi provider needs an UpstreamClient")
+        return {
+            FLIGHTS: SearchApiFlightProvider(client, api_key, async_client),
+            HOTELS: SearchApiHotelProvider(client, api_key, async_client)
+        }
+    raise ValueError(f"Unknown inventory provider: {name} (expected one of {', '.join(PROVIDER_NAMES)})")
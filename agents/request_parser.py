@@ -0,0 +1,191 @@
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("RequestParser")
+
+
+def normalize_request(request):
+    """
+    Collapse runs of whitespace and trim the request.
+
+    Case is kept: whether a short word is read as an airport code depends on
+    it.
+    """
+    return " ".join(request.split())
+
+
+@dataclass(frozen=True)
+class ParsedRequest:
+    """
+    Everything the flight, hotel and package extractors read from one request.
+
+    Instances are immutable and shared between agents and threads; the
+    ``*_params`` methods return fresh dicts in the shape each agent's
+    extractor has always produced.
+    """
+
+    text: str
+    today: date
+
+    # Flights
+    departure: Optional[str]
+    arrival: Optional[str]
+    outbound_date: Optional[str]
+    return_date: Optional[str]
+    flight_type: str
+    flight_max_price: int
+
+    # Hotels
+    location: Optional[str]
+    check_in: Optional[str]
+    check_out: Optional[str]
+    guests: int
+    hotel_max_price: int
+    amenities: Tuple[str, ...]
+
+    # Packages, combining the above
+    destination: Optional[str]
+    package_outbound_date: Optional[str]
+    package_return_date: Optional[str]
+    package_type: str
+    adults: int
+    children: int
+    budget: int
+    hotel_rating: int
+
+    def flight_params(self):
+        """Return the parameters FlightsAgent._extract_flight_params produces."""
+        params = {
+            'departure_id': self.departure,
+            'arrival_id': self.arrival,
+            'outbound_date': self.outbound_date,
+            'flight_type': self.flight_type,
+            'max_price': self.flight_max_price
+        }
+        if self.return_date is not None:
+            params['return_date'] = self.return_date
+        return params
+
+    def hotel_params(self):
+        """Return the parameters HotelsAgent._extract_hotel_params produces."""
+        return {
+            'location': self.location,
+            'check_in': self.check_in,
+            'check_out': self.check_out,
+            'guests': self.guests,
+            'max_price': self.hotel_max_price,
+            'amenities': list(self.amenities)
+        }
+
+    def package_params(self):
+        """Return the parameters PackageAgent._extract_package_params produces."""
+        return {
+            'departure': self.departure,
+            'destination': self.destination,
+            'outbound_date': self.package_outbound_date,
+            'return_date': self.package_return_date,
+            'adults': self.adults,
+            'children': self.children,
+            'max_price': self.budget,
+            'hotel_rating': self.hotel_rating,
+            'package_type': self.package_type
+        }
+
+
+class RequestParser:
+    """
+    Parses each request once for every agent that needs its parameters.
+
+    Results are memoized by normalized text and the "today" date that
+    relative dates are anchored to, so the agents of one fan-out, and
+    repeats of the same message on the same day, share a single parse.
+    """
+
+    def __init__(self, flights_agent, hotels_agent, package_agent, maxsize=1024):
+        """
+        Args:
+            flights_agent (FlightsAgent): Extracts the flight parameters
+            hotels_agent (HotelsAgent): Extracts the hotel parameters
+            package_agent (PackageAgent): Combines both into package parameters
+            maxsize (int): Parses kept, least recently used evicted first
+        """
+        self.flights_agent = flights_agent
+        self.hotels_agent = hotels_agent
+        self.package_agent = package_agent
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, request, today=None):
+        """
+        Return the parse of a request, computing it on first use.
+
+        Args:
+            request (str): The user's request text
+            today (date, optional): Anchor for relative dates; defaults to
+                the current date
+
+        Returns:
+            ParsedRequest: The shared, immutable parse
+        """
+        key = (normalize_request(request), today or date.today())
+        with self._lock:
+            parsed = self._cache.get(key)
+            if parsed is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return parsed
+            self.misses += 1
+
+        # Parsed outside the lock; two threads racing on the same new
+        # request both compute it and the results are identical
+        parsed = self._parse(*key)
+        with self._lock:
+            self._cache[key] = parsed
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return parsed
+
+    def _parse(self, text, today):
+        """Run every extractor once over the normalized text."""
+        text_lower = text.lower()
+        flight = self.flights_agent._extract_flight_params(text, text_lower, today)
+        hotel = self.hotels_agent._extract_hotel_params(text, text_lower, today)
+        package = self.package_agent._extract_package_params(text, today, flight, hotel)
+        return ParsedRequest(
+            text=text,
+            today=today,
+            departure=flight['departure_id'],
+            arrival=flight['arrival_id'],
+            outbound_date=flight['outbound_date'],
+            return_date=flight.get('return_date'),
+            flight_type=flight['flight_type'],
+            flight_max_price=flight['max_price'],
+            location=hotel['location'],
+            check_in=hotel['check_in'],
+            check_out=hotel['check_out'],
+            guests=hotel['guests'],
+            hotel_max_price=hotel['max_price'],
+            amenities=tuple(hotel['amenities']),
+            destination=package['destination'],
+            package_outbound_date=package['outbound_date'],
+            package_return_date=package['return_date'],
+            package_type=package['package_type'],
+            adults=package['adults'],
+            children=package['children'],
+            budget=package['max_price'],
+            hotel_rating=package['hotel_rating']
+        )
+
+    def stats(self):
+        """Return cache hits, misses and size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
@@ -0,0 +1,143 @@
+import re
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from .conversation_history import ConversationHistory
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("SessionStore")
+
+# Client-supplied ids outside this shape are replaced with a fresh id
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+class Session:
+    """
+    Conversation state for a single client.
+
+    Attributes:
+        session_id (str): The client session id
+        history (ConversationHistory): The most recent conversation turns
+        context (dict): Context accumulated over the conversation
+        user_preferences (dict): Preferences extracted from the conversation
+        last_access (float): Clock time the session was last used
+    """
+
+    __slots__ = ('session_id', 'history', 'context', 'user_preferences', 'last_access')
+
+    def __init__(self, session_id, history, now):
+        self.session_id = session_id
+        self.history = history
+        self.context = {}
+        self.user_preferences = {}
+        self.last_access = now
+
+    def add_turn(self, role, content):
+        """Append a conversation turn, compacting or dropping the oldest once the history is full."""
+        self.history.append(role, content)
+
+
+class SessionStore:
+    """
+    Thread-safe store of per-client sessions.
+
+    Sessions are kept in least-recently-used order. A session is evicted once
+    it has been idle longer than ``ttl`` seconds, or when ``max_sessions`` is
+    reached and it is the least recently used one.
+    """
+
+    def __init__(self, max_sessions=10000, ttl=1800, max_history=50, compactor=None, clock=time.monotonic):
+        """
+        Args:
+            max_sessions (int): Maximum number of live sessions
+            ttl (float): Idle time in seconds after which a session expires
+            max_history (int): Conversation turns kept per session
+            compactor (callable, optional): Compaction hook passed to each
+                session's ConversationHistory
+            clock (callable): Monotonic time source, replaceable for testing
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_history = max_history
+        self.compactor = compactor
+        self._clock = clock
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get_or_create(self, session_id=None):
+        """
+        Return the live session for ``session_id``, creating it if needed.
+
+        Args:
+            session_id (str, optional): The client's session id; a new id is
+                generated when it is missing or malformed
+
+        Returns:
+            Session: The client's session
+        """
+        if not isinstance(session_id, str) or not SESSION_ID_PATTERN.match(session_id):
+            session_id = uuid.uuid4().hex
+
+        with self._lock:
+            now = self._clock()
+            self._evict_expired(now)
+
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_access = now
+                self._sessions.move_to_end(session_id)
+                return session
+
+            while len(self._sessions) >= self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                self.evictions += 1
+                logger.debug(f"Evicted least recently used session {evicted_id}")
+
+            history = ConversationHistory(self.max_history, compactor=self.compactor)
+            session = Session(session_id, history, now)
+            self._sessions[session_id] = session
+            return session
+
+    def get(self, session_id):
+        """Return the live session for ``session_id`` without creating one, or None."""
+        with self._lock:
+            now = self._clock()
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_access = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def discard(self, session_id):
+        """Remove a session, if present."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _evict_expired(self, now):
+        """Drop idle sessions; callers must hold the lock."""
+        # Sessions are in access order, so expired ones are all at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access <= self.ttl:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def memory_usage(self):
+        """
+        Approximate the memory held by conversation histories in bytes.
+
+        Returns:
+            int: Sum of ConversationHistory.memory_usage() over live sessions
+        """
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return sum(session.history.memory_usage() for session in sessions)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
@@ -0,0 +1,357 @@
+"""
+Async ASGI serving path for the chat and flight search endpoints.
+
+Serves ``POST /process_message``, ``GET /api/search/flights`` and
+``GET /api/offers`` on an event loop, so a slow upstream search no longer
+ties up a worker thread. The agent system, session store, search cache,
+offer store and circuit breaker are the ones created by ``server``, and the
+response bodies are built by the same helpers, so both serving paths behave
+identically. Everything else (templates, static files,
+debug routes) stays on the Flask app.
+
+Run with::
+
+    uvicorn asgi:app --port 8091
+
+or ``python asgi.py``. Requires ``uvicorn`` and ``httpx``.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qsl
+
+import httpx
+from requests.structures import CaseInsensitiveDict
+
+import server
+from utils.http_client import AsyncUpstreamClient, CircuitOpenError
+from utils.http_encoding import get_json_encoder
+from utils.replay import request_recorder, session_from_cookies
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger('rahalah.asgi')
+
+PORT = int(os.getenv('RAHALAH_ASGI_PORT', '8091'))
+
+# Largest request body accepted by /process_message
+MAX_BODY_BYTES = 1024 * 1024
+
+# Created on lifespan startup so the pool is bound to the serving event loop
+upstream = None
+
+# Same encoder as the Flask app (RAHALAH_JSON_ENCODER)
+encode_json = get_json_encoder()
+
+# Bodies at least this large are compressed off the event loop
+THREADED_COMPRESS_BYTES = 64 * 1024
+
+
+def _headers_dict(scope):
+    """Decode ASGI headers into a case-insensitive dict, as Flask exposes them."""
+    return CaseInsensitiveDict(
+        (name.decode('latin-1'), value.decode('latin-1')) for name, value in scope.get('headers', [])
+    )
+
+
+def _cookies_dict(headers):
+    """Parse the Cookie header into a name -> value dict."""
+    cookie = SimpleCookie()
+    try:
+        cookie.load(headers.get('Cookie', ''))
+    except Exception:
+        return {}
+    return {name: morsel.value for name, morsel in cookie.items()}
+
+
+async def _read_body(receive):
+    """Read the full request body, or None if it exceeds MAX_BODY_BYTES."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def _send_json(send, payload, status=200, extra_headers=()):
+    """Send a JSON response."""
+    body = encode_json(payload)
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('latin-1'))
+    ]
+    headers.extend(extra_headers)
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _compressing(send, accept_encoding):
+    """
+    Wrap ``send`` so single-message response bodies are compressed as
+    negotiated with the client, following the Flask app's policy.
+    """
+    policy = server.compression_policy
+    if policy is None:
+        return send
+    start = None
+
+    async def send_compressed(message):
+        nonlocal start
+        if message['type'] == 'http.response.start':
+            start = message
+            return
+        if message['type'] == 'http.response.body' and start is not None:
+            headers = list(start['headers'])
+            body = message.get('body', b'')
+            names = {name.lower(): value for name, value in headers}
+            content_type = names.get(b'content-type', b'').decode('latin-1')
+            coding = None
+            if not message.get('more_body') and b'content-encoding' not in names:
+                coding = policy.negotiate(accept_encoding, content_type, len(body))
+            if coding is not None:
+                if len(body) >= THREADED_COMPRESS_BYTES:
+                    body = await asyncio.to_thread(policy.compress, body, coding)
+                else:
+                    body = policy.compress(body, coding)
+                headers = [(name, value) for name, value in headers if name.lower() != b'content-length']
+                headers.append((b'content-length', str(len(body)).encode('latin-1')))
+                headers.append((b'content-encoding', coding.encode('latin-1')))
+                message = dict(message, body=body)
+            if coding is not None or len(message.get('body', b'')) >= policy.min_size:
+                headers.append((b'vary', b'Accept-Encoding'))
+            await send(dict(start, headers=headers))
+            start = None
+        await send(message)
+
+    return send_compressed
+
+
+async def process_message(scope, receive, send):
+    """Process a chat message through the agent system."""
+    headers = _headers_dict(scope)
+    try:
+        if not headers.get('Content-Type', '').startswith('application/json'):
+            logger.error("Request is not JSON")
+            return await _send_json(send, {'error': 'Request must be JSON'}, 400)
+
+        body = await _read_body(receive)
+        if body is None:
+            return await _send_json(send, {'error': 'Request body too large'}, 413)
+        try:
+            data = json.loads(body or b'null')
+        except ValueError:
+            return await _send_json(send, {'error': 'Request body is not valid JSON'}, 400)
+        if not isinstance(data, dict):
+            return await _send_json(send, {'error': 'Message is required'}, 400)
+
+        if data.get('cursor'):
+            session = server.resolve_session(data, headers, _cookies_dict(headers))
+            payload, status = server.build_cursor_payload(data['cursor'], session)
+            cookie = f"{server.SESSION_COOKIE}={session.session_id}; HttpOnly; Path=/; SameSite=Lax"
+            return await _send_json(send, payload, status, extra_headers=[(b'set-cookie', cookie.encode('latin-1'))])
+
+        user_message = data.get('message', '')
+        if not user_message:
+            logger.error("No message provided")
+            return await _send_json(send, {'error': 'Message is required'}, 400)
+
+        try:
+            limit, fields = server.parse_result_page_options(data)
+        except ValueError as e:
+            return await _send_json(send, {'error': str(e)}, 400)
+
+        session = server.resolve_session(data, headers, _cookies_dict(headers))
+
+        routing = server.master_agent.route(user_message)
+        server.log_agent_selection(routing.scores, routing.selected_agent)
+
+        response = await server.master_agent.aprocess_request(user_message, routing=routing, session=session)
+        logger.debug(f"Request routed in {routing.timings['routing']:.4f}s, "
+                     f"processed in {routing.timings['processing']:.4f}s")
+
+        cookie = f"{server.SESSION_COOKIE}={session.session_id}; HttpOnly; Path=/; SameSite=Lax"
+        await _send_json(send, server.build_chat_payload(response, session, limit, fields),
+                         extra_headers=[(b'set-cookie', cookie.encode('latin-1'))])
+    except Exception as e:
+        logger.error(f"Error processing message: {str(e)}")
+        await _send_json(send, {'error': f'Error processing message: {str(e)}'}, 500)
+
+
+async def search_flights(scope, receive, send):
+    """Search flights through the shared cache and the async upstream client."""
+    try:
+        args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        params = server.build_flight_search_params(args)
+        if params is None:
+            return await _send_json(send, server.MISSING_FLIGHT_PARAMS_ERROR, 400)
+
+        result = await server.search_cache.aget_or_fetch(
+            params, lambda: server.flight_provider.afetch(params), cacheable=server.is_cacheable_flight_result
+        )
+        payload, status = server.build_flight_search_payload(result, params, args.get('format') == 'offers')
+        await _send_json(send, payload, status)
+
+    except CircuitOpenError as e:
+        await _send_json(send, {'error': f'Flight search is temporarily unavailable: {str(e)}'}, 503)
+    except httpx.TimeoutException:
+        await _send_json(send, {'error': 'Flight search provider timed out'}, 504)
+    except httpx.TransportError as e:
+        await _send_json(send, {'error': f'Could not reach flight search provider: {str(e)}'}, 502)
+    except Exception as e:
+        await _send_json(send, {'error': f'An error occurred: {str(e)}'}, 500)
+
+
+async def metrics_endpoint(scope, receive, send):
+    """Expose the same metrics as the Flask app's /metrics."""
+    body = server.metrics.render().encode('utf-8')
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', server.METRICS_CONTENT_TYPE.encode('latin-1')),
+        (b'content-length', str(len(body)).encode('latin-1'))
+    ]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def offers_page(scope, receive, send):
+    """Filter, sort and page the offers of an earlier search from the shared offer store."""
+    args = dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+    payload, status = server.build_offer_page_payload(args)
+    await _send_json(send, payload, status)
+
+
+def _traced(handler):
+    """Run a handler as a trace, as trace_request does for Flask views."""
+    async def traced_handler(scope, receive, send):
+        name = f"{scope['method']} {scope['path']}"
+        with server.tracer.start_trace(name, _headers_dict(scope).get('traceparent')) as trace:
+            trace_header = (b'x-trace-id', trace.trace_id.encode('latin-1'))
+
+            async def send_with_trace_id(message):
+                if message['type'] == 'http.response.start':
+                    trace.set(status=message['status'])
+                    message = dict(message, headers=list(message['headers']) + [trace_header])
+                await send(message)
+
+            await handler(scope, receive, send_with_trace_id)
+
+    return traced_handler
+
+
+def _recorded(handler):
+    """Append requests to the replay capture when recording, as capture_request does for Flask views."""
+    async def recorded_handler(scope, receive, send):
+        if not request_recorder.enabled:
+            return await handler(scope, receive, send)
+
+        started = time.time()
+        start_time = time.perf_counter()
+        chunks = []
+        response = {'status': 500, 'cookies': []}
+
+        async def receive_copy():
+            message = await receive()
+            if message['type'] == 'http.request':
+                chunks.append(message.get('body', b''))
+            return message
+
+        async def send_copy(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['cookies'] = [value.decode('latin-1') for name, value in message['headers']
+                                       if name.lower() == b'set-cookie']
+            await send(message)
+
+        try:
+            await handler(scope, receive_copy, send_copy)
+        finally:
+            try:
+                request_recorder.record(
+                    scope['method'], scope['path'], scope.get('query_string', b'').decode('latin-1'),
+                    _headers_dict(scope), b''.join(chunks), response['status'], started,
+                    time.perf_counter() - start_time, session_from_cookies(response['cookies'])
+                )
+            except Exception as e:
+                logger.warning(f"Error recording request: {str(e)}")
+
+    return recorded_handler
+
+
+ROUTES = {
+    ('POST', '/process_message'): _traced(_recorded(process_message)),
+    ('GET', '/api/search/flights'): search_flights,
+    ('GET', '/api/offers'): offers_page,
+    ('GET', '/metrics'): metrics_endpoint
+}
+
+
+async def _lifespan(receive, send):
+    """Open the upstream connection pool on startup and close it on shutdown."""
+    global upstream
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            upstream = AsyncUpstreamClient(server.SEARCHAPI_BASE_URL, breaker=server.searchapi_breaker,
+                                           **server.SEARCHAPI_CLIENT_OPTIONS)
+            # searchapi.io providers, including the agents' when they use
+            # them, send their requests through the async pool from here on
+            for provider in server.searchapi_providers.values():
+                provider.async_client = upstream
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if upstream is not None:
+                for provider in server.searchapi_providers.values():
+                    provider.async_client = None
+                await upstream.aclose()
+                upstream = None
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point."""
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    start_time = time.perf_counter()
+    handler = ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        allowed = any(path == scope['path'] for _, path in ROUTES)
+        if allowed:
+            await _send_json(send, {'error': 'Method not allowed'}, 405)
+        else:
+            await _send_json(send, {'error': 'Not found'}, 404)
+        return
+
+    status = 500
+
+    async def send_counted(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        await send(message)
+
+    server.http_in_progress.inc()
+    try:
+        await handler(scope, receive, _compressing(send_counted, _headers_dict(scope).get('Accept-Encoding')))
+    finally:
+        server.http_in_progress.dec()
+        server.http_requests.labels(scope['method'], scope['path'], status).inc()
+        server.http_duration.labels(scope['method'], scope['path']).observe(time.perf_counter() - start_time)
+    logger.debug(f"{scope['method']} {scope['path']} handled in {time.perf_counter() - start_time:.4f}s")
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print(f"Rahalah ASGI server started at http://localhost:{PORT}")
+    uvicorn.run(app, port=PORT, log_level='info')
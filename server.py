@@ -1,5 +1,7 @@
-from flask import Flask, jsonify, request, render_template, url_for, send_from_directory
+from flask import Flask, jsonify, request, render_template, url_for, send_from_directory, send_file, abort, g
+from werkzeug.security import safe_join
 import os
+import mimetypes
 import requests
 from dotenv import load_dotenv
 import json
@@ -7,8 +9,23 @@ import logging
 import traceback
 import time
 from agents.agent_factory import AgentFactory
-from datetime import datetime
-from utils.debug import DebugConfig, performance_timer, capture_request, capture_response, log_agent_selection, logger as debug_logger
+from agents.providers import create_providers
+from agents.session_store import SessionStore
+from agents.conversation_history import summarize_turns
+from datetime import datetime, timedelta
+from utils.http_client import UpstreamClient, CircuitBreaker, CircuitOpenError
+from utils.search_cache import create_search_cache_from_env
+from utils.offer_store import (
+    FLIGHTS, HOTELS, PACKAGES, MAX_LIMIT, create_offer_store_from_env, decode_cursor, encode_cursor,
+    parse_fields, parse_offer_query, project_offers
+)
+from utils.http_encoding import (
+    FastJSONProvider, create_compression_policy_from_env, is_compressible, precompressed_variant
+)
+from utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, instrument_agent_system, metrics
+from utils import debug as debug_module
+from utils.debug import DebugConfig, performance_timer, capture_request, capture_response, log_agent_selection, trace_request, logger as debug_logger
+from utils.tracing import trace_agent_system, tracer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -25,11 +42,67 @@ app.config['TEMPLATES_AUTO_RELOAD'] = True
 app.jinja_env.auto_reload = True
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 
+# Encode responses with the fastest available JSON encoder (RAHALAH_JSON_ENCODER)
+# and compress them as negotiated with the client (RAHALAH_COMPRESSION)
+app.json = FastJSONProvider(app)
+compression_policy = create_compression_policy_from_env()
+
+# Front-end assets; utils/precompress.py writes .gz/.br copies next to them
+ASSET_DIRS = {
+    'static': app.static_folder,
+    'css': os.path.join(app.root_path, 'css'),
+    'js': os.path.join(app.root_path, 'js')
+}
+
 # Get API key from environment
 API_KEY = os.getenv('SEARCHAPI_IO_KEY')
 
-# Initialize the agent system
-master_agent = AgentFactory.create_agent_system()
+# Shared, pooled client for searchapi.io (the base URL can point at a local stub)
+SEARCHAPI_BASE_URL = os.getenv('SEARCHAPI_BASE_URL', 'https://www.searchapi.io')
+SEARCHAPI_CLIENT_OPTIONS = {
+    'connect_timeout': float(os.getenv('SEARCHAPI_CONNECT_TIMEOUT', '3.05')),
+    'read_timeout': float(os.getenv('SEARCHAPI_READ_TIMEOUT', '10')),
+    'max_retries': int(os.getenv('SEARCHAPI_MAX_RETRIES', '2')),
+    'headers': {'Accept': 'application/json'}
+}
+searchapi_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('SEARCHAPI_BREAKER_THRESHOLD', '5')),
+    reset_timeout=float(os.getenv('SEARCHAPI_BREAKER_RESET', '30'))
+)
+searchapi_client = UpstreamClient(SEARCHAPI_BASE_URL, breaker=searchapi_breaker, **SEARCHAPI_CLIENT_OPTIONS)
+
+# Inventory providers. The REST search endpoints always use searchapi.io; the
+# chat agents use the seeded mock inventory unless RAHALAH_INVENTORY_PROVIDER
+# is set to "searchapi"
+searchapi_providers = create_providers('searchapi', searchapi_client, api_key=API_KEY)
+flight_provider = searchapi_providers['flights']
+INVENTORY_PROVIDER = os.getenv('RAHALAH_INVENTORY_PROVIDER', 'mock')
+agent_providers = searchapi_providers if INVENTORY_PROVIDER == 'searchapi' else create_providers(INVENTORY_PROVIDER)
+
+# Cache for upstream flight searches, keyed by the normalized query
+search_cache = create_search_cache_from_env()
+
+# Recent flight and hotel results, indexed for filtering and paging by search id
+offer_store = create_offer_store_from_env()
+
+# Initialize the agent system (stateless, shared by all clients)
+master_agent = AgentFactory.create_agent_system(
+    providers=agent_providers,
+    max_workers=int(os.getenv('RAHALAH_AGENT_WORKERS', '8')),
+    agent_timeout=float(os.getenv('RAHALAH_AGENT_TIMEOUT', '10')),
+    total_budget=float(os.getenv('RAHALAH_AGENT_BUDGET', '15'))
+)
+instrument_agent_system(master_agent)
+trace_agent_system(master_agent)
+
+# Per-client conversation state
+SESSION_COOKIE = 'rahalah_session'
+session_store = SessionStore(
+    max_sessions=int(os.getenv('RAHALAH_MAX_SESSIONS', '10000')),
+    ttl=float(os.getenv('RAHALAH_SESSION_TTL', '1800')),
+    max_history=int(os.getenv('RAHALAH_SESSION_HISTORY', '50')),
+    compactor=summarize_turns
+)
 
 # Directory to save search results
 SEARCH_RESULTS_DIR = 'search_results'
@@ -38,11 +111,228 @@ if not os.path.exists(SEARCH_RESULTS_DIR):
 
 PORT = 8090
 
+# Request metrics, shared with the ASGI app; endpoints are labelled by route
+# pattern so paths with ids do not create a series each
+http_requests = metrics.counter('rahalah_http_requests_total', 'HTTP requests served',
+                                ('method', 'endpoint', 'status'))
+http_duration = metrics.histogram('rahalah_http_request_duration_seconds', 'Time to produce an HTTP response',
+                                  ('method', 'endpoint'))
+http_in_progress = metrics.gauge('rahalah_http_requests_in_progress', 'HTTP requests being served')
+
+@app.before_request
+def start_request_metrics():
+    """Note when the request started and count it as in progress."""
+    g.metrics_start_time = time.perf_counter()
+    http_in_progress.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the response and how long it took, including compression."""
+    start_time = g.get('metrics_start_time')
+    if start_time is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        http_requests.labels(request.method, endpoint, response.status_code).inc()
+        http_duration.labels(request.method, endpoint).observe(time.perf_counter() - start_time)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    """Take the request off the in-progress gauge, whatever happened to it."""
+    if g.pop('metrics_start_time', None) is not None:
+        http_in_progress.dec()
+
+@app.after_request
+def compress_response(response):
+    """Compress text responses for clients that accept it."""
+    if compression_policy is None or response.direct_passthrough or response.is_streamed \
+            or 'Content-Encoding' in response.headers or response.status_code in (204, 304):
+        return response
+    body = response.get_data()
+    coding = compression_policy.negotiate(request.headers.get('Accept-Encoding'), response.mimetype, len(body))
+    if coding is not None:
+        response.set_data(compression_policy.compress(body, coding))
+        response.headers['Content-Encoding'] = coding
+    if len(body) >= compression_policy.min_size and is_compressible(response.mimetype):
+        # Caches must keep the compressed and plain bodies apart
+        response.vary.add('Accept-Encoding')
+    return response
+
+def send_asset(directory, filename):
+    """Send a front-end asset, preferring a precompressed copy the client accepts."""
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    variant = precompressed_variant(path, request.headers.get('Accept-Encoding'))
+    if variant is None:
+        return send_from_directory(directory, filename)
+    compressed_path, coding = variant
+    response = send_file(compressed_path, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    response.headers['Content-Encoding'] = coding
+    response.vary.add('Accept-Encoding')
+    return response
+
+app.view_functions['static'] = lambda filename: send_asset(ASSET_DIRS['static'], filename)
+
+@app.route('/css/<path:filename>')
+def css_asset(filename):
+    return send_asset(ASSET_DIRS['css'], filename)
+
+@app.route('/js/<path:filename>')
+def js_asset(filename):
+    return send_asset(ASSET_DIRS['js'], filename)
+
 @app.route('/')
 def index():
     return render_template('chat.html')
 
+def resolve_session(data, headers, cookies):
+    """Look up the client's session from the body, header or cookie."""
+    # Anything but a string in the body (a number, a list) counts as no id
+    body_session_id = data.get('session_id')
+    if not isinstance(body_session_id, str):
+        body_session_id = None
+    return session_store.get_or_create(
+        body_session_id
+        or headers.get('X-Session-ID')
+        or cookies.get(SESSION_COOKIE)
+    )
+
+# Payload key holding each kind of result
+RESULT_KEYS = {FLIGHTS: 'flight_results', HOTELS: 'hotel_results', PACKAGES: 'package_results'}
+
+def parse_result_page_options(data):
+    """
+    Read the optional paging options of a /process_message body.
+    
+    Args:
+        data (dict): The request body; "limit" caps the results returned and
+            "fields" (list or comma separated string) projects each result
+            onto the given fields, dotted for nested ones ("hotel.name")
+        
+    Returns:
+        tuple: (limit, fields), each None when not given
+        
+    Raises:
+        ValueError: If an option is invalid
+    """
+    limit = data.get('limit')
+    if limit is not None:
+        if isinstance(limit, bool) or not isinstance(limit, int) or not 0 < limit <= MAX_LIMIT:
+            raise ValueError(f"limit must be an integer between 1 and {MAX_LIMIT}")
+    return limit, parse_fields(data.get('fields'))
+
+def _page_results(results, search_id, limit, fields):
+    """Cut the first page of a result set and the cursor for the rest."""
+    next_cursor = None
+    if limit is not None and len(results) > limit:
+        next_cursor = encode_cursor(search_id, limit, limit, fields)
+        results = results[:limit]
+    return project_offers(results, fields), next_cursor
+
+def build_chat_payload(response, session, limit=None, fields=None):
+    """
+    Build the /process_message JSON body from a master agent response.
+    
+    Shared by the Flask view and the ASGI app so both return identical JSON.
+    
+    Args:
+        response (dict): The master agent's response
+        session: The client's session
+        limit (int, optional): Results to return; the rest are fetched
+            with the returned next_cursor
+        fields (list, optional): Fields to keep in each result
+    """
+    # Extract the flight, hotel, or package results based on response type
+    flight_results = []
+    hotel_results = []
+    package_results = []
+    
+    if response.get('type') == 'flights' and 'results' in response:
+        flight_results = response['results']
+        logger.info(f"Found {len(flight_results)} flight results")
+    elif response.get('type') == 'hotels' and 'results' in response:
+        hotel_results = response['results']
+        logger.info(f"Found {len(hotel_results)} hotel results")
+    elif response.get('type') == 'packages' and 'results' in response:
+        package_results = response['results']
+        logger.info(f"Found {len(package_results)} package results")
+    
+    logger.info(f"Response type: {response.get('type', 'text')}")
+    logger.info(f"Has flight results: {bool(flight_results)}")
+    logger.info(f"Has hotel results: {bool(hotel_results)}")
+    logger.info(f"Has package results: {bool(package_results)}")
+    
+    # Keep the results so /api/offers and cursors can filter and page them
+    results = {FLIGHTS: flight_results, HOTELS: hotel_results, PACKAGES: package_results}
+    search_id = None
+    total_results = 0
+    next_cursor = None
+    for kind, kind_results in results.items():
+        if kind_results:
+            search_id = offer_store.put(kind, kind_results)
+            total_results = len(kind_results)
+            if limit is not None or fields:
+                results[kind], next_cursor = _page_results(kind_results, search_id, limit, fields)
+            break
+    
+    return {
+        'response': response.get('content', 'Sorry, I could not process your request'),
+        'type': response.get('type', 'text'),
+        'flight_results': results[FLIGHTS],
+        'hotel_results': results[HOTELS],
+        'package_results': results[PACKAGES],
+        'search_id': search_id,
+        'total_results': total_results,
+        'next_cursor': next_cursor,
+        'partial': response.get('partial', False),
+        'session_id': session.session_id
+    }
+
+def build_cursor_payload(cursor, session):
+    """
+    Build the /process_message body for the next page of earlier results.
+    
+    Args:
+        cursor (str): The next_cursor of a previous response
+        session: The client's session
+        
+    Returns:
+        tuple: (payload, status)
+    """
+    try:
+        state = decode_cursor(cursor)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    index = offer_store.get(state['search_id'])
+    if index is None:
+        return {'error': 'These results have expired; send the message again'}, 404
+    page = index.query(None, state['sort'], state['offset'], state['limit'])
+    next_cursor = None
+    if page.has_more:
+        next_cursor = encode_cursor(state['search_id'], page.offset + len(page.offers), page.limit,
+                                    state['fields'], state['sort'])
+    payload = {
+        'response': '',
+        'type': index.kind,
+        'flight_results': [],
+        'hotel_results': [],
+        'package_results': [],
+        'search_id': state['search_id'],
+        'total_results': page.total,
+        'next_cursor': next_cursor,
+        'partial': False,
+        'session_id': session.session_id
+    }
+    payload[RESULT_KEYS[index.kind]] = project_offers(page.offers, state['fields'])
+    return payload, 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Expose metrics in the Prometheus text format, merged across workers when configured."""
+    return app.response_class(metrics.render(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/process_message', methods=['POST'])
+@trace_request
 @capture_request
 @capture_response
 @performance_timer
@@ -57,131 +347,206 @@ def process_message():
         data = request.get_json()
         logger.info(f"Received data: {data}")
         
+        # A cursor asks for more of an earlier answer's results; the agents
+        # are not run again
+        if data.get('cursor'):
+            session = resolve_session(data, request.headers, request.cookies)
+            payload, status = build_cursor_payload(data['cursor'], session)
+            http_response = jsonify(payload)
+            http_response.status_code = status
+            http_response.set_cookie(SESSION_COOKIE, session.session_id, httponly=True, samesite='Lax')
+            return http_response
+        
         user_message = data.get('message', '')
         
         if not user_message:
             logger.error("No message provided")
             return jsonify({'error': 'Message is required'}), 400
         
+        try:
+            limit, fields = parse_result_page_options(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Process the message through the master agent
         logger.info(f"Processing message: {user_message}")
         
-        # Get agent scores for debugging
-        agent_scores = master_agent._analyze_request(user_message)
-        logger.info(f"Agent scores: {agent_scores}")
+        session = resolve_session(data, request.headers, request.cookies)
+        
+        # Route once; the decision is logged here and reused by the master agent
+        routing = master_agent.route(user_message)
+        logger.info(f"Agent scores: {routing.scores}")
         
         # Log agent selection for debugging
-        top_agent = max(agent_scores.items(), key=lambda x: x[1])[0] if agent_scores else None
-        log_agent_selection(agent_scores, top_agent)
+        log_agent_selection(routing.scores, routing.selected_agent)
         
         # Process the request
-        process_start_time = time.time()
-        response = master_agent.process_request(user_message)
-        process_duration = time.time() - process_start_time
-        debug_logger.debug(f"Request processing completed in {process_duration:.4f}s")
-        
-        # Extract the flight, hotel, or package results based on response type
-        flight_results = []
-        hotel_results = []
-        package_results = []
-        
-        if response.get('type') == 'flights' and 'results' in response:
-            flight_results = response['results']
-            logger.info(f"Found {len(flight_results)} flight results")
-        elif response.get('type') == 'hotels' and 'results' in response:
-            hotel_results = response['results']
-            logger.info(f"Found {len(hotel_results)} hotel results")
-        elif response.get('type') == 'packages' and 'results' in response:
-            package_results = response['results']
-            logger.info(f"Found {len(package_results)} package results")
-        
-        logger.info(f"Response type: {response.get('type', 'text')}")
-        logger.info(f"Has flight results: {bool(flight_results)}")
-        logger.info(f"Has hotel results: {bool(hotel_results)}")
-        logger.info(f"Has package results: {bool(package_results)}")
+        response = master_agent.process_request(user_message, routing=routing, session=session)
+        debug_logger.debug(f"Request routed in {routing.timings['routing']:.4f}s, "
+                           f"processed in {routing.timings['processing']:.4f}s")
         
         # Return the agent's response
-        return jsonify({
-            'response': response.get('content', 'Sorry, I could not process your request'),
-            'type': response.get('type', 'text'),
-            'flight_results': flight_results,
-            'hotel_results': hotel_results,
-            'package_results': package_results
-        })
+        http_response = jsonify(build_chat_payload(response, session, limit, fields))
+        http_response.set_cookie(SESSION_COOKIE, session.session_id, httponly=True, samesite='Lax')
+        return http_response
     except Exception as e:
         logger.error(f"Error processing message: {str(e)}")
         return jsonify({'error': f'Error processing message: {str(e)}'}), 500
 
+def build_flight_search_params(args):
+    """
+    Build the searchapi.io query for a flight search request.
+    
+    Args:
+        args: Mapping of query string arguments
+        
+    Returns:
+        dict: The upstream search parameters, or None if required ones are missing
+    """
+    # Get parameters from request
+    departure_id = args.get('departure_id', '')
+    arrival_id = args.get('arrival_id', '')
+    outbound_date = args.get('outbound_date')
+    flight_type = args.get('flight_type', 'one_way')
+    date_range = None
+    
+    # Validate required parameters
+    if not all([departure_id, arrival_id]):
+        return None
+
+    # If no date specified, search for cheapest flights in the range
+    if not outbound_date:
+        current_date = datetime.now()
+        start_date = current_date + timedelta(days=60)  # Two months from now
+        end_date = start_date + timedelta(days=7)  # Search for a week
+        outbound_date = start_date.strftime('%Y-%m-%d')
+        date_range = f"{start_date.strftime('%Y-%m-%d')}:{end_date.strftime('%Y-%m-%d')}"
+
+    # Get standardized search parameters
+    params = flight_provider.query_params({
+        'departure_id': departure_id,
+        'arrival_id': arrival_id,
+        'outbound_date': outbound_date,
+        'flight_type': flight_type,
+        'return_date': args.get('return_date')
+    })
+
+    # Add date range to params if we calculated it
+    if date_range:
+        params['date_range'] = date_range
+        
+    return params
+
+def is_cacheable_flight_result(result):
+    """Only successful upstream searches are cached."""
+    return result['status'] == 200
+
+def build_flight_search_payload(result, params=None, offers=False):
+    """
+    Turn an upstream flight search result into the response body and status.
+    
+    Shared by the Flask view and the ASGI app so both return identical JSON.
+    
+    Args:
+        result (dict): The cached upstream result
+        params (dict, optional): The query that produced it
+        offers (bool): Return normalized offers (agents/offers.py) instead
+            of the raw searchapi.io response
+    """
+    if result['status'] == 200 and offers:
+        search = flight_provider.parse_response(result, params or {})
+        search_id = offer_store.put(FLIGHTS, search.offers)
+        return {'provider': search.provider, 'search_id': search_id, 'offers': search.offers}, 200
+    if result['status'] == 200:
+        data = result['data']
+        
+        # Process results
+        if 'best_flights' in data:
+            for flight in data['best_flights']:
+                if 'booking_token' in flight:
+                    flight['booking_url'] = f"https://www.searchapi.io/api/v1/searches/{data['search_metadata']['id']}?token={flight['booking_token']}"
+        
+        return data, 200
+    return {
+        'error': f'API request failed with status {result["status"]}',
+        'details': result['details']
+    }, result['status']
+
+MISSING_FLIGHT_PARAMS_ERROR = {
+    'error': 'Missing required parameters: departure_id and arrival_id are required'
+}
+
 @app.route('/api/search/flights', methods=['GET'])
 def search_flights():
     try:
-        # Get parameters from request
-        departure_id = request.args.get('departure_id', '')
-        arrival_id = request.args.get('arrival_id', '')
-        outbound_date = request.args.get('outbound_date')
-        flight_type = request.args.get('flight_type', 'one_way')
-        
-        # Validate required parameters
-        if not all([departure_id, arrival_id]):
-            return jsonify({
-                'error': 'Missing required parameters: departure_id and arrival_id are required'
-            }), 400
-
-        # If no date specified, search for cheapest flights in the range
-        if not outbound_date:
-            from datetime import datetime, timedelta
-            current_date = datetime.now()
-            start_date = current_date + timedelta(days=60)  # Two months from now
-            end_date = start_date + timedelta(days=7)  # Search for a week
-            outbound_date = start_date.strftime('%Y-%m-%d')
-            date_range = f"{start_date.strftime('%Y-%m-%d')}:{end_date.strftime('%Y-%m-%d')}"
-
-        # Get standardized search parameters
-        params = {
-            'engine': 'google_flights',
-            'departure_id': departure_id,
-            'arrival_id': arrival_id,
-            'flight_type': flight_type,
-            'api_key': API_KEY,
-            'sort_by': 'price',
-            'currency': 'USD',
-            'adults': 1,
-            'travel_class': 'economy',
-            'max_price': 1000
-        }
-
-        # Add date range to params if we calculated it
-        if 'date_range' in locals():
-            params['date_range'] = date_range
+        params = build_flight_search_params(request.args)
+        if params is None:
+            return jsonify(MISSING_FLIGHT_PARAMS_ERROR), 400
 
-        # Make API request
-        response = requests.get(
-            'https://www.searchapi.io/api/v1/search',
-            params=params,
-            headers={'Accept': 'application/json'}
-        )
-
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Process results
-            if 'best_flights' in data:
-                for flight in data['best_flights']:
-                    if 'booking_token' in flight:
-                        flight['booking_url'] = f"https://www.searchapi.io/api/v1/searches/{data['search_metadata']['id']}?token={flight['booking_token']}"
-            
-            return jsonify(data)
-        else:
-            return jsonify({
-                'error': f'API request failed with status {response.status_code}',
-                'details': response.text
-            }), response.status_code
+        # Serve identical searches from the cache; only successful results are stored
+        result = search_cache.get_or_fetch(params, lambda: flight_provider.fetch(params),
+                                           cacheable=is_cacheable_flight_result)
+        payload, status = build_flight_search_payload(result, params, request.args.get('format') == 'offers')
+        return jsonify(payload), status
 
+    except CircuitOpenError as e:
+        return jsonify({
+            'error': f'Flight search is temporarily unavailable: {str(e)}'
+        }), 503
+    except requests.Timeout:
+        return jsonify({
+            'error': 'Flight search provider timed out'
+        }), 504
+    except requests.ConnectionError as e:
+        return jsonify({
+            'error': f'Could not reach flight search provider: {str(e)}'
+        }), 502
     except Exception as e:
         return jsonify({
             'error': f'An error occurred: {str(e)}'
         }), 500
 
+def build_offer_page_payload(args):
+    """
+    Filter, sort and page a stored search for /api/offers.
+    
+    Shared by the Flask view and the ASGI app so both return identical JSON.
+    
+    Args:
+        args: Mapping of query string arguments; search_id is required, the
+            rest are read by utils.offer_store.parse_offer_query
+        
+    Returns:
+        tuple: (payload, status)
+    """
+    search_id = args.get('search_id')
+    if not search_id:
+        return {'error': 'Missing required parameter: search_id'}, 400
+    index = offer_store.get(search_id)
+    if index is None:
+        return {'error': 'Unknown or expired search_id; run the search again'}, 404
+    try:
+        filters, sort, offset, limit = parse_offer_query(args)
+        fields = parse_fields(args.get('fields'))
+        page = index.query(filters, sort, offset, limit)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    return {
+        'search_id': search_id,
+        'kind': index.kind,
+        'total': page.total,
+        'offset': page.offset,
+        'limit': page.limit,
+        'has_more': page.has_more,
+        'offers': project_offers(page.offers, fields)
+    }, 200
+
+@app.route('/api/offers', methods=['GET'])
+def offers_page():
+    """Filter, sort and page the offers of an earlier flight or hotel search."""
+    payload, status = build_offer_page_payload(request.args)
+    return jsonify(payload), status
+
 # Enable debug routes if debug mode is enabled
 if os.environ.get('RAHALAH_DEBUG', 'false').lower() in ('true', '1', 'yes'):
     @app.route('/debug/config', methods=['GET', 'POST'])
@@ -199,7 +564,14 @@ if os.environ.get('RAHALAH_DEBUG', 'false').lower() in ('true', '1', 'yes'):
             'log_to_file': DebugConfig.log_to_file,
             'max_log_files': DebugConfig.max_log_files,
             'enable_request_capture': DebugConfig.enable_request_capture,
-            'enable_response_capture': DebugConfig.enable_response_capture
+            'enable_response_capture': DebugConfig.enable_response_capture,
+            'profiling_enabled': DebugConfig.profiling_enabled,
+            'profile_sample_rate': DebugConfig.profile_sample_rate,
+            'profile_window': DebugConfig.profile_window,
+            'trace_sample_rate': DebugConfig.trace_sample_rate,
+            'instrument_agents': DebugConfig.instrument_agents,
+            'record_requests': DebugConfig.record_requests,
+            'record_min_duration': DebugConfig.record_min_duration
         }
         
         if request.method == 'POST' and request.is_json:
@@ -216,6 +588,56 @@ if os.environ.get('RAHALAH_DEBUG', 'false').lower() in ('true', '1', 'yes'):
             'config': config_dict
         })
     
+    @app.route('/debug/search_cache', methods=['GET'])
+    def debug_search_cache():
+        """View flight search cache counters."""
+        return jsonify({
+            'status': 'success',
+            'stats': search_cache.stats(),
+            'offer_store': offer_store.stats()
+        })
+    
+    @app.route('/debug/profile', methods=['GET'])
+    def debug_profile():
+        """Serve the sampling profile of the last N seconds."""
+        profiler = debug_module.profiler
+        if profiler is None:
+            return jsonify({
+                'error': 'Profiling is off; POST {"profiling_enabled": true} to /debug/config'
+            }), 409
+        
+        seconds = request.args.get('seconds', type=float)
+        output_format = request.args.get('format', 'collapsed')
+        if output_format == 'speedscope':
+            response = jsonify(profiler.speedscope(seconds, name=f"rahalah-{datetime.now():%Y%m%d_%H%M%S}"))
+            response.headers['Content-Disposition'] = 'attachment; filename="rahalah.speedscope.json"'
+            return response
+        if output_format == 'stats':
+            return jsonify({'status': 'success', 'stats': profiler.stats()})
+        if output_format != 'collapsed':
+            return jsonify({'error': 'format must be collapsed, speedscope or stats'}), 400
+        return app.response_class(profiler.collapsed(seconds), mimetype='text/plain')
+    
+    @app.route('/debug/traces', methods=['GET'])
+    def debug_traces():
+        """List the most recent sampled traces, newest first."""
+        limit = request.args.get('limit', 20, type=int)
+        traces = list(tracer.recent)[::-1][:max(limit, 0)]
+        return jsonify({
+            'status': 'success',
+            'stats': tracer.stats(),
+            'traces': [dict(trace.summary(), url=url_for('debug_trace', trace_id=trace.trace_id))
+                       for trace in traces]
+        })
+    
+    @app.route('/debug/traces/<trace_id>', methods=['GET'])
+    def debug_trace(trace_id):
+        """Show every span of a recent trace."""
+        trace = tracer.find(trace_id)
+        if trace is None:
+            return jsonify({'error': 'Trace not found; it was not sampled or has been evicted'}), 404
+        return jsonify({'status': 'success', 'trace': trace.to_dict()})
+    
     @app.route('/debug/logs', methods=['GET'])
     def debug_logs():
         """View recent debug logs."""
@@ -239,7 +661,9 @@ if os.environ.get('RAHALAH_DEBUG', 'false').lower() in ('true', '1', 'yes'):
             
         return jsonify({
             'status': 'success',
-            'logs': logs
+            'logs': logs,
+            'pipeline': debug_module.log_writer.stats(),
+            'captures': debug_module.request_recorder.stats()
         })
     
     @app.route('/debug/logs/<filename>', methods=['GET'])
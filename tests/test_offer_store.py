@@ -0,0 +1,44 @@
+"""Regression tests for search ids in utils/offer_store.py."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.mock_inventory import MockInventory
+from utils.offer_store import OfferStore, search_id_for
+
+
+def hotel_search(check_out):
+    return MockInventory(seed=1).hotel_results({"location": "DXB", "check_in": "2026-05-01",
+                                                "check_out": check_out}, count=5)
+
+
+def test_searches_sharing_offer_ids_get_different_search_ids():
+    three_nights = hotel_search("2026-05-04")
+    seven_nights = hotel_search("2026-05-08")
+    # Mock hotel ids only depend on the city and check-in date
+    assert [offer["id"] for offer in three_nights] == [offer["id"] for offer in seven_nights]
+
+    assert search_id_for("hotels", three_nights) != search_id_for("hotels", seven_nights)
+
+
+def test_store_does_not_serve_another_searches_offers():
+    store = OfferStore()
+    first = [{"id": "hotel-0", "total_price": 744}, {"id": "hotel-1", "total_price": 861}]
+    second = [{"id": "hotel-0", "total_price": 1736}, {"id": "hotel-1", "total_price": 2009}]
+
+    first_id = store.put("hotels", first)
+    second_id = store.put("hotels", second)
+
+    assert first_id != second_id
+    assert store.get(second_id) is not store.get(first_id)
+
+
+def test_identical_results_share_an_index():
+    store = OfferStore()
+    offers = hotel_search("2026-05-04")
+
+    search_id = store.put("hotels", offers)
+
+    assert store.put("hotels", [dict(offer) for offer in offers]) == search_id
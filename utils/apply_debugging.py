@@ -1,25 +1,43 @@
 """
-Apply debugging decorators to Rahalah agent classes.
+Attach debugging instrumentation to Rahalah agent classes at runtime.
 
-This script applies performance monitoring and logging decorators to all agent classes,
-making it easier to debug and trace the agent system's behavior.
+Each selected method gets one wrapper that combines performance timing, call
+logging and exception tracing as configured for it, in place of the
+stacked ``performance_timer``, ``log_function_call`` and
+``trace_exception`` decorators. ``detach`` puts the original function
+objects back, so instrumentation that is off costs nothing at all.
+
+Instrumentation follows ``DebugConfig.instrument_agents`` (also settable
+through ``/debug/config`` or ``RAHALAH_INSTRUMENT_AGENTS``); it can also be
+driven directly::
+
+    from utils.apply_debugging import attach, detach
+    attach()
+    ...
+    detach()
 """
 
+import functools
 import importlib
 import inspect
+import logging
 import os
 import sys
+import time
+import traceback
 from types import FunctionType, ModuleType
-from typing import Any, Dict, List, Set, Tuple, Type
+from typing import Any, Callable, Dict, List, Tuple, Type
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.debug import (
-    performance_timer, 
-    log_function_call, 
-    trace_exception,
-    logger
+    DebugConfig,
+    LazyCall,
+    LazyRepr,
+    function_duration,
+    logger,
+    will_log
 )
 
 # Agent classes and methods to apply decorators to
@@ -40,8 +58,8 @@ PERFORMANCE_METHODS = {
     "_extract_flight_params",
     "_extract_hotel_params",
     "_extract_package_params",
-    "_get_mock_flight_results",
-    "_get_mock_hotel_results",
+    "_search_flights",
+    "_search_hotels",
     "_get_mock_package_results",
     "_consolidate_responses",
 }
@@ -84,54 +102,97 @@ def get_agent_classes(module: ModuleType) -> List[Tuple[str, Type]]:
             
     return agent_classes
 
-def apply_decorators_to_method(
-    cls: Type, 
-    method_name: str,
-    method_sets: List[Tuple[Set[str], Any]]
-) -> bool:
-    """Apply decorators to a specific method if it exists in the class."""
-    if not hasattr(cls, method_name):
-        return False
+# Class attributes replaced by attach, by (class, method name), so detach can restore them
+_originals: Dict[Tuple[Type, str], Any] = {}
+
+def instrument(func: FunctionType, timed: bool = False, logged: bool = False, trace_errors: bool = False,
+               level: int = logging.DEBUG) -> Callable:
+    """
+    Wrap a function once for every kind of instrumentation it needs.
+    
+    Args:
+        func: The function to wrap
+        timed: Record its duration, as performance_timer does
+        logged: Log calls and return values at ``level``, as log_function_call does
+        trace_errors: Log exceptions with their traceback, as trace_exception does
+        level: Level for call logging
         
-    method = getattr(cls, method_name)
-    if not isinstance(method, FunctionType):
+    Returns:
+        The wrapper
+    """
+    func_name = f"{func.__module__}.{func.__qualname__}"
+    duration = function_duration.labels(func_name)
+    
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        log_call = logged and will_log(level)
+        if log_call:
+            caller = sys._getframe(1)
+            logger.log(level, "CALL %s(%s) from %s:%s", func_name, LazyCall(args, kwargs),
+                       caller.f_code.co_filename, caller.f_lineno)
+        start_time = time.perf_counter() if timed else 0.0
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if log_call or trace_errors:
+                logger.error(f"Exception in {func_name}: {str(e)}")
+                logger.debug(f"Traceback: {traceback.format_exc()}")
+            raise
+        if timed:
+            execution_time = time.perf_counter() - start_time
+            duration.observe(execution_time)
+            if will_log(logging.DEBUG):
+                logger.debug("Performance: %s executed in %.4f seconds", func_name, execution_time)
+            if execution_time > 1.0:
+                logger.info(f"Slow operation detected: {func_name} took {execution_time:.4f} seconds")
+        if log_call:
+            logger.log(level, "RETURN from %s: %s", func_name, LazyRepr(result, limit=1000))
+        return result
+    
+    wrapper.__instrumented__ = True
+    return wrapper
+
+def instrument_method(cls: Type, method_name: str) -> bool:
+    """
+    Instrument a method defined on ``cls`` itself, if any instrumentation applies to it.
+    
+    Inherited methods are instrumented on the class that defines them.
+    Coroutine functions are left alone.
+    
+    Returns:
+        Whether the method was wrapped
+    """
+    raw = cls.__dict__.get(method_name)
+    if raw is None or (cls, method_name) in _originals:
+        return False
+    func = raw.__func__ if isinstance(raw, (staticmethod, classmethod)) else raw
+    if not isinstance(func, FunctionType) or inspect.iscoroutinefunction(func):
         return False
-        
-    # Track if any decorators were applied
-    applied = False
     
-    # Apply decorators based on method sets
-    for method_set, decorator in method_sets:
-        if method_name in method_set:
-            # Avoid applying decorator if already applied
-            if hasattr(method, "__decorated_with__") and decorator.__name__ in method.__decorated_with__:
-                continue
-                
-            # Apply decorator
-            decorated_method = decorator(method)
-            
-            # Track which decorators have been applied
-            if not hasattr(decorated_method, "__decorated_with__"):
-                decorated_method.__decorated_with__ = set()
-            decorated_method.__decorated_with__.add(decorator.__name__)
-            
-            # Set the decorated method back on the class
-            setattr(cls, method_name, decorated_method)
-            applied = True
-            logger.debug(f"Applied {decorator.__name__} to {cls.__name__}.{method_name}")
-            
-    return applied
+    timed = method_name in PERFORMANCE_METHODS and DebugConfig.performance_monitoring
+    logged = method_name in LOG_METHODS
+    trace_errors = method_name in EXCEPTION_TRACE_METHODS
+    if not (timed or logged or trace_errors):
+        return False
+    
+    wrapper = instrument(func, timed=timed, logged=logged, trace_errors=trace_errors)
+    setattr(cls, method_name, type(raw)(wrapper) if isinstance(raw, (staticmethod, classmethod)) else wrapper)
+    _originals[(cls, method_name)] = raw
+    logger.debug(f"Instrumented {cls.__name__}.{method_name}")
+    return True
+
+def is_attached() -> bool:
+    """Whether agent methods are currently instrumented."""
+    return bool(_originals)
 
-def apply_debugging_to_agents():
-    """Apply all debugging decorators to agent classes."""
-    logger.info("Applying debugging decorators to agent classes...")
+def attach() -> Dict[str, int]:
+    """
+    Instrument the agent classes, replacing any instrumentation already attached.
     
-    # Use list of tuples instead of dict with sets as keys
-    method_sets = [
-        (PERFORMANCE_METHODS, performance_timer),
-        (LOG_METHODS, log_function_call()),
-        (EXCEPTION_TRACE_METHODS, trace_exception())
-    ]
+    Returns:
+        Counts of modules, classes and methods processed
+    """
+    detach()
     
     # Track stats
     stats = {
@@ -151,19 +212,14 @@ def apply_debugging_to_agents():
         agent_classes = get_agent_classes(module)
         stats["modules_processed"] += 1
         
-        # Apply decorators to each agent class
         for class_name, cls in agent_classes:
-            logger.info(f"Processing class: {class_name}")
             stats["classes_processed"] += 1
-            
-            # Get all methods in the class
-            for name, obj in inspect.getmembers(cls):
-                if isinstance(obj, FunctionType) and not name.startswith("__"):
-                    if apply_decorators_to_method(cls, name, method_sets):
-                        stats["methods_decorated"] += 1
+            for name in list(vars(cls)):
+                if not name.startswith("__") and instrument_method(cls, name):
+                    stats["methods_decorated"] += 1
     
     # Log results
-    logger.info(f"Debugging decorators applied to {stats['methods_decorated']} methods " +
+    logger.info(f"Debugging instrumentation attached to {stats['methods_decorated']} methods " +
                f"in {stats['classes_processed']} classes across {stats['modules_processed']} modules.")
     
     if stats["modules_failed"] > 0:
@@ -171,6 +227,39 @@ def apply_debugging_to_agents():
         
     return stats
 
+def detach() -> int:
+    """
+    Restore every instrumented method to its original function object.
+    
+    Returns:
+        Number of methods restored
+    """
+    restored = len(_originals)
+    for (cls, method_name), raw in _originals.items():
+        setattr(cls, method_name, raw)
+    _originals.clear()
+    if restored:
+        logger.info(f"Debugging instrumentation detached from {restored} methods.")
+    return restored
+
+def sync_with_config() -> bool:
+    """
+    Attach or detach instrumentation to match DebugConfig.
+    
+    Returns:
+        Whether instrumentation is attached afterwards
+    """
+    if DebugConfig.enabled and DebugConfig.instrument_agents:
+        attach()
+    else:
+        detach()
+    return is_attached()
+
+def apply_debugging_to_agents() -> Dict[str, int]:
+    """Apply debugging instrumentation to agent classes (same as ``attach``)."""
+    return attach()
+
 if __name__ == "__main__":
-    apply_debugging_to_agents()
-    print("Debugging decorators applied to all agent classes. Restart the server for changes to take effect.")
+    stats = apply_debugging_to_agents()
+    print(f"Instrumented {stats['methods_decorated']} agent methods. Within the server, set "
+          f"RAHALAH_INSTRUMENT_AGENTS=true or POST {{\"instrument_agents\": true}} to /debug/config.")
@@ -0,0 +1,575 @@
+"""
+Micro-benchmarks for the Rahalah agent system.
+
+Each benchmark runs a hot path from the server against a corpus of realistic
+chat messages and reports the per-request cost, so changes to routing and
+parameter extraction can be measured without running the Flask app:
+
+    python utils/benchmark.py routing --iterations 2000
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Realistic chat messages covering every agent
+SAMPLE_MESSAGES = [
+    "hello",
+    "Hi there, how are you?",
+    "I need a flight from Dammam to Riyadh tomorrow",
+    "DMM to RUH next week",
+    "DMM-JED in 3 days under $400",
+    "Find me a hotel in Dubai for 2 guests",
+    "hotel dammam tomorrow",
+    "book a room at a resort in Bangkok this weekend with a swimming pool",
+    "flight and hotel to Dubai",
+    "vacation package from Jeddah to Istanbul for 2 adults and 1 child",
+    "cheap combo deal to Bangkok with a 5 star hotel under $2000",
+    "What are things to do in Rome?",
+    "I want to visit Tokyo.",
+    "Plan a trip to Cairo next month",
+    "round trip from Jeddah to London returning in 2 weeks",
+    "stay near the airport in Riyadh tonight",
+    "museums and beaches in Barcelona",
+    "Good morning, any desert safari tours?",
+    "from New York to Paris in 2 months",
+    "suite with Spa and Free WiFi from April 10 to April 14 for 3 people",
+]
+
+
+def _time_per_call(func: Callable[[str], object], messages: List[str], iterations: int) -> float:
+    """Run ``func`` over the corpus ``iterations`` times and return seconds per call."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for message in messages:
+            func(message)
+    return (time.perf_counter() - start) / (iterations * len(messages))
+
+
+def _report(title: str, results: Dict[str, float], baseline: str) -> None:
+    """Print per-call timings relative to the baseline entry."""
+    print(title)
+    base = results[baseline]
+    for name, seconds in results.items():
+        print(f"  {name:<28} {seconds * 1e6:10.1f} us/request  ({base / seconds:5.2f}x)")
+
+
+def bench_routing(iterations: int) -> Dict[str, float]:
+    """
+    Compare routing twice per chat message (logging pass plus process_request)
+    with routing once and threading the RoutingResult through.
+    """
+    from agents.agent_factory import AgentFactory
+
+    master_agent = AgentFactory.create_agent_system()
+
+    def route_only(message: str) -> None:
+        master_agent.route(message)
+
+    def double_routing(message: str) -> None:
+        master_agent._analyze_request(message)
+        master_agent.process_request(message)
+
+    def single_routing(message: str) -> None:
+        routing = master_agent.route(message)
+        master_agent.process_request(message, routing=routing)
+
+    results = {
+        "routing only": _time_per_call(route_only, SAMPLE_MESSAGES, iterations),
+        "double routing": _time_per_call(double_routing, SAMPLE_MESSAGES, iterations),
+        "single routing": _time_per_call(single_routing, SAMPLE_MESSAGES, iterations),
+    }
+    _report("Routing (per /process_message request)", results, "double routing")
+    saved = results["double routing"] - results["single routing"]
+    print(f"  saved per request: {saved * 1e6:.1f} us")
+    return results
+
+
+def bench_history(iterations: int) -> Dict[str, float]:
+    """
+    Feed a long conversation through one session and check that the
+    history footprint stops growing once the ring buffer is full.
+    """
+    from agents.agent_factory import AgentFactory
+    from agents.conversation_history import summarize_turns
+    from agents.session_store import SessionStore
+
+    master_agent = AgentFactory.create_agent_system()
+    store = SessionStore(max_history=50, compactor=summarize_turns)
+    session = store.get_or_create()
+
+    print("Conversation history footprint (one session)")
+    samples = {}
+    checkpoints = {10, 100, 1000, iterations * len(SAMPLE_MESSAGES)}
+    requests = 0
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for message in SAMPLE_MESSAGES:
+            master_agent.process_request(message, session=session)
+            requests += 1
+            if requests in checkpoints:
+                samples[f"{requests} requests"] = float(store.memory_usage())
+                print(f"  after {requests:>7} requests: {store.memory_usage():>8} bytes, "
+                      f"{len(session.history)} turns{' + summary' if session.history.summary else ''}")
+    elapsed = time.perf_counter() - start
+    print(f"  {elapsed / requests * 1e6:.1f} us/request")
+    return samples
+
+
+def bench_extraction(iterations: int) -> Dict[str, float]:
+    """
+    Time each agent's parameter extractor over the corpus, and compare
+    compiling patterns inline on every call with the shared registry.
+    """
+    import re
+    from agents.agent_factory import AgentFactory
+    from agents.extraction_patterns import PATTERNS
+
+    master_agent = AgentFactory.create_agent_system()
+    agents = master_agent.specialized_agents
+
+    extractors = {
+        "flights": agents["flights"]._extract_flight_params,
+        "hotels": agents["hotels"]._extract_hotel_params,
+        "packages": agents["packages"]._extract_package_params,
+        "general": agents["general"].process_request,
+        "preferences": master_agent.extract_user_preferences,
+    }
+    results = {name: _time_per_call(func, SAMPLE_MESSAGES, iterations) for name, func in extractors.items()}
+    print("Parameter extraction (per message)")
+    for name, seconds in results.items():
+        print(f"  {name:<28} {seconds * 1e6:10.1f} us/request")
+
+    lowered = [message.lower() for message in SAMPLE_MESSAGES]
+    patterns = list(PATTERNS.values())
+
+    def inline(message: str) -> None:
+        for compiled in patterns:
+            re.search(compiled.pattern, message, compiled.flags)
+
+    def precompiled(message: str) -> None:
+        for compiled in patterns:
+            compiled.search(message)
+
+    registry = {
+        "inline re.search": _time_per_call(inline, lowered, iterations),
+        "precompiled registry": _time_per_call(precompiled, lowered, iterations),
+    }
+    _report(f"All {len(patterns)} registered patterns (per message)", registry, "inline re.search")
+
+    # A message fanned out to the flight, hotel and package agents
+    from datetime import date
+    from agents.request_parser import normalize_request
+
+    parser = master_agent.parser
+    today = date.today()
+
+    def per_agent(message: str) -> None:
+        agents["flights"]._extract_flight_params(message)
+        agents["hotels"]._extract_hotel_params(message)
+        agents["packages"]._extract_package_params(message)
+
+    def shared_parse(message: str) -> None:
+        parser._parse(normalize_request(message), today)
+
+    fan_out = {
+        "each agent extracts": _time_per_call(per_agent, SAMPLE_MESSAGES, iterations),
+        "one shared parse": _time_per_call(shared_parse, SAMPLE_MESSAGES, iterations),
+        "memoized parse": _time_per_call(parser.parse, SAMPLE_MESSAGES, iterations),
+    }
+    _report("Flights + hotels + packages fan-out (per message)", fan_out, "each agent extracts")
+    return dict(results, **registry, **fan_out)
+
+
+def _synthetic_names(count: int, seed: int = 7) -> List[str]:
+    """Generate pronounceable place-like names to pad the fuzzy index vocabulary."""
+    import random
+
+    rng = random.Random(seed)
+    consonants, vowels = "bcdfghjklmnprstvwyz", "aeiou"
+    names = set()
+    while len(names) < count:
+        syllables = rng.randint(2, 4)
+        name = "".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(syllables))
+        if rng.random() < 0.2:
+            name += " " + "".join(rng.choice(consonants) + rng.choice(vowels) for _ in range(2))
+        names.add(name)
+    return sorted(names)
+
+
+def _typo(name: str, rng) -> str:
+    """Apply one random typing mistake to a name."""
+    position = rng.randrange(len(name) - 1)
+    kind = rng.choice(("swap", "drop", "double", "replace"))
+    if kind == "swap":
+        return name[:position] + name[position + 1] + name[position] + name[position + 2:]
+    if kind == "drop":
+        return name[:position] + name[position + 1:]
+    if kind == "double":
+        return name[:position] + name[position] + name[position:]
+    return name[:position] + rng.choice("abcdefghijklmnopqrstuvwxyz") + name[position + 1:]
+
+
+def bench_fuzzy(iterations: int) -> Dict[str, float]:
+    """
+    Compare typo-tolerant place lookups through the trigram index with a
+    linear scan over every name, on a vocabulary of tens of thousands.
+    """
+    import random
+    from agents.fuzzy_index import TrigramIndex
+    from agents.gazetteer import default_gazetteer, normalize_name
+
+    gazetteer = default_gazetteer()
+    real_names = sorted({normalize_name(name) for place in gazetteer for name in place.names()
+                         if len(name) >= 5 and name.isascii()})
+    vocabulary = real_names + _synthetic_names(30000)
+    start = time.perf_counter()
+    index = TrigramIndex(vocabulary)
+    build_time = time.perf_counter() - start
+
+    rng = random.Random(11)
+    queries = [_typo(rng.choice(real_names), rng) for _ in range(200)]
+    for query in queries:
+        fast, slow = index.best(query), index.linear_best(query)
+        if (fast and fast.distance) != (slow and slow.distance):
+            raise AssertionError(f"Index and linear scan disagree on {query!r}: {fast} vs {slow}")
+
+    # The linear scan is thousands of times slower; a few passes are enough
+    results = {
+        "linear scan": _time_per_call(index.linear_best, queries[:20], max(1, iterations // 250)),
+        "trigram index": _time_per_call(index.best, queries, max(1, iterations // 10)),
+    }
+    print(f"Fuzzy place lookup ({len(index)} names, index built in {build_time * 1000:.0f} ms)")
+    for name, seconds in results.items():
+        print(f"  {name:<28} {seconds * 1e6:10.1f} us/lookup  {1 / seconds:10.0f} lookups/s  "
+              f"({results['linear scan'] / seconds:7.1f}x)")
+    return results
+
+
+_DATE_TEMPLATES = [
+    "flight from Riyadh to Dubai on {day} {month}",
+    "hotel in Jeddah from {month} {day} to {month} {day2} for 2 guests",
+    "DMM-JED {day}/{month_number}/{year} returning {day2}/{month_number}/{year}",
+    "round trip to London {relative} returning in {count} weeks",
+    "hotel in Cairo {day}-{day2} {month} under $300",
+    "umrah package for {count} nights from {day} Ramadan",
+    "رحلة إلى دبي {day} {arabic_month} لمدة {count} ليال",
+    "stay in Paris {relative}",
+    "trip to Istanbul in {count} days",
+    "What are things to do in Rome?",
+]
+_DATE_FORMATS = ("%d %B", "%B %d", "%d %b", "%b %d", "%d/%m/%Y", "%Y-%m-%d")
+
+
+def _date_corpus(count: int, seed: int = 5) -> List[str]:
+    """Generate chat messages with a mix of date expressions."""
+    import calendar
+    import random
+
+    rng = random.Random(seed)
+    arabic_months = ["يناير", "فبراير", "مارس", "أبريل", "مايو", "يونيو", "يوليو", "أغسطس", "سبتمبر", "أكتوبر",
+                     "نوفمبر", "ديسمبر"]
+    relatives = ["tomorrow", "tonight", "next week", "this weekend", "next friday", "next month"]
+    messages = []
+    for _ in range(count):
+        month = rng.randint(1, 12)
+        day = rng.randint(1, 20)
+        messages.append(rng.choice(_DATE_TEMPLATES).format(
+            day=day, day2=day + rng.randint(1, 8), month=calendar.month_name[month], month_number=month,
+            year=rng.choice((2026, 2027)), arabic_month=arabic_months[month - 1],
+            relative=rng.choice(relatives), count=rng.randint(2, 5)))
+    return messages
+
+
+def _strptime_dates(message: str) -> list:
+    """Baseline: try every date format on every run of one to three words."""
+    from datetime import datetime
+
+    words = message.split()
+    found = []
+    for start in range(len(words)):
+        for end in range(start + 1, min(start + 3, len(words)) + 1):
+            for date_format in _DATE_FORMATS:
+                try:
+                    found.append(datetime.strptime(" ".join(words[start:end]), date_format))
+                except ValueError:
+                    pass
+    return found
+
+
+def bench_dates(iterations: int) -> Dict[str, float]:
+    """
+    Time the date-expression parser over a 10,000-message corpus, against
+    trying strptime formats on every run of words (which only finds
+    absolute English dates).
+    """
+    from datetime import date
+    from agents.date_parser import parse_dates
+
+    corpus = _date_corpus(10000)
+    today = date(2026, 1, 1)
+    passes = max(1, iterations // 100)
+    results = {
+        "strptime per word run": _time_per_call(_strptime_dates, corpus[:1000], 1),
+        "parse_dates": _time_per_call(lambda message: parse_dates(message, today), corpus, passes),
+    }
+    print(f"Date expressions ({len(corpus)} messages)")
+    for name, seconds in results.items():
+        print(f"  {name:<28} {seconds * 1e6:10.1f} us/message  {seconds * len(corpus):7.3f} s/corpus  "
+              f"({results['strptime per word run'] / seconds:5.1f}x)")
+    return results
+
+
+def _loop_flights(count: int) -> list:
+    """Baseline: build flight offers one at a time with the random module."""
+    import random
+
+    airlines = ['Saudi Arabian Airlines', 'Emirates', 'Qatar Airways', 'Turkish Airlines', 'Etihad Airways']
+    offers = []
+    for _ in range(count):
+        offers.append({
+            "price": int(200 * random.uniform(0.8, 1.2)),
+            "duration": f"{random.randint(1, 8)}h {random.randint(0, 59)}m",
+            "departure": f"2026-05-01 {random.randint(6, 22):02d}:{random.choice([0, 15, 30, 45]):02d}",
+            "airline": random.choice(airlines),
+        })
+    offers.sort(key=lambda offer: offer["price"])
+    return offers
+
+
+def bench_inventory(iterations: int) -> Dict[str, float]:
+    """
+    Offers generated per second by the seeded NumPy inventory, against
+    building them one at a time in a Python loop.
+    """
+    from agents.mock_inventory import MockInventory
+
+    inventory = MockInventory(seed=1)
+    size = 1_000_000
+    batches = {
+        "python loop (flights)": (lambda: _loop_flights(size // 10), size // 10),
+        "numpy flights": (lambda: inventory.flights("DMM", "JED", "2026-05-01", size), size),
+        "numpy flights, round trip": (lambda: inventory.flights("DMM", "JED", "2026-05-01", size,
+                                                                return_date="2026-05-08"), size),
+        "numpy hotels": (lambda: inventory.hotels("DXB", "2026-05-01", "2026-05-04", size,
+                                                  amenities=["Spa"]), size),
+        "numpy packages": (lambda: inventory.packages("JED", "IST", "2026-05-01", "2026-05-06", size,
+                                                      adults=2), size),
+    }
+    results = {}
+    for name, (generate, count) in batches.items():
+        passes = max(1, iterations // 500)
+        start = time.perf_counter()
+        for _ in range(passes):
+            generate()
+        results[name] = (time.perf_counter() - start) / (passes * count)
+
+    first = inventory.flights("RUH", "DXB", "2026-05-01", 1000)
+    second = MockInventory(seed=1).flights("RUH", "DXB", "2026-05-01", 1000)
+    if any((first[column] != second[column]).any() for column in first):
+        raise AssertionError("The same seed and search produced different offers")
+
+    print(f"Mock inventory (batches of {size:,} offers; the loop builds {size // 10:,})")
+    baseline = results["python loop (flights)"]
+    for name, seconds in results.items():
+        print(f"  {name:<28} {1 / seconds / 1e6:8.2f} M offers/s  ({baseline / seconds:6.1f}x)")
+    return results
+
+
+def bench_offers(iterations: int) -> Dict[str, float]:
+    """
+    Filter, sort and page one search's offers through the columnar offer
+    index, against filtering and sorting the list of offer dicts.
+    """
+    from agents.mock_inventory import MockInventory
+    from utils.offer_store import OfferIndex
+
+    size = 1000
+    offers = MockInventory(seed=1).flight_results(
+        {"departure_id": "DMM", "arrival_id": "JED", "outbound_date": "2026-05-01"}, count=size
+    )
+    filters = {"price_max": 600, "depart_after": 6 * 60, "depart_before": 20 * 60, "max_duration": 400}
+
+    def list_page(offset: int = 20, limit: int = 20) -> List[dict]:
+        matching = [offer for offer in offers
+                    if offer["price"] <= filters["price_max"]
+                    and "06:00" <= offer["departure"][11:] <= "20:00"
+                    and offer["duration_minutes"] <= filters["max_duration"]]
+        matching.sort(key=lambda offer: offer["duration_minutes"])
+        return matching[offset:offset + limit]
+
+    index = OfferIndex("flights", offers)
+    if [offer["id"] for offer in index.query(filters, "duration", 20, 20).offers] != \
+            [offer["id"] for offer in list_page()]:
+        raise AssertionError("The offer index returned a different page than the list")
+
+    passes = max(1, iterations)
+    cases = {
+        "list of dicts": list_page,
+        "offer index": lambda: index.query(filters, "duration", 20, 20),
+        "offer index, build + query": lambda: OfferIndex("flights", offers).query(filters, "duration", 20, 20),
+    }
+    results = {}
+    for name, run in cases.items():
+        start = time.perf_counter()
+        for _ in range(passes):
+            run()
+        results[name] = (time.perf_counter() - start) / passes
+
+    print(f"Offer filter/sort/page ({size:,} flight offers, page of 20)")
+    baseline = results["list of dicts"]
+    for name, seconds in results.items():
+        print(f"  {name:<28} {seconds * 1e6:10.1f} us/query    ({baseline / seconds:5.2f}x)")
+    return results
+
+
+def bench_responses(iterations: int) -> Dict[str, float]:
+    """
+    Bytes on the wire and CPU per response for each JSON encoder and
+    content coding, over a chat answer, a package answer and a large raw
+    searchapi.io flight search passed through by /api/search/flights.
+    """
+    import json
+
+    from agents.mock_inventory import MockInventory
+    from utils.fake_searchapi import synthesize
+    from utils.http_encoding import JSON_ENCODERS, available_encodings, compress
+
+    inventory = MockInventory(seed=1)
+    hotels = inventory.hotel_results({"location": "DXB", "check_in": "2026-05-01", "check_out": "2026-05-04"},
+                                     count=20)
+    packages = inventory.package_results({"departure": "JED", "destination": "IST", "outbound_date": "2026-05-01",
+                                          "return_date": "2026-05-06", "adults": 2, "children": 0,
+                                          "max_price": None, "hotel_rating": 4}, "Istanbul", count=20)
+    raw_search = synthesize({"engine": "google_flights", "departure_id": "DMM", "arrival_id": "JED",
+                             "outbound_date": "2026-05-01"}, count=2000)
+    payloads = {
+        "chat, 20 hotels": {"response": "Here are my top recommendations:", "type": "hotels",
+                            "hotel_results": hotels, "flight_results": [], "package_results": []},
+        "chat, 20 packages": {"response": "Here are the packages:", "type": "packages",
+                              "package_results": packages, "flight_results": [], "hotel_results": []},
+        "raw flight search": raw_search,
+    }
+
+    # What jsonify did before: Flask's default provider sorts keys and escapes non-ASCII
+    encoders = dict({"flask default": lambda value: json.dumps(value, sort_keys=True).encode("utf-8")},
+                    **JSON_ENCODERS)
+    codings = [("gzip 1", "gzip", 1), ("gzip 5", "gzip", 5), ("gzip 9", "gzip", 9)]
+    if "br" in available_encodings():
+        codings += [("br 4", "br", 4), ("br 11", "br", 11)]
+
+    def cpu_per_call(func: Callable[[], object], passes: int) -> float:
+        start = time.process_time()
+        for _ in range(passes):
+            func()
+        return (time.process_time() - start) / passes
+
+    results = {}
+    for title, payload in payloads.items():
+        passes = max(1, iterations // (50 if title == "raw flight search" else 1))
+        print(f"Response encoding: {title}")
+        for name, encode in encoders.items():
+            seconds = cpu_per_call(lambda: encode(payload), passes)
+            results[f"{title}: {name}"] = seconds
+            print(f"  encode {name:<22} {len(encode(payload)):10,} bytes  {seconds * 1e6:10.1f} us CPU")
+        body = JSON_ENCODERS["orjson" if "orjson" in JSON_ENCODERS else "stdlib"](payload)
+        for name, coding, level in codings:
+            seconds = cpu_per_call(lambda: compress(body, coding, level), max(1, passes // 5))
+            results[f"{title}: {name}"] = seconds
+            print(f"  {name:<29} {len(compress(body, coding, level)):10,} bytes  {seconds * 1e6:10.1f} us CPU")
+    return results
+
+
+def bench_instrumentation(iterations: int) -> Dict[str, float]:
+    """
+    Per-call overhead of the agent method instrumentation on a method that
+    does nothing: the three stacked debug decorators with debugging off, the
+    fused wrapper from utils/apply_debugging.py with call logging off, and
+    after detaching, when the agent classes hold their original
+    functions again.
+    """
+    from utils import apply_debugging
+    from utils.debug import log_function_call, performance_timer, trace_exception
+
+    class Probe:
+        def can_handle(self, request):
+            return 0.0
+
+    original = Probe.__dict__["can_handle"]
+    variants = {
+        "original": original,
+        "stacked decorators": trace_exception()(log_function_call()(performance_timer(original))),
+        "fused wrapper, untimed": apply_debugging.instrument(original, logged=True, trace_errors=True),
+        "fused wrapper, timed": apply_debugging.instrument(original, timed=True, logged=True, trace_errors=True),
+    }
+    calls = iterations * 200
+    probe = Probe()
+
+    results = {}
+    for name, func in variants.items():
+        Probe.can_handle = func
+        can_handle = probe.can_handle
+        # Best of several runs: the differences are small next to scheduling noise
+        best = float("inf")
+        for _ in range(5):
+            start = time.perf_counter()
+            for _ in range(calls):
+                can_handle("hello")
+            best = min(best, time.perf_counter() - start)
+        results[name] = best / calls
+
+    classes = [cls for module_name in apply_debugging.AGENT_MODULES
+               for _, cls in apply_debugging.get_agent_classes(apply_debugging.import_module(module_name))]
+    before = {(cls, name): value for cls in classes for name, value in vars(cls).items()}
+    attached = apply_debugging.attach()["methods_decorated"]
+    apply_debugging.detach()
+    restored = sum(vars(cls).get(name) is value for (cls, name), value in before.items())
+
+    print("Agent method instrumentation (no-op method, debug logging off)")
+    base = results["original"]
+    for name, seconds in results.items():
+        print(f"  {name:<28} {seconds * 1e9:8.0f} ns/call  (+{(seconds - base) * 1e9:5.0f} ns)")
+    print(f"  detached: {restored}/{len(before)} agent class attributes are the original objects "
+          f"({attached} methods were instrumented)")
+    return results
+
+
+BENCHMARKS = {
+    "routing": bench_routing,
+    "history": bench_history,
+    "extraction": bench_extraction,
+    "fuzzy": bench_fuzzy,
+    "dates": bench_dates,
+    "inventory": bench_inventory,
+    "offers": bench_offers,
+    "responses": bench_responses,
+    "instrumentation": bench_instrumentation,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run Rahalah micro-benchmarks")
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark",
+                        help=f"Benchmarks to run: {', '.join(sorted(BENCHMARKS))} (default: all)")
+    parser.add_argument("--iterations", type=int, default=500,
+                        help="Passes over the message corpus per measurement")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    # Agent logging would dominate the measurements
+    logging.disable(logging.INFO)
+
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        BENCHMARKS[name](args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Build a gazetteer data file from the OurAirports database.
+
+The agents ship with a curated list of places (agents/data/places.tsv). This
+script extends it with every airport that has scheduled passenger service in
+OurAirports' airports.csv (https://ourairports.com/data/), keeping the
+curated rows first so their aliases, Arabic names and flags win:
+
+    python utils/build_gazetteer.py airports.csv -o places-full.tsv
+    RAHALAH_GAZETTEER=places-full.tsv python server.py
+
+Flags for the generated rows are derived from built-in word lists; pass
+``--words /usr/share/dict/words`` to flag every IATA code and city name that
+is also an ordinary English word.
+"""
+
+import argparse
+import csv
+import os
+import sys
+from typing import Iterable, Iterator, List, Optional, Set
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.gazetteer import COMMON, DEFAULT_PATH, WORD_CODE  # noqa: E402
+
+AIRPORT_TYPES = ('large_airport', 'medium_airport')
+
+HEADER = """# iata\ticao\tcity\tcountry\tairport\taliases\tflags
+# Generated by utils/build_gazetteer.py from {curated} and OurAirports.
+# See agents/data/places.tsv for the meaning of each column and flag.
+"""
+
+# Three-letter English words that are also IATA codes and would otherwise
+# turn ordinary sentences into airport searches
+WORD_CODES = {
+    'act', 'add', 'age', 'ago', 'aid', 'aim', 'air', 'all', 'and', 'any', 'are', 'art', 'ask', 'bad', 'bag',
+    'bar', 'bay', 'bed', 'big', 'bit', 'box', 'boy', 'bus', 'but', 'buy', 'can', 'car', 'cat', 'cut', 'day',
+    'did', 'die', 'dog', 'due', 'eat', 'end', 'eye', 'far', 'few', 'fit', 'fly', 'for', 'fun', 'get', 'got',
+    'gun', 'guy', 'has', 'hat', 'her', 'hey', 'him', 'his', 'hit', 'hot', 'how', 'ice', 'its', 'job', 'key',
+    'kid', 'lay', 'led', 'leg', 'let', 'lie', 'lot', 'low', 'mad', 'man', 'map', 'may', 'men', 'mix', 'new',
+    'nor', 'not', 'now', 'odd', 'off', 'oil', 'old', 'one', 'our', 'out', 'own', 'pay', 'per', 'pet', 'put',
+    'ran', 'raw', 'red', 'run', 'sad', 'saw', 'say', 'sea', 'see', 'set', 'she', 'sir', 'sit', 'six', 'sky',
+    'son', 'sun', 'tax', 'tea', 'ten', 'the', 'tie', 'tip', 'too', 'top', 'toy', 'try', 'two', 'use', 'van',
+    'via', 'war', 'was', 'way', 'web', 'who', 'why', 'win', 'won', 'yes', 'yet', 'you'
+}
+
+# City names that are also ordinary words
+COMMON_CITY_NAMES = {
+    'bath', 'bend', 'borders', 'eagle', 'gold coast', 'hail', 'hope', 'male', 'mobile', 'nice', 'orange',
+    'reading', 'split', 'sale', 'page', 'phoenix', 'victoria', 'paradise', 'independence', 'liberal'
+}
+
+
+def read_curated(path: str) -> List[List[str]]:
+    """Read the curated rows, skipping comments."""
+    rows = []
+    with open(path, encoding='utf-8') as data_file:
+        for line in data_file:
+            if line.startswith('#') or not line.strip():
+                continue
+            fields = line.rstrip('\r\n').split('\t')
+            rows.append(fields + [''] * (7 - len(fields)))
+    return rows
+
+
+def _clean(value: str) -> str:
+    """Drop characters that would break the tab-separated format."""
+    return ' '.join(value.replace('\t', ' ').split())
+
+
+def read_ourairports(path: str, words: Set[str]) -> Iterator[List[str]]:
+    """
+    Yield gazetteer rows for airports with scheduled service.
+
+    Args:
+        path: OurAirports airports.csv
+        words: Lowercase English words used to flag codes and city names
+
+    Yields:
+        Rows in the gazetteer column order
+    """
+    with open(path, encoding='utf-8', newline='') as csv_file:
+        for record in csv.DictReader(csv_file):
+            iata = record.get('iata_code', '').strip().upper()
+            city = _clean(record.get('municipality', ''))
+            if (record.get('type') not in AIRPORT_TYPES or record.get('scheduled_service') != 'yes'
+                    or len(iata) != 3 or not city):
+                continue
+            icao = record.get('gps_code', '').strip().upper()
+            aliases = []
+            for keyword in record.get('keywords', '').split(','):
+                keyword = _clean(keyword)
+                if keyword and keyword.upper() not in (iata, icao) and keyword != city and keyword not in aliases:
+                    aliases.append(keyword)
+            flags = []
+            if city.lower() in COMMON_CITY_NAMES or city.lower() in words:
+                flags.append(COMMON)
+            if iata.lower() in WORD_CODES or iata.lower() in words:
+                flags.append(WORD_CODE)
+            yield [iata, icao, city, record.get('iso_country', ''), _clean(record.get('name', '')),
+                   ','.join(alias.replace(',', ' ') for alias in aliases), ','.join(flags)]
+
+
+def load_words(path: Optional[str]) -> Set[str]:
+    """Load a word list (one word per line), or an empty set."""
+    if not path:
+        return set()
+    with open(path, encoding='utf-8', errors='ignore') as words_file:
+        # Proper nouns in system dictionaries are capitalized; only keep ordinary words
+        return {line.strip() for line in words_file if line.strip() and line[0].islower()}
+
+
+def merge(curated: List[List[str]], generated: Iterable[List[str]]) -> List[List[str]]:
+    """Append generated rows whose IATA code is not already curated."""
+    seen = {row[0] for row in curated if row[0]}
+    rows = list(curated)
+    for row in generated:
+        if row[0] not in seen:
+            seen.add(row[0])
+            rows.append(row)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build a gazetteer data file from OurAirports")
+    parser.add_argument('airports_csv', help="OurAirports airports.csv")
+    parser.add_argument('-o', '--output', required=True, help="Where to write the data file")
+    parser.add_argument('--curated', default=DEFAULT_PATH, help="Curated rows placed first")
+    parser.add_argument('--words', help="Word list used to flag codes and city names that are English words")
+    args = parser.parse_args()
+
+    curated = read_curated(args.curated)
+    rows = merge(curated, read_ourairports(args.airports_csv, load_words(args.words)))
+    with open(args.output, 'w', encoding='utf-8') as output:
+        output.write(HEADER.format(curated=os.path.basename(args.curated)))
+        for row in rows:
+            output.write('\t'.join(row) + '\n')
+    print(f"Wrote {len(rows)} places ({len(curated)} curated) to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,6 @@ including configurable logging, performance monitoring, and request tracing.
 import logging
 import time
 import functools
-import json
 import os
 import sys
 import traceback
@@ -16,6 +15,12 @@ import inspect
 from typing import Any, Callable, Dict, List, Optional, Union, TypeVar, cast
 from datetime import datetime
 
+from utils.log_pipeline import BatchedRotatingFileHandler, LazyCall, LazyJSON, LazyRepr, install as install_log_pipeline
+from utils.metrics import metrics
+from utils.profiler import SamplingProfiler
+from utils.replay import request_recorder, session_from_cookies
+from utils.tracing import annotate, stamp_trace_id, tracer
+
 # Create debug logs directory if it doesn't exist
 DEBUG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'debug_logs')
 os.makedirs(DEBUG_DIR, exist_ok=True)
@@ -23,6 +28,9 @@ os.makedirs(DEBUG_DIR, exist_ok=True)
 # Configure default logger
 logger = logging.getLogger('rahalah.debug')
 logger.setLevel(logging.DEBUG)
+# The handlers below are the only output; root handlers would write every
+# record again, synchronously
+logger.propagate = False
 
 # Configure console handler
 console_handler = logging.StreamHandler()
@@ -34,20 +42,56 @@ console_format = logging.Formatter(
 console_handler.setFormatter(console_format)
 logger.addHandler(console_handler)
 
-# Configure file handler for detailed logs
+# Configure file handler for detailed logs, rotated by size
+# (RAHALAH_LOG_MAX_BYTES, default 10 MB)
 log_file = os.path.join(DEBUG_DIR, f'rahalah_debug_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
-file_handler = logging.FileHandler(log_file)
+file_handler = BatchedRotatingFileHandler(
+    log_file,
+    max_bytes=int(os.environ.get('RAHALAH_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+    backup_count=int(os.environ.get('RAHALAH_LOG_BACKUPS', 5)),
+    on_rollover=lambda: rotate_log_files()
+)
 file_handler.setLevel(logging.DEBUG)
 file_format = logging.Formatter(
-    '%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s',
+    '%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] [trace %(trace_id)s] - %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 file_handler.setFormatter(file_format)
 logger.addHandler(file_handler)
 
+# Honour the log_to_console and log_to_file switches at write time
+console_handler.addFilter(lambda record: DebugConfig.log_to_console)
+file_handler.addFilter(lambda record: DebugConfig.log_to_file)
+
+# Request threads only enqueue records; a background thread formats and
+# writes them in batches (RAHALAH_LOG_QUEUE_SIZE records are buffered before
+# new ones are dropped)
+log_writer = install_log_pipeline(logger, maxsize=int(os.environ.get('RAHALAH_LOG_QUEUE_SIZE', 10000)))
+
+# Tag each record with the trace id of the request that logged it
+log_writer.source.addFilter(stamp_trace_id)
+
+def will_log(level: int) -> bool:
+    """
+    Whether a record at ``level`` would be written by any enabled handler.
+    
+    The logger itself passes DEBUG whenever debug mode is on, so checking it
+    alone would build request and response dumps that every handler then
+    discards.
+    """
+    if not logger.isEnabledFor(level):
+        return False
+    return ((DebugConfig.log_to_file and level >= file_handler.level) or
+            (DebugConfig.log_to_console and level >= console_handler.level))
+
 # Type variable for function return types
 F = TypeVar('F', bound=Callable[..., Any])
 
+# Durations measured by performance_timer, exposed at /metrics
+function_duration = metrics.histogram('rahalah_function_duration_seconds',
+                                      'Execution time of functions decorated with performance_timer',
+                                      ('function',))
+
 class DebugConfig:
     """Configuration for the debug system."""
     
@@ -63,6 +107,13 @@ class DebugConfig:
     max_log_files: int = 10
     enable_request_capture: bool = True
     enable_response_capture: bool = True
+    profiling_enabled: bool = False
+    profile_sample_rate: float = 100.0
+    profile_window: int = 300
+    trace_sample_rate: float = tracer.sample_rate
+    instrument_agents: bool = False
+    record_requests: bool = request_recorder.enabled
+    record_min_duration: float = request_recorder.min_duration
     
     @classmethod
     def configure(cls, **kwargs: Any) -> None:
@@ -73,6 +124,16 @@ class DebugConfig:
                 logger.info(f"Debug config: {key} set to {value}")
             else:
                 logger.warning(f"Unknown debug config option: {key}")
+        if any(key.startswith('profil') for key in kwargs):
+            apply_profiling()
+        if 'trace_sample_rate' in kwargs:
+            tracer.sample_rate = float(cls.trace_sample_rate)
+        if 'record_requests' in kwargs:
+            request_recorder.enabled = bool(cls.record_requests)
+        if 'record_min_duration' in kwargs:
+            request_recorder.min_duration = float(cls.record_min_duration)
+        if {'enabled', 'performance_monitoring', 'instrument_agents'}.intersection(kwargs):
+            sync_agent_instrumentation()
 
     @classmethod
     def set_log_level(cls, level: Union[int, str]) -> None:
@@ -103,6 +164,8 @@ def performance_timer(func: F) -> F:
     Returns:
         The wrapped function
     """
+    duration = function_duration.labels(f"{func.__module__}.{func.__qualname__}")
+    
     @functools.wraps(func)
     def wrapper(*args: Any, **kwargs: Any) -> Any:
         if not DebugConfig.enabled or not DebugConfig.performance_monitoring:
@@ -113,8 +176,9 @@ def performance_timer(func: F) -> F:
         end_time = time.time()
         
         execution_time = end_time - start_time
-        logger.debug(f"Performance: {func.__module__}.{func.__qualname__} "
-                    f"executed in {execution_time:.4f} seconds")
+        duration.observe(execution_time)
+        logger.debug("Performance: %s.%s executed in %.4f seconds",
+                     func.__module__, func.__qualname__, execution_time)
         
         # For very slow operations, log at a higher level
         if execution_time > 1.0:
@@ -138,9 +202,9 @@ def log_function_call(level: int = logging.DEBUG) -> Callable[[F], F]:
     def decorator(func: F) -> F:
         @functools.wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
-            if not DebugConfig.enabled:
+            if not DebugConfig.enabled or not will_log(level):
                 return func(*args, **kwargs)
-                
+            
             func_name = f"{func.__module__}.{func.__qualname__}"
             
             # Get calling frame info
@@ -150,22 +214,14 @@ def log_function_call(level: int = logging.DEBUG) -> Callable[[F], F]:
             else:
                 caller = "unknown"
             
-            # Log call
-            arg_str = ', '.join([repr(a) for a in args])
-            kwarg_str = ', '.join([f"{k}={repr(v)}" for k, v in kwargs.items()])
-            all_args = ', '.join(filter(None, [arg_str, kwarg_str]))
-            
-            logger.log(level, f"CALL {func_name}({all_args}) from {caller}")
+            # Log call; arguments are only repr()'d when the record is written
+            logger.log(level, "CALL %s(%s) from %s", func_name, LazyCall(args, kwargs), caller)
             
             try:
                 result = func(*args, **kwargs)
                 
-                # Log result (truncate if too large)
-                result_repr = repr(result)
-                if len(result_repr) > 1000:
-                    result_repr = result_repr[:1000] + "..."
-                    
-                logger.log(level, f"RETURN from {func_name}: {result_repr}")
+                # Log result (truncated if too large)
+                logger.log(level, "RETURN from %s: %s", func_name, LazyRepr(result, limit=1000))
                 return result
             except Exception as e:
                 logger.error(f"EXCEPTION in {func_name}: {str(e)}")
@@ -188,7 +244,9 @@ def capture_request(func: F) -> F:
     """
     @functools.wraps(func)
     def wrapper(*args: Any, **kwargs: Any) -> Any:
-        if not DebugConfig.enabled or not DebugConfig.enable_request_capture:
+        if not DebugConfig.enabled or not DebugConfig.enable_request_capture or not will_log(logging.DEBUG):
+            if request_recorder.enabled:
+                return record_request(func, *args, **kwargs)
             return func(*args, **kwargs)
             
         # Try to capture the request object
@@ -241,13 +299,40 @@ def capture_request(func: F) -> F:
         
         # Log the request
         if request_data:
-            logger.debug(f"API Request: {json.dumps(request_data, default=str)}")
+            logger.debug("API Request: %s", LazyJSON(request_data))
         
         # Execute the original function
+        if request_recorder.enabled:
+            return record_request(func, *args, **kwargs)
         return func(*args, **kwargs)
     
     return cast(F, wrapper)
 
+def record_request(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run a Flask view and append its request to the replay capture (utils/replay.py).
+    
+    Returns:
+        The view's response, as a Response object
+    """
+    from flask import make_response, request as flask_request
+    
+    started = time.time()
+    start_time = time.perf_counter()
+    body = flask_request.get_data()
+    
+    response = make_response(func(*args, **kwargs))
+    
+    try:
+        request_recorder.record(
+            flask_request.method, flask_request.path, flask_request.query_string.decode('latin-1'),
+            flask_request.headers, body, response.status_code, started, time.perf_counter() - start_time,
+            session_from_cookies(response.headers.getlist('Set-Cookie'))
+        )
+    except Exception as e:
+        logger.warning(f"Error recording request: {str(e)}")
+    return response
+
 def capture_response(func: F) -> F:
     """
     Decorator to capture and log API responses.
@@ -260,7 +345,7 @@ def capture_response(func: F) -> F:
     """
     @functools.wraps(func)
     def wrapper(*args: Any, **kwargs: Any) -> Any:
-        if not DebugConfig.enabled or not DebugConfig.enable_response_capture:
+        if not DebugConfig.enabled or not DebugConfig.enable_response_capture or not will_log(logging.DEBUG):
             return func(*args, **kwargs)
             
         # Execute the original function
@@ -283,7 +368,7 @@ def capture_response(func: F) -> F:
                     result_copy['token'] = '[REDACTED]'
                 response_data['body'] = result_copy
             
-            logger.debug(f"API Response: {json.dumps(response_data, default=str)}")
+            logger.debug("API Response: %s", LazyJSON(response_data))
         except Exception as e:
             logger.warning(f"Error logging response: {str(e)}")
             
@@ -291,6 +376,32 @@ def capture_response(func: F) -> F:
     
     return cast(F, wrapper)
 
+def trace_request(func: F) -> F:
+    """
+    Decorator to run a Flask view as a trace.
+    
+    Every call gets a trace id, returned in the X-Trace-Id header; sampled
+    calls record spans for the work done beneath it (see utils/tracing.py).
+    
+    Args:
+        func: The view function to trace
+        
+    Returns:
+        Wrapped function
+    """
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        from flask import make_response, request as flask_request
+        
+        name = f"{flask_request.method} {flask_request.path}"
+        with tracer.start_trace(name, flask_request.headers.get('traceparent')) as trace:
+            response = make_response(func(*args, **kwargs))
+            trace.set(status=response.status_code)
+        response.headers['X-Trace-Id'] = trace.trace_id
+        return response
+    
+    return cast(F, wrapper)
+
 def trace_exception(exception_type: Any = Exception, handler: Optional[Callable[[Exception], None]] = None) -> Callable[[F], F]:
     """
     Decorator to trace exceptions and optionally handle them.
@@ -328,6 +439,8 @@ def log_agent_selection(agent_scores: Dict[str, float], selected_agent: str) ->
         agent_scores: Dictionary of agent IDs to confidence scores
         selected_agent: ID of the selected agent
     """
+    annotate(selected_agent=selected_agent)
+    
     if not DebugConfig.enabled or not DebugConfig.log_agent_selection:
         return
         
@@ -367,6 +480,47 @@ def configure_from_env() -> None:
     log_level_env = os.environ.get('RAHALAH_LOG_LEVEL')
     if log_level_env:
         DebugConfig.set_log_level(log_level_env)
+    
+    # Agent method instrumentation (utils/apply_debugging.py)
+    if os.environ.get('RAHALAH_INSTRUMENT_AGENTS', 'false').lower() in ('true', '1', 'yes'):
+        DebugConfig.configure(instrument_agents=True)
+    
+    # Sampling profiler, e.g. RAHALAH_PROFILE=true RAHALAH_PROFILE_RATE=200
+    if os.environ.get('RAHALAH_PROFILE', 'false').lower() in ('true', '1', 'yes'):
+        DebugConfig.configure(
+            profiling_enabled=True,
+            profile_sample_rate=float(os.environ.get('RAHALAH_PROFILE_RATE', DebugConfig.profile_sample_rate)),
+            profile_window=int(os.environ.get('RAHALAH_PROFILE_WINDOW', DebugConfig.profile_window))
+        )
+
+# Created on first use so that no sampler thread exists unless profiling is turned on
+profiler: Optional[SamplingProfiler] = None
+
+def apply_profiling() -> Optional[SamplingProfiler]:
+    """
+    Start, stop or retune the sampling profiler to match DebugConfig.
+    
+    Returns:
+        The profiler, or None if profiling has never been enabled
+    """
+    global profiler
+    if DebugConfig.profiling_enabled:
+        if profiler is None:
+            profiler = SamplingProfiler(rate=DebugConfig.profile_sample_rate, window=DebugConfig.profile_window)
+        else:
+            profiler.reconfigure(rate=DebugConfig.profile_sample_rate, window=DebugConfig.profile_window)
+        profiler.start()
+    elif profiler is not None:
+        profiler.stop()
+    return profiler
+
+def sync_agent_instrumentation() -> None:
+    """Attach or detach the agent method instrumentation in utils/apply_debugging.py to match DebugConfig."""
+    # Nothing to detach if it was never loaded
+    if not DebugConfig.instrument_agents and 'utils.apply_debugging' not in sys.modules:
+        return
+    from utils.apply_debugging import sync_with_config
+    sync_with_config()
 
 def rotate_log_files() -> None:
     """Rotate log files to keep only the most recent ones."""
@@ -0,0 +1,396 @@
+"""
+Local stand-in for searchapi.io that replays recorded responses.
+
+Serves ``GET /api/v1/search`` over keep-alive HTTP/1.1 on asyncio, so the
+servers, the inventory providers and the load test can run with no network
+and no API key. Point ``SEARCHAPI_BASE_URL`` at it::
+
+    python utils/fake_searchapi.py --port 8099 --latency 0.2 --jitter 0.05 \\
+        --tail-fraction 0.01 --tail-latency 2.0
+    SEARCHAPI_BASE_URL=http://127.0.0.1:8099 python server.py
+
+Each query is answered from the recordings directory, best match first:
+
+1. a recording whose ``search_parameters`` equal the query (``api_key``
+   ignored);
+2. a recording for the same engine and route (``departure_id`` and
+   ``arrival_id``, or ``q``), whatever the dates;
+3. a response synthesized from the seeded mock inventory, so unseen
+   routes still get plausible, deterministic offers;
+4. any recording for the engine (the only fallback with
+   ``--no-synthesize``).
+
+Recordings are searchapi.io JSON responses saved one per file (``*.json``).
+``--record URL`` proxies misses to a real endpoint and saves what comes
+back, which is how new recordings are made.
+
+Every response waits for a delay drawn from a seeded latency model: a base
+delay plus uniform jitter, with a configurable fraction of requests taking
+a much longer tail delay and a fraction failing with a 500, so throughput
+and tail-latency measurements are reproducible offline.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import random
+import sys
+import urllib.request
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+logger = logging.getLogger('rahalah.fake_searchapi')
+
+DEFAULT_RECORDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recordings', 'searchapi')
+
+SEARCH_PATH = '/api/v1/search'
+
+# Query parameters that never decide which response is returned
+IGNORED_PARAMS = frozenset({'api_key'})
+
+# Offers synthesized per query when no recording matches
+SYNTHETIC_OFFERS = 10
+
+
+def _query_key(query: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    """Normalize a query for exact matching."""
+    return tuple(sorted((str(key), str(value)) for key, value in query.items()
+                        if key not in IGNORED_PARAMS and value not in (None, '')))
+
+
+def _route_key(query: Dict[str, Any]) -> Tuple[str, str, str]:
+    """Engine plus route (flights) or search text (hotels), ignoring dates."""
+    engine = str(query.get('engine', ''))
+    if query.get('q'):
+        return engine, str(query['q']).strip().lower(), ''
+    return engine, str(query.get('departure_id', '')).upper(), str(query.get('arrival_id', '')).upper()
+
+
+class LatencyModel:
+    """Seeded per-request delays and injected failures."""
+
+    def __init__(self,
+                 base: float = 0.0,
+                 jitter: float = 0.0,
+                 tail_fraction: float = 0.0,
+                 tail_latency: float = 0.0,
+                 error_rate: float = 0.0,
+                 seed: int = 0) -> None:
+        """
+        Args:
+            base: Seconds every response waits
+            jitter: Up to this many extra seconds, uniformly distributed
+            tail_fraction: Share of requests that wait ``tail_latency`` instead
+            tail_latency: Seconds a tail request waits
+            error_rate: Share of requests answered with a 500
+            seed: Seed, so a run can be repeated exactly
+        """
+        self.base = base
+        self.jitter = jitter
+        self.tail_fraction = tail_fraction
+        self.tail_latency = tail_latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+
+    def sample(self) -> Tuple[float, bool]:
+        """Return the delay for the next request and whether it fails."""
+        draw = self._random.random()
+        if draw < self.tail_fraction:
+            delay = self.tail_latency
+        else:
+            delay = self.base + self.jitter * self._random.random()
+        return delay, self._random.random() < self.error_rate
+
+    def describe(self) -> str:
+        text = f"{self.base * 1000:.0f} ms"
+        if self.jitter:
+            text += f" + up to {self.jitter * 1000:.0f} ms jitter"
+        if self.tail_fraction:
+            text += f", {self.tail_fraction:.1%} at {self.tail_latency * 1000:.0f} ms"
+        if self.error_rate:
+            text += f", {self.error_rate:.1%} errors"
+        return text
+
+
+class RecordingStore:
+    """Recorded searchapi.io responses indexed for replay."""
+
+    def __init__(self, directory: Optional[str] = DEFAULT_RECORDINGS_DIR) -> None:
+        self.directory = directory
+        self._exact: Dict[Tuple[Tuple[str, str], ...], bytes] = {}
+        self._route: Dict[Tuple[str, str, str], bytes] = {}
+        self._engine: Dict[str, bytes] = {}
+        if directory and os.path.isdir(directory):
+            for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+                with open(path, 'rb') as handle:
+                    self.add(json.loads(handle.read()))
+
+    def add(self, response: Dict[str, Any]) -> None:
+        """Index one response by the ``search_parameters`` it carries."""
+        query = response.get('search_parameters') or {}
+        body = json.dumps(response).encode('utf-8')
+        self._exact[_query_key(query)] = body
+        self._route.setdefault(_route_key(query), body)
+        self._engine.setdefault(str(query.get('engine', '')), body)
+
+    def match(self, query: Dict[str, Any], any_route: bool = True) -> Optional[bytes]:
+        """
+        Return the best recorded body for a query, or None.
+
+        Args:
+            query: The search query
+            any_route: Fall back to any recording for the query's engine
+        """
+        body = self._exact.get(_query_key(query)) or self._route.get(_route_key(query))
+        if body is None and any_route:
+            body = self._engine.get(str(query.get('engine', '')))
+        return body
+
+    def save(self, query: Dict[str, Any], body: bytes) -> str:
+        """Write a response fetched in record mode and index it."""
+        response = json.loads(body)
+        response.setdefault('search_parameters', {key: value for key, value in query.items()
+                                                  if key not in IGNORED_PARAMS})
+        name = '-'.join(part for part in _route_key(query) if part).replace(' ', '_').replace('/', '_')
+        path = os.path.join(self.directory, f"{name}-{len(self._exact)}.json")
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as handle:
+            json.dump(response, handle, ensure_ascii=False, indent=1)
+        self.add(response)
+        return path
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+
+def synthesize(query: Dict[str, Any], count: int = SYNTHETIC_OFFERS) -> Optional[Dict[str, Any]]:
+    """
+    Build a searchapi.io-shaped response from the mock inventory.
+
+    Args:
+        query: The search query
+        count: Offers to sample before the query's price filter
+
+    Returns:
+        The response, or None for engines the mock inventory cannot answer
+    """
+    from agents.gazetteer import default_gazetteer
+    from agents.mock_inventory import default_inventory
+
+    inventory = default_inventory()
+    engine = query.get('engine')
+    metadata = {'id': f"fake-{zlib.crc32(repr(_query_key(query)).encode('utf-8')):08x}", 'status': 'Success'}
+    parameters = {key: value for key, value in query.items() if key not in IGNORED_PARAMS}
+
+    if engine == 'google_flights':
+        offers = inventory.flight_results({
+            'departure_id': query.get('departure_id'),
+            'arrival_id': query.get('arrival_id'),
+            'outbound_date': query.get('outbound_date'),
+            'return_date': query.get('return_date'),
+            'max_price': int(query.get('max_price') or 0) or None
+        }, count=count)
+
+        def airport(code: str, when: str) -> Dict[str, str]:
+            day, _, clock = when.partition(' ')
+            return {'id': code, 'date': day, 'time': clock}
+
+        flights = [{
+            'flights': [{
+                'departure_airport': airport(offer['from'], offer['departure']),
+                'arrival_airport': airport(offer['to'], offer['arrival']),
+                'airline': offer['airline'],
+                'duration': offer['duration_minutes']
+            }],
+            'total_duration': offer['duration_minutes'],
+            'price': offer['price'],
+            'booking_token': offer['id']
+        } for offer in offers]
+        return {'search_metadata': metadata, 'search_parameters': parameters,
+                'best_flights': flights[:3], 'other_flights': flights[3:]}
+
+    if engine == 'google_hotels':
+        text = str(query.get('q') or '')
+        place = text.lower().split(' in ', 1)[-1]
+        match = default_gazetteer().resolve(place)
+        location = match.place.code if match is not None and match.place.code else place.upper()
+        offers = inventory.hotel_results({
+            'location': location,
+            'check_in': query.get('check_in'),
+            'check_out': query.get('check_out'),
+            'max_price': int(query.get('max_price') or 0) or None,
+            'amenities': [name for name in str(query.get('amenities') or '').split(',') if name]
+        }, count=count)
+        hotels = [{
+            'hotel_id': offer['id'],
+            'name': offer['name'],
+            'address': offer['location'],
+            'rating': offer['rating'],
+            'reviews': offer['reviews'],
+            'price': f"${offer['price_per_night']}",
+            'total_price': offer['total_price'],
+            'amenities': offer['amenities'],
+            'stars': offer['stars'],
+            'thumbnail': offer['image'],
+            'link': offer['bookingUrl']
+        } for offer in offers]
+        return {'search_metadata': metadata, 'search_parameters': parameters,
+                'search_information': {'total_results': len(hotels)}, 'hotel_results': hotels}
+
+    return None
+
+
+class FakeSearchApi:
+    """Answers searchapi.io queries from recordings, a record target or the mock inventory."""
+
+    def __init__(self,
+                 recordings: Optional[RecordingStore] = None,
+                 latency: Optional[LatencyModel] = None,
+                 record_url: Optional[str] = None,
+                 synthesize_missing: bool = True) -> None:
+        """
+        Args:
+            recordings: Responses to replay (the shipped samples by default)
+            latency: Delay and failure model (no delay by default)
+            record_url: Real searchapi.io base URL to fetch and save misses from
+            synthesize_missing: Build responses from the mock inventory when
+                nothing is recorded for an engine
+        """
+        self.recordings = recordings if recordings is not None else RecordingStore()
+        self.latency = latency or LatencyModel()
+        self.record_url = record_url
+        self.synthesize_missing = synthesize_missing
+        self.counts = {'recorded': 0, 'synthesized': 0, 'proxied': 0, 'errors': 0, 'not_found': 0}
+
+    def _fetch_upstream(self, query: Dict[str, Any]) -> bytes:
+        url = f"{self.record_url.rstrip('/')}{SEARCH_PATH}?{urlencode(query)}"
+        with urllib.request.urlopen(url, timeout=30) as response:
+            return response.read()
+
+    async def respond(self, path: str, query: Dict[str, Any]) -> Tuple[int, bytes]:
+        """Return the status and JSON body for one request."""
+        if path == '/_stats':
+            return 200, json.dumps(self.counts).encode('utf-8')
+        if path != SEARCH_PATH:
+            self.counts['not_found'] += 1
+            return 404, b'{"error": "Not found"}'
+
+        delay, fail = self.latency.sample()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if fail:
+            self.counts['errors'] += 1
+            return 500, b'{"error": "Injected failure"}'
+
+        body = self.recordings.match(query, any_route=False)
+        if body is None and self.record_url:
+            body = await asyncio.to_thread(self._fetch_upstream, query)
+            logger.info(f"Recorded {self.recordings.save(query, body)}")
+            self.counts['proxied'] += 1
+            return 200, body
+        if body is None and self.synthesize_missing:
+            response = synthesize(query)
+            if response is not None:
+                self.counts['synthesized'] += 1
+                return 200, json.dumps(response).encode('utf-8')
+        if body is None:
+            body = self.recordings.match(query)
+        if body is None:
+            self.counts['not_found'] += 1
+            return 400, json.dumps({'error': f"No recording for engine {query.get('engine')!r}"}).encode('utf-8')
+        self.counts['recorded'] += 1
+        return 200, body
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one keep-alive connection."""
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                for line in header_lines:
+                    name, _, value = line.partition(':')
+                    if name.strip().lower() == 'content-length' and int(value):
+                        await reader.readexactly(int(value))
+                parts = request_line.split()
+                target = urlsplit(parts[1] if len(parts) > 1 else '/')
+                status, body = await self.respond(target.path, dict(parse_qsl(target.query)))
+                writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8099) -> None:
+        """Serve until cancelled."""
+        server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+
+def add_latency_arguments(parser: argparse.ArgumentParser, prefix: str = '') -> None:
+    """Add the latency model options, optionally prefixed (e.g. ``upstream-``)."""
+    parser.add_argument(f'--{prefix}latency', type=float, default=0.0,
+                        help="Seconds every response waits")
+    parser.add_argument(f'--{prefix}jitter', type=float, default=0.0,
+                        help="Up to this many extra seconds per response, uniformly distributed")
+    parser.add_argument(f'--{prefix}tail-fraction', type=float, default=0.0,
+                        help="Share of responses that wait --tail-latency instead")
+    parser.add_argument(f'--{prefix}tail-latency', type=float, default=1.0,
+                        help="Seconds a tail response waits")
+    parser.add_argument(f'--{prefix}error-rate', type=float, default=0.0,
+                        help="Share of responses answered with a 500")
+    parser.add_argument(f'--{prefix}seed', type=int, default=0)
+
+
+def latency_argv(args: argparse.Namespace, prefix: str = '') -> List[str]:
+    """Turn parsed latency options back into this module's command line."""
+    attr = prefix.replace('-', '_')
+    return ['--latency', str(getattr(args, f'{attr}latency')),
+            '--jitter', str(getattr(args, f'{attr}jitter')),
+            '--tail-fraction', str(getattr(args, f'{attr}tail_fraction')),
+            '--tail-latency', str(getattr(args, f'{attr}tail_latency')),
+            '--error-rate', str(getattr(args, f'{attr}error_rate')),
+            '--seed', str(getattr(args, f'{attr}seed'))]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve recorded searchapi.io responses locally")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--recordings', default=DEFAULT_RECORDINGS_DIR,
+                        help="Directory of recorded responses (*.json)")
+    parser.add_argument('--record', metavar='URL',
+                        help="Fetch queries with no recording from this base URL and save them")
+    parser.add_argument('--no-synthesize', action='store_true',
+                        help="Answer unrecorded engines with a 400 instead of mock inventory")
+    add_latency_arguments(parser)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    fake = FakeSearchApi(
+        RecordingStore(args.recordings),
+        LatencyModel(args.latency, args.jitter, args.tail_fraction, args.tail_latency, args.error_rate, args.seed),
+        record_url=args.record,
+        synthesize_missing=not args.no_synthesize
+    )
+    logger.info(f"Fake searchapi.io on http://{args.host}:{args.port} "
+                f"({len(fake.recordings)} recordings, latency {fake.latency.describe()})")
+    try:
+        asyncio.run(fake.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,415 @@
+"""
+Shared HTTP client for upstream travel APIs.
+
+Wraps a pooled ``requests.Session`` with connect/read timeouts, bounded
+retries with jittered exponential backoff and a circuit breaker, so slow or
+failing providers cannot hang server workers. The base URL is configurable,
+which lets the client be pointed at a local stub server for testing.
+
+``AsyncUpstreamClient`` provides the same behaviour on top of ``httpx`` for
+the ASGI serving path; httpx is only needed when it is used.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.metrics import metrics
+from utils.tracing import span
+
+try:
+    import httpx
+except ImportError:  # Only required by AsyncUpstreamClient
+    httpx = None
+
+logger = logging.getLogger('rahalah.http')
+
+DEFAULT_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Transport failures worth another attempt: the request may not have reached
+# the upstream, or the response was cut off. Other RequestExceptions (bad
+# URL, too many redirects, undecodable body) would fail the same way again.
+RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+# Per attempt, so retries show up as extra attempts; status is "error" when
+# no response arrived
+upstream_attempts = metrics.counter('rahalah_upstream_attempts_total', 'HTTP attempts sent to upstream APIs',
+                                    ('upstream', 'status'))
+upstream_duration = metrics.histogram('rahalah_upstream_attempt_duration_seconds',
+                                      'Time per HTTP attempt to an upstream API', ('upstream',))
+upstream_rejected = metrics.counter('rahalah_upstream_rejected_total',
+                                    'Upstream requests refused by an open circuit breaker', ('upstream',))
+
+
+def backoff_delay(attempt: int, backoff_factor: float, backoff_max: float,
+                  retry_after: Optional[str] = None) -> float:
+    """
+    Return the delay before retry number ``attempt`` (0-based).
+
+    A numeric Retry-After header wins; otherwise full-jitter exponential
+    backoff is used. Either way the delay is capped at ``backoff_max``.
+    """
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), backoff_max)
+    return random.uniform(0, min(backoff_max, backoff_factor * (2 ** attempt)))
+
+
+def _record_attempt(upstream: str, status: Any, start_time: float) -> float:
+    """Count one upstream attempt and return its duration."""
+    elapsed = time.perf_counter() - start_time
+    upstream_attempts.labels(upstream, status).inc()
+    upstream_duration.labels(upstream).observe(elapsed)
+    return elapsed
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a request is refused because the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    requests fail fast for ``reset_timeout`` seconds. It then lets a single
+    trial request through (half-open); success closes it again, failure
+    re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        """Current breaker state: closed, open or half_open."""
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Return True if a request may be attempted now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            # Half-open: allow exactly one trial request at a time
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        """Record a successful request and close the breaker."""
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """
+        End a request without judging the upstream, e.g. when it was cancelled.
+
+        Frees the half-open trial slot so the next request can be the trial.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """Record a failed request, opening the breaker at the threshold."""
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuit breaker opened after {self._failures} consecutive failures")
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+
+class UpstreamClient:
+    """
+    Pooled, keep-alive HTTP client for one upstream API.
+
+    ``RETRYABLE_ERRORS`` and retryable status codes are retried up to
+    ``max_retries`` times with full-jitter exponential backoff. Exhausted
+    retries, any other error and 5xx responses count as failures for the
+    circuit breaker.
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 10.0,
+                 max_retries: int = 2,
+                 backoff_factor: float = 0.25,
+                 backoff_max: float = 4.0,
+                 retry_statuses: Iterable[int] = DEFAULT_RETRY_STATUSES,
+                 pool_connections: int = 10,
+                 pool_maxsize: int = 20,
+                 breaker: Optional[CircuitBreaker] = None,
+                 headers: Optional[Dict[str, str]] = None) -> None:
+        """
+        Args:
+            base_url: Scheme and host of the upstream API, e.g. https://www.searchapi.io
+            connect_timeout: Seconds to wait for the TCP/TLS connection
+            read_timeout: Seconds to wait for the response between bytes
+            max_retries: Retries after the first attempt
+            backoff_factor: Base delay in seconds for exponential backoff
+            backoff_max: Upper bound for a single backoff delay
+            retry_statuses: HTTP status codes that are retried
+            pool_connections: Number of connection pools to cache
+            pool_maxsize: Maximum keep-alive connections per pool
+            breaker: Circuit breaker to use (a default one is created if omitted)
+            headers: Headers sent with every request
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+        self.breaker = breaker or CircuitBreaker()
+        self.upstream = urlparse(self.base_url).netloc or self.base_url
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """Return the delay before retry number ``attempt`` (0-based)."""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        return backoff_delay(attempt, self.backoff_factor, self.backoff_max, retry_after)
+
+    def get(self, path: str, params: Optional[Dict[str, Any]] = None,
+            headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """
+        Send a GET request with retries.
+
+        Args:
+            path: Path relative to the base URL
+            params: Query parameters
+            headers: Extra headers for this request
+
+        Returns:
+            The final response; non-retryable error statuses, and retryable
+            ones once retries are exhausted, are returned to the caller
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+            requests.RequestException: If the last attempt failed to connect or timed out
+        """
+        if not self.breaker.allow():
+            upstream_rejected.labels(self.upstream).inc()
+            raise CircuitOpenError(f"Upstream {self.base_url} is unavailable (circuit open)")
+
+        # Every path out settles the breaker, or a half-open trial would never end
+        try:
+            response = self._get_with_retries(path, params, headers)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def _get_with_retries(self, path: str, params: Optional[Dict[str, Any]],
+                          headers: Optional[Dict[str, str]]) -> requests.Response:
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        attempt = 0
+        while True:
+            start_time = time.perf_counter()
+            try:
+                with span('upstream GET', upstream=self.upstream, path=path, attempt=attempt + 1) as attempt_span:
+                    response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+                    attempt_span.set(status=response.status_code)
+            except RETRYABLE_ERRORS as e:
+                _record_attempt(self.upstream, 'error', start_time)
+                logger.warning(f"GET {url} failed on attempt {attempt + 1}: {str(e)}")
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            elapsed = _record_attempt(self.upstream, response.status_code, start_time)
+            logger.debug(f"GET {url} -> {response.status_code} in {elapsed:.4f}s (attempt {attempt + 1})")
+
+            if response.status_code in self.retry_statuses and attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                response.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            return response
+
+    def close(self) -> None:
+        """Close pooled connections."""
+        self.session.close()
+
+
+class AsyncUpstreamClient:
+    """
+    Asynchronous counterpart of ``UpstreamClient`` built on ``httpx.AsyncClient``.
+
+    Uses the same timeout, retry, backoff and circuit breaker rules; passing
+    the sync client's breaker lets both serving paths share one view of the
+    provider's health.
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 10.0,
+                 max_retries: int = 2,
+                 backoff_factor: float = 0.25,
+                 backoff_max: float = 4.0,
+                 retry_statuses: Iterable[int] = DEFAULT_RETRY_STATUSES,
+                 max_connections: int = 200,
+                 max_keepalive_connections: int = 20,
+                 breaker: Optional[CircuitBreaker] = None,
+                 headers: Optional[Dict[str, str]] = None) -> None:
+        """
+        Args:
+            base_url: Scheme and host of the upstream API
+            connect_timeout: Seconds to wait for the TCP/TLS connection
+            read_timeout: Seconds to wait for the response between bytes
+            max_retries: Retries after the first attempt
+            backoff_factor: Base delay in seconds for exponential backoff
+            backoff_max: Upper bound for a single backoff delay
+            retry_statuses: HTTP status codes that are retried
+            max_connections: Maximum concurrently open connections
+            max_keepalive_connections: Idle connections kept for reuse; httpx
+                scans the whole pool on every request, so keeping this small
+                matters more under load than the open-connection cap
+            breaker: Circuit breaker to use (a default one is created if omitted)
+            headers: Headers sent with every request
+        """
+        if httpx is None:
+            raise ImportError("AsyncUpstreamClient requires httpx (pip install httpx)")
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+        self.breaker = breaker or CircuitBreaker()
+        self.upstream = urlparse(self.base_url).netloc or self.base_url
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_keepalive_connections),
+            headers=headers
+        )
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None,
+                  headers: Optional[Dict[str, str]] = None) -> "httpx.Response":
+        """
+        Send a GET request with retries.
+
+        Args:
+            path: Path relative to the base URL
+            params: Query parameters
+            headers: Extra headers for this request
+
+        Returns:
+            The final response, as for ``UpstreamClient.get``
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open
+            httpx.TransportError: If the last attempt failed to connect or timed out
+        """
+        if not self.breaker.allow():
+            upstream_rejected.labels(self.upstream).inc()
+            raise CircuitOpenError(f"Upstream {self.base_url} is unavailable (circuit open)")
+
+        # As in UpstreamClient.get; a cancelled call (a fan-out deadline, a
+        # client disconnect) says nothing about the upstream, so it only
+        # frees the trial slot
+        try:
+            response = await self._get_with_retries(path, params, headers)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def _get_with_retries(self, path: str, params: Optional[Dict[str, Any]],
+                                headers: Optional[Dict[str, str]]) -> "httpx.Response":
+        url = f"/{path.lstrip('/')}"
+        if params:
+            # requests drops None values; httpx would send them as empty strings
+            params = {name: value for name, value in params.items() if value is not None}
+        attempt = 0
+        while True:
+            start_time = time.perf_counter()
+            try:
+                with span('upstream GET', upstream=self.upstream, path=path, attempt=attempt + 1) as attempt_span:
+                    response = await self.client.get(url, params=params, headers=headers)
+                    attempt_span.set(status=response.status_code)
+            except httpx.TransportError as e:
+                _record_attempt(self.upstream, 'error', start_time)
+                logger.warning(f"GET {self.base_url}{url} failed on attempt {attempt + 1}: {str(e)}")
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, self.backoff_factor, self.backoff_max))
+                attempt += 1
+                continue
+
+            elapsed = _record_attempt(self.upstream, response.status_code, start_time)
+            logger.debug(f"GET {self.base_url}{url} -> {response.status_code} in {elapsed:.4f}s (attempt {attempt + 1})")
+
+            if response.status_code in self.retry_statuses and attempt < self.max_retries:
+                await asyncio.sleep(backoff_delay(attempt, self.backoff_factor, self.backoff_max,
+                                                  response.headers.get('Retry-After')))
+                attempt += 1
+                continue
+
+            return response
+
+    async def aclose(self) -> None:
+        """Close pooled connections."""
+        await self.client.aclose()
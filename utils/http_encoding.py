@@ -0,0 +1,305 @@
+"""
+JSON encoding and content negotiation for API responses.
+
+JSON encoders are pluggable: ``stdlib`` (``json.dumps``) is always there,
+``orjson`` is used when installed, and others can be added with
+``register_json_encoder``. ``RAHALAH_JSON_ENCODER`` picks one by name
+(``auto``, the default, takes the fastest available). Every encoder returns
+compact UTF-8 bytes and handles dates, sets and NumPy values.
+
+Responses are compressed with gzip, or brotli when the ``brotli`` package is
+installed, as negotiated from ``Accept-Encoding``. Bodies smaller than the
+policy's threshold, non-text types and responses that are already encoded
+are sent as they are. Static assets can be compressed ahead of time with
+``utils/precompress.py``; ``precompressed_variant`` finds the file to send
+in place of the original.
+"""
+
+import gzip
+import json
+import logging
+import os
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # Optional; the stdlib encoder is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional; only gzip is offered without it
+    brotli = None
+
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger('rahalah.encoding')
+
+JSON_MIMETYPE = 'application/json'
+
+# Suffixes of precompressed files, by content coding
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# Media types worth compressing; everything else (images, fonts, archives)
+# is already compressed
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml',
+                      'image/svg+xml')
+
+
+def _default(value: Any) -> Any:
+    """Convert values the JSON encoders do not handle natively."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    # NumPy scalars and arrays, without importing NumPy here
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=_default).encode('utf-8')
+
+
+JSON_ENCODERS: Dict[str, Callable[[Any], bytes]] = {'stdlib': _stdlib_dumps}
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def _orjson_dumps(value: Any) -> bytes:
+        return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+
+    JSON_ENCODERS['orjson'] = _orjson_dumps
+
+# Tried in order by "auto"
+ENCODER_PREFERENCE = ['orjson', 'stdlib']
+
+
+def register_json_encoder(name: str, dumps: Callable[[Any], bytes], preferred: bool = False) -> None:
+    """
+    Make a JSON encoder available by name.
+
+    Args:
+        name: Name used in RAHALAH_JSON_ENCODER
+        dumps: Function turning a value into UTF-8 JSON bytes
+        preferred: Try it first when the encoder is "auto"
+    """
+    JSON_ENCODERS[name] = dumps
+    if name in ENCODER_PREFERENCE:
+        ENCODER_PREFERENCE.remove(name)
+    ENCODER_PREFERENCE.insert(0 if preferred else len(ENCODER_PREFERENCE), name)
+
+
+def get_json_encoder(name: Optional[str] = None) -> Callable[[Any], bytes]:
+    """
+    Look up a JSON encoder.
+
+    Args:
+        name: Encoder name, or "auto"/None for the first available in
+            ENCODER_PREFERENCE; defaults to RAHALAH_JSON_ENCODER
+
+    Raises:
+        ValueError: If the named encoder is not available
+    """
+    name = (name or os.getenv('RAHALAH_JSON_ENCODER', 'auto')).lower()
+    if name == 'auto':
+        name = next(candidate for candidate in ENCODER_PREFERENCE if candidate in JSON_ENCODERS)
+    try:
+        return JSON_ENCODERS[name]
+    except KeyError:
+        raise ValueError(f"JSON encoder {name!r} is not available "
+                         f"(available: {', '.join(sorted(JSON_ENCODERS))})")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes ``jsonify`` responses with a pluggable encoder."""
+
+    def __init__(self, app: Any, encoder: Optional[Callable[[Any], bytes]] = None) -> None:
+        super().__init__(app)
+        self.encoder = encoder or get_json_encoder()
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.encoder(obj).decode('utf-8')
+
+    def response(self, *args: Any, **kwargs: Any) -> Any:
+        # Encode straight to bytes instead of going through a str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encoder(obj), mimetype=JSON_MIMETYPE)
+
+
+def available_encodings() -> Tuple[str, ...]:
+    """Content codings this process can produce, best first."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """
+    Parse an Accept-Encoding header into coding -> quality.
+
+    Malformed quality values count as 1; codings are lowercased.
+    """
+    accepted: Dict[str, float] = {}
+    for item in (header or '').split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        accepted[coding] = quality
+    return accepted
+
+
+def choose_encoding(header: Optional[str], offered: Iterable[str]) -> Optional[str]:
+    """
+    Pick the content coding to use for a response.
+
+    Args:
+        header: The request's Accept-Encoding
+        offered: Codings we can send, best first
+
+    Returns:
+        The chosen coding, or None to send the body unencoded
+    """
+    accepted = parse_accept_encoding(header)
+    if not accepted:
+        return None
+    wildcard = accepted.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for coding in offered:
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    """Whether a media type benefits from compression."""
+    return bool(content_type) and content_type.lower().startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionPolicy:
+    """When and how hard to compress dynamic responses."""
+
+    def __init__(self,
+                 min_size: int = 1024,
+                 encodings: Optional[Iterable[str]] = None,
+                 gzip_level: int = 5,
+                 brotli_quality: int = 4) -> None:
+        """
+        Args:
+            min_size: Smallest body, in bytes, worth compressing
+            encodings: Codings offered, best first (all available by default)
+            gzip_level: zlib level, 1-9
+            brotli_quality: Brotli quality, 0-11; low values suit per-request
+                compression, 11 is for precompressed assets
+        """
+        self.min_size = min_size
+        supported = available_encodings()
+        self.encodings = tuple(coding for coding in (encodings or supported) if coding in supported)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def negotiate(self, accept_encoding: Optional[str], content_type: Optional[str], size: int) -> Optional[str]:
+        """Return the coding to compress a response with, or None."""
+        if size < self.min_size or not self.encodings or not is_compressible(content_type):
+            return None
+        return choose_encoding(accept_encoding, self.encodings)
+
+    def compress(self, body: bytes, coding: str) -> bytes:
+        """Compress a body with the given coding."""
+        return compress(body, coding, self.gzip_level if coding == 'gzip' else self.brotli_quality)
+
+
+def compress(body: bytes, coding: str, level: int) -> bytes:
+    """
+    Compress with gzip or brotli.
+
+    gzip output carries no timestamp, so equal bodies give equal bytes.
+    """
+    if coding == 'gzip':
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    if coding == 'br':
+        if brotli is None:
+            raise ValueError("brotli is not installed (pip install brotli)")
+        return brotli.compress(body, quality=level)
+    raise ValueError(f"Unsupported content coding: {coding}")
+
+
+def decompress(body: bytes, coding: Optional[str]) -> bytes:
+    """Undo ``compress``; used by tools that read compressed responses."""
+    if not coding or coding == 'identity':
+        return body
+    if coding == 'gzip':
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if coding == 'br' and brotli is not None:
+        return brotli.decompress(body)
+    raise ValueError(f"Unsupported content coding: {coding}")
+
+
+def create_compression_policy_from_env() -> Optional[CompressionPolicy]:
+    """
+    Build the compression policy configured by environment variables.
+
+    RAHALAH_COMPRESSION lists the codings to offer ("br,gzip" by default,
+    "off" to disable), RAHALAH_COMPRESS_MIN_BYTES the size threshold,
+    RAHALAH_GZIP_LEVEL and RAHALAH_BROTLI_QUALITY the effort.
+
+    Returns:
+        The policy, or None when compression is off
+    """
+    setting = os.getenv('RAHALAH_COMPRESSION', 'br,gzip').lower()
+    if setting in ('off', 'false', '0', 'none', ''):
+        return None
+    return CompressionPolicy(
+        min_size=int(os.getenv('RAHALAH_COMPRESS_MIN_BYTES', '1024')),
+        encodings=[coding.strip() for coding in setting.split(',') if coding.strip()],
+        gzip_level=int(os.getenv('RAHALAH_GZIP_LEVEL', '5')),
+        brotli_quality=int(os.getenv('RAHALAH_BROTLI_QUALITY', '4'))
+    )
+
+
+def precompressed_variant(path: str, accept_encoding: Optional[str]) -> Optional[Tuple[str, str]]:
+    """
+    Find a precompressed copy of a static file the client accepts.
+
+    Copies older than the original are ignored, so an edited asset is never
+    shadowed by a stale one.
+
+    Returns:
+        (path of the compressed file, content coding), or None
+    """
+    accepted = parse_accept_encoding(accept_encoding)
+    if not accepted:
+        return None
+    try:
+        original_mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    wildcard = accepted.get('*', 0.0)
+    for coding, suffix in ENCODING_SUFFIXES.items():
+        if accepted.get(coding, wildcard) <= 0:
+            continue
+        candidate = path + suffix
+        try:
+            if os.stat(candidate).st_mtime >= original_mtime:
+                return candidate, coding
+        except OSError:
+            continue
+    return None
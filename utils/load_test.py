@@ -0,0 +1,256 @@
+"""
+Load test comparing the sync (Flask) and async (ASGI) serving paths.
+
+Starts the local searchapi.io stand-in (utils/fake_searchapi.py) with the
+requested latency model, launches each server in a subprocess pointed at
+it, then drives the same workload against both at a fixed concurrency and
+reports throughput and latency percentiles:
+
+    python utils/load_test.py --concurrency 64 --requests 2000 --upstream-latency 0.2 \
+        --upstream-jitter 0.05 --upstream-tail-fraction 0.01 --upstream-tail-latency 2.0
+
+Flight searches use a distinct outbound date per request so every request
+misses the search cache and really waits on the upstream. With
+``--inventory-provider searchapi`` the chat agents search the fake upstream
+too instead of the mock inventory. The ASGI server needs httpx and uvicorn.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from utils.benchmark import SAMPLE_MESSAGES  # noqa: E402
+from utils.fake_searchapi import DEFAULT_RECORDINGS_DIR, LatencyModel, add_latency_arguments, latency_argv  # noqa: E402
+
+# Commands that serve the app on {port}; both run from the project root
+SERVER_COMMANDS = {
+    'sync': [
+        sys.executable, '-c',
+        "import sys, server; from werkzeug.serving import run_simple; "
+        "run_simple('127.0.0.1', int(sys.argv[1]), server.app, threaded=True)",
+        '{port}'
+    ],
+    'asgi': [
+        sys.executable, '-m', 'uvicorn', 'asgi:app',
+        '--host', '127.0.0.1', '--port', '{port}', '--log-level', 'warning', '--no-access-log'
+    ]
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(process: subprocess.Popen, name: str, port: int, timeout: float = 30.0) -> None:
+    """Wait until a child process accepts connections on ``port``."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{name} exited with status {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{name} did not start within {timeout:.0f}s")
+
+
+def start_fake_upstream(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    """
+    Start the fake searchapi.io server in a subprocess.
+
+    It runs in its own process so that neither the upstream nor the load
+    generator steals CPU from the server being measured.
+    """
+    port = _free_port()
+    command = [sys.executable, os.path.join(ROOT_DIR, 'utils', 'fake_searchapi.py'), '--port', str(port),
+               '--recordings', args.recordings] + latency_argv(args, 'upstream-')
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _wait_for_port(process, 'fake upstream', port)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def start_server(kind: str, upstream_url: str, inventory_provider: str = 'mock') -> Tuple[subprocess.Popen, str]:
+    """Launch one serving path and wait until it accepts connections."""
+    port = _free_port()
+    command = [part.format(port=port) for part in SERVER_COMMANDS[kind]]
+    env = dict(os.environ,
+               SEARCHAPI_BASE_URL=upstream_url,
+               SEARCHAPI_MAX_RETRIES='0',
+               RAHALAH_SEARCH_CACHE='memory',
+               RAHALAH_INVENTORY_PROVIDER=inventory_provider,
+               RAHALAH_DEBUG='false')
+    process = subprocess.Popen(command, cwd=ROOT_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _wait_for_port(process, f"{kind} server", port)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def _build_request(workload: str, index: int) -> Tuple[str, str, Optional[bytes]]:
+    """Return the method, target and body for request number ``index``."""
+    if workload == 'chat':
+        message = SAMPLE_MESSAGES[index % len(SAMPLE_MESSAGES)]
+        return 'POST', '/process_message', json.dumps({'message': message}).encode('utf-8')
+    outbound_date = (date(2030, 1, 1) + timedelta(days=index)).isoformat()
+    query = urlencode({'departure_id': 'DMM', 'arrival_id': 'RUH', 'outbound_date': outbound_date})
+    return 'GET', f"/api/search/flights?{query}", None
+
+
+class Connection:
+    """
+    Minimal keep-alive HTTP/1.1 client connection.
+
+    httpx rescans its whole pool on every request, which makes the load
+    generator itself the bottleneck with hundreds of keep-alive connections,
+    so each worker drives one raw connection instead.
+    """
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, target: str, body: Optional[bytes] = None,
+                      headers: Optional[Dict[str, str]] = None) -> int:
+        """Send one request and return the response status code."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = f"{method} {target} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+        if body is not None:
+            if not headers or 'Content-Type' not in headers:
+                head += "Content-Type: application/json\r\n"
+            head += f"Content-Length: {len(body)}\r\n"
+        for name, value in (headers or {}).items():
+            head += f"{name}: {value}\r\n"
+        self.writer.write(head.encode('latin-1') + b'\r\n' + (body or b''))
+        await self.writer.drain()
+
+        status_line, *header_lines = (await self.reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        headers = {}
+        for line in header_lines:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+        else:
+            await self.reader.read()
+        if status_line.startswith('HTTP/1.0') or headers.get('connection', '').lower() == 'close' \
+                or 'content-length' not in headers:
+            self.close()
+        return int(status_line.split()[1])
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+async def run_load(base_url: str, workload: str, total: int, concurrency: int) -> Dict[str, float]:
+    """Send ``total`` requests with ``concurrency`` in flight and summarize latencies."""
+    url = urlsplit(base_url)
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index, errors
+        connection = Connection(url.hostname, url.port)
+        try:
+            while next_index < total:
+                index = next_index
+                next_index += 1
+                start = time.perf_counter()
+                try:
+                    if await connection.request(*_build_request(workload, index)) != 200:
+                        errors += 1
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    connection.close()
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+        finally:
+            connection.close()
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start_time
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'errors': errors,
+        'throughput': total / elapsed,
+        'p50': latencies[int(0.50 * (len(latencies) - 1))],
+        'p99': latencies[int(0.99 * (len(latencies) - 1))],
+        'p999': latencies[int(0.999 * (len(latencies) - 1))]
+    }
+
+
+def _report(workload: str, results: Dict[str, Dict[str, float]], baseline: Optional[str]) -> None:
+    """Print one line per serving path."""
+    print(f"{workload}:")
+    for kind, stats in results.items():
+        speedup = ''
+        if baseline in results and kind != baseline:
+            speedup = f"  ({stats['throughput'] / results[baseline]['throughput']:.2f}x {baseline} throughput)"
+        print(f"  {kind:<5} {stats['throughput']:8.1f} req/s  p50 {stats['p50'] * 1000:8.1f} ms  "
+              f"p99 {stats['p99'] * 1000:8.1f} ms  p99.9 {stats['p999'] * 1000:8.1f} ms  errors {stats['errors']}{speedup}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare the sync and ASGI serving paths under load")
+    parser.add_argument('--targets', nargs='+', default=['sync', 'asgi'], choices=sorted(SERVER_COMMANDS))
+    parser.add_argument('--workloads', nargs='+', default=['search', 'chat'], choices=['search', 'chat'])
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--inventory-provider', default='mock', choices=['mock', 'searchapi'],
+                        help="Where the chat agents get offers from")
+    parser.add_argument('--recordings', default=DEFAULT_RECORDINGS_DIR,
+                        help="Recorded searchapi.io responses the fake upstream replays")
+    add_latency_arguments(parser, 'upstream-')
+    parser.set_defaults(upstream_latency=0.2)
+    args = parser.parse_args()
+
+    upstream, upstream_url = start_fake_upstream(args)
+    latency = LatencyModel(args.upstream_latency, args.upstream_jitter, args.upstream_tail_fraction,
+                           args.upstream_tail_latency, args.upstream_error_rate)
+    print(f"concurrency={args.concurrency} requests={args.requests} "
+          f"upstream latency={latency.describe()} agents={args.inventory_provider}")
+
+    results: Dict[str, Dict[str, Dict[str, float]]] = {workload: {} for workload in args.workloads}
+    try:
+        for kind in args.targets:
+            process, base_url = start_server(kind, upstream_url, args.inventory_provider)
+            try:
+                for workload in args.workloads:
+                    results[workload][kind] = asyncio.run(
+                        run_load(base_url, workload, args.requests, args.concurrency)
+                    )
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+    finally:
+        upstream.terminate()
+        upstream.wait(timeout=10)
+
+    for workload in args.workloads:
+        _report(workload, results[workload], args.targets[0])
+
+
+if __name__ == '__main__':
+    main()
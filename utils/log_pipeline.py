@@ -0,0 +1,242 @@
+"""
+Asynchronous logging: request threads enqueue records, one thread writes them.
+
+``QueueingHandler`` is attached to a logger in place of its real handlers.
+It puts records on a bounded queue without formatting them; when the queue
+is full, DEBUG and INFO records are dropped at once and WARNING and above
+wait briefly for space before being dropped too, so a slow disk can never
+stall requests. Drops are counted per level, in ``stats`` and in the
+``rahalah_log_records_dropped_total`` metric.
+
+``LogWriter`` drains the queue in batches on a background thread, formats
+each record for the handlers whose level it passes and flushes each handler
+once per batch. ``BatchedRotatingFileHandler`` rotates by size and only
+flushes when the writer asks it to.
+
+Message arguments are formatted on the writer thread, so expensive values
+can be wrapped in ``LazyJSON`` or ``LazyRepr`` and passed as ``%s``
+arguments; they are serialized only if a handler writes the record. Values
+logged this way must not be modified afterwards.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.metrics import metrics
+
+records_dropped = metrics.counter('rahalah_log_records_dropped_total',
+                                  'Log records discarded because the log queue was full', ('level',))
+
+# Seconds a WARNING or more severe record waits for queue space before it is dropped
+SEVERE_RECORD_WAIT = 0.05
+
+_STOP = object()
+
+
+class LazyJSON:
+    """Serializes a value to JSON only when the log message is formatted."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def __str__(self) -> str:
+        try:
+            return json.dumps(self.value, default=str)
+        except Exception as e:
+            return f"<unserializable {type(self.value).__name__}: {e}>"
+
+
+class LazyRepr:
+    """``repr()`` of a value, truncated, computed only when the log message is formatted."""
+
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value: Any, limit: int = 1000) -> None:
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        try:
+            text = repr(self.value)
+        except Exception as e:
+            return f"<unrepresentable {type(self.value).__name__}: {e}>"
+        return text[:self.limit] + "..." if len(text) > self.limit else text
+
+
+class LazyCall:
+    """Renders call arguments as ``a, b, key=value`` when the log message is formatted."""
+
+    __slots__ = ('args', 'kwargs', 'limit')
+
+    def __init__(self, args: tuple, kwargs: Dict[str, Any], limit: int = 1000) -> None:
+        self.args = args
+        self.kwargs = kwargs
+        self.limit = limit
+
+    def __str__(self) -> str:
+        parts = [str(LazyRepr(arg, self.limit)) for arg in self.args]
+        parts.extend(f"{name}={LazyRepr(value, self.limit)}" for name, value in self.kwargs.items())
+        return ', '.join(parts)
+
+
+class QueueingHandler(logging.Handler):
+    """Puts records on a bounded queue for a LogWriter, dropping them when it is full."""
+
+    def __init__(self, maxsize: int = 10000) -> None:
+        super().__init__()
+        self.queue: 'queue.Queue[Any]' = queue.Queue(maxsize=maxsize)
+        self.enqueued = 0
+        self.dropped: Dict[str, int] = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=SEVERE_RECORD_WAIT)
+            else:
+                self.queue.put_nowait(record)
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped[record.levelname] = self.dropped.get(record.levelname, 0) + 1
+            records_dropped.labels(record.levelname).inc()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enqueued': self.enqueued,
+            'dropped': dict(self.dropped),
+            'queued': self.queue.qsize(),
+            'capacity': self.queue.maxsize
+        }
+
+
+class BatchedRotatingFileHandler(RotatingFileHandler):
+    """
+    Size-rotated log file that leaves flushing to the writer.
+
+    Rotated files keep the ``.log`` extension (``name.1.log``, ``name.2.log``)
+    so they are listed with the current one.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int,
+                 on_rollover: Optional[Callable[[], None]] = None) -> None:
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, delay=True)
+        self.on_rollover = on_rollover
+        self.batching = False
+
+    def rotation_filename(self, default_name: str) -> str:
+        base, _, index = default_name.rpartition('.')
+        if index.isdigit() and base.endswith('.log'):
+            return f"{base[:-len('.log')]}.{index}.log"
+        return default_name
+
+    def flush(self) -> None:
+        if not self.batching:
+            super().flush()
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        if self.on_rollover is not None:
+            self.on_rollover()
+
+
+class LogWriter:
+    """Background thread that writes queued records to the real handlers in batches."""
+
+    def __init__(self, source: QueueingHandler, handlers: List[logging.Handler], batch_size: int = 256,
+                 linger: float = 0.05) -> None:
+        """
+        Args:
+            source: The handler whose queue is drained
+            handlers: Handlers that write the records
+            batch_size: Most records written per flush
+            linger: Seconds to wait after the first record of a batch for
+                more to arrive, trading write latency for fewer wakeups
+        """
+        self.source = source
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.linger = linger
+        self.written = 0
+        self.batches = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='rahalah-log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Write everything queued so far, then stop the thread."""
+        thread, self._thread = self._thread, None
+        if thread is None or not thread.is_alive():
+            return
+        self.source.queue.put(_STOP)
+        thread.join(timeout)
+
+    def _run(self) -> None:
+        pending = self.source.queue
+        while True:
+            batch = [pending.get()]
+            if self.linger and batch[0] is not _STOP and pending.qsize() < self.batch_size:
+                time.sleep(self.linger)
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = any(record is _STOP for record in batch)
+            self.write([record for record in batch if record is not _STOP])
+            if stopping:
+                return
+
+    def write(self, records: List[logging.LogRecord]) -> None:
+        """Hand records to every handler they pass, flushing each handler once."""
+        for handler in self.handlers:
+            if isinstance(handler, BatchedRotatingFileHandler):
+                handler.batching = True
+        try:
+            for record in records:
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+        finally:
+            for handler in self.handlers:
+                if isinstance(handler, BatchedRotatingFileHandler):
+                    handler.batching = False
+                handler.flush()
+        self.written += len(records)
+        self.batches += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.source.stats(), written=self.written, batches=self.batches)
+
+
+def install(logger: logging.Logger, maxsize: int = 10000, batch_size: int = 256, linger: float = 0.05) -> LogWriter:
+    """
+    Move a logger's handlers behind a queue and start writing them in the background.
+
+    Args:
+        logger: Logger whose current handlers become the writer's
+        maxsize: Records held before new ones are dropped
+        batch_size: Most records written per flush
+        linger: Seconds the writer waits for a batch to fill
+
+    Returns:
+        The running LogWriter
+    """
+    handlers = list(logger.handlers)
+    source = QueueingHandler(maxsize=maxsize)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(source)
+    writer = LogWriter(source, handlers, batch_size=batch_size, linger=linger)
+    writer.start()
+    return writer
+
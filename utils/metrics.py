@@ -0,0 +1,649 @@
+"""
+In-process metrics: counters, gauges and fixed-bucket histograms.
+
+Metrics are declared once, usually at import time, on a ``MetricsRegistry``
+(``metrics`` is the process-wide one) and updated from any thread. Each
+labelled series holds its own small lock, so recording a value costs one
+dict lookup and an uncontended lock; nothing is formatted or written until
+the registry is scraped. ``render`` produces the Prometheus text format
+served at ``/metrics``.
+
+Several worker processes (gunicorn, uvicorn --workers) each have their own
+registry. With ``RAHALAH_METRICS_DIR`` set, every process writes a snapshot
+of its metrics to ``<dir>/metrics-<pid>.json`` every
+``RAHALAH_METRICS_FLUSH_INTERVAL`` seconds and on exit, and a scrape of any
+worker merges all snapshots: counters and histograms are summed (including
+those of workers that have exited, so totals never go backwards) and gauges
+of live workers are combined as each gauge declares. Files from a previous
+run should be cleared when the server starts, as with Prometheus' own
+multiprocess mode.
+
+``instrument_agent_system`` records routing, agent and inventory provider
+timings for an agent system built by ``AgentFactory``.
+"""
+
+import atexit
+import functools
+import inspect
+import json
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger('rahalah.metrics')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers in-memory work (milliseconds) up to slow upstream searches
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# How gauges from several workers are combined
+GAUGE_MODES = ('sum', 'max', 'min', 'all')
+
+LabelValues = Tuple[str, ...]
+
+
+class _CounterSeries:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        with self._lock:
+            self.value += amount
+
+    def _reset(self) -> None:
+        self.value = 0.0
+
+    def _snapshot(self) -> float:
+        return self.value
+
+
+class _GaugeSeries(_CounterSeries):
+    __slots__ = ()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+
+class _HistogramSeries:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        # One count per bucket plus +Inf; not cumulative until rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> '_Timer':
+        """Context manager that observes the seconds spent in its block."""
+        return _Timer(self)
+
+    def _reset(self) -> None:
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def _snapshot(self) -> List[Any]:
+        with self._lock:
+            return [list(self.counts), self.sum]
+
+
+class _Timer:
+    __slots__ = ('series', 'start')
+
+    def __init__(self, series: _HistogramSeries) -> None:
+        self.series = series
+
+    def __enter__(self) -> '_Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.series.observe(time.perf_counter() - self.start)
+
+
+class Metric:
+    """
+    A named metric with zero or more labels.
+
+    Unlabelled metrics are updated directly (``requests.inc()``); labelled
+    ones through ``labels`` (``requests.labels('GET', '200').inc()``). The
+    series for a label combination is created on first use and then reused,
+    so hot paths can also keep the series returned by ``labels``.
+    """
+
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[LabelValues, Any] = {}
+        # Same series keyed by the values as passed (e.g. an int status), to
+        # skip converting them to strings on every call
+        self._lookup: Dict[Tuple[Any, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_series(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: Any) -> Any:
+        """Return the series for these label values, in ``labelnames`` order."""
+        series = self._lookup.get(values)
+        if series is None:
+            key = tuple(str(value) for value in values)
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+                self._lookup[values] = series
+        return series
+
+    def _unlabelled(self) -> Any:
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels {self.labelnames}; use labels()")
+        return self.labels()
+
+    def _reset(self) -> None:
+        for series in list(self._series.values()):
+            series._reset()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current values as a JSON-serializable dict."""
+        return {
+            'type': self.type,
+            'help': self.documentation,
+            'labelnames': list(self.labelnames),
+            'series': [[list(key), series._snapshot()] for key, series in list(self._series.items())]
+        }
+
+
+class Counter(Metric):
+    """A total that only goes up, e.g. requests served."""
+
+    type = 'counter'
+
+    def _new_series(self) -> _CounterSeries:
+        return _CounterSeries()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._unlabelled().inc(amount)
+
+
+class Gauge(Metric):
+    """A value that goes up and down, e.g. requests in progress."""
+
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 multiprocess_mode: str = 'sum') -> None:
+        """
+        Args:
+            multiprocess_mode: How values of several workers are combined:
+                sum, max, min, or all (one series per worker, with a pid label)
+        """
+        if multiprocess_mode not in GAUGE_MODES:
+            raise ValueError(f"multiprocess_mode must be one of {GAUGE_MODES}")
+        super().__init__(name, documentation, labelnames)
+        self.multiprocess_mode = multiprocess_mode
+
+    def _new_series(self) -> _GaugeSeries:
+        return _GaugeSeries()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._unlabelled().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._unlabelled().set(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(super().snapshot(), mode=self.multiprocess_mode)
+
+
+class Histogram(Metric):
+    """Counts of observations in fixed buckets, plus their count and sum."""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets if not math.isinf(bound)))
+
+    def _new_series(self) -> _HistogramSeries:
+        return _HistogramSeries(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._unlabelled().observe(value)
+
+    def time(self) -> _Timer:
+        return self._unlabelled().time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(super().snapshot(), buckets=list(self.buckets))
+
+
+class MetricsRegistry:
+    """A set of metrics, rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+        self.directory: Optional[str] = None
+        self.flush_interval = 1.0
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _get_or_create(self, cls: type, name: str, *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Declare a counter, or return the one already declared under this name."""
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              multiprocess_mode: str = 'sum') -> Gauge:
+        """Declare a gauge, or return the one already declared under this name."""
+        return self._get_or_create(Gauge, name, documentation, labelnames, multiprocess_mode=multiprocess_mode)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Declare a histogram, or return the one already declared under this name."""
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def reset(self) -> None:
+        """Zero every series, keeping the declarations."""
+        for metric in list(self._metrics.values()):
+            metric._reset()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """This process's values of every metric."""
+        return {name: metric.snapshot() for name, metric in list(self._metrics.items())}
+
+    # Multi-process aggregation
+
+    def enable_multiprocess(self, directory: str, flush_interval: float = 1.0) -> None:
+        """
+        Share metrics with other workers through snapshot files in ``directory``.
+
+        Starts a thread that writes this process's snapshot every
+        ``flush_interval`` seconds; ``render`` then reports all workers.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._start_flusher()
+
+    def _start_flusher(self) -> None:
+        self._stop.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name='rahalah-metrics', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+
+    def flush(self) -> None:
+        """Write this process's snapshot file (multi-process mode only)."""
+        if self.directory is None:
+            return
+        path = self._snapshot_path(os.getpid())
+        temp_path = f'{path}.tmp'
+        try:
+            with open(temp_path, 'w') as handle:
+                json.dump(self.snapshot(), handle, separators=(',', ':'))
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics snapshot {path}: {str(e)}")
+
+    def _after_fork(self) -> None:
+        # A forked worker starts from zero; the parent's values are its own
+        self.reset()
+        if self.directory is not None:
+            self._start_flusher()
+
+    def _worker_snapshots(self) -> List[Tuple[int, bool, Dict[str, Any]]]:
+        """(pid, alive, snapshot) for every worker, this one read live."""
+        own_pid = os.getpid()
+        snapshots = [(own_pid, True, self.snapshot())]
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith('metrics-') and filename.endswith('.json')):
+                continue
+            try:
+                pid = int(filename[len('metrics-'):-len('.json')])
+            except ValueError:
+                continue
+            if pid == own_pid:
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            snapshots.append((pid, _pid_alive(pid), snapshot))
+        return snapshots
+
+    def collect(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot of this process, merged with the other workers' in multi-process mode."""
+        if self.directory is None:
+            return self.snapshot()
+        return merge_snapshots(self._worker_snapshots())
+
+    def render(self) -> str:
+        """The Prometheus text exposition of ``collect``."""
+        return render(self.collect())
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge_snapshots(snapshots: List[Tuple[int, bool, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Combine per-worker snapshots.
+
+    Args:
+        snapshots: (pid, alive, snapshot) per worker
+
+    Returns:
+        One snapshot; counters and histograms summed, gauges of live workers
+        combined by their mode
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    values: Dict[str, Dict[LabelValues, Any]] = {}
+    for pid, alive, snapshot in snapshots:
+        for name, metric in snapshot.items():
+            if name not in merged:
+                merged[name] = {key: value for key, value in metric.items() if key != 'series'}
+                if metric.get('mode') == 'all':
+                    merged[name]['labelnames'] = metric['labelnames'] + ['pid']
+                values[name] = {}
+            target = values[name]
+            kind = metric['type']
+            if kind == 'gauge' and not alive:
+                continue
+            for labels, value in metric['series']:
+                if kind == 'gauge' and metric.get('mode') == 'all':
+                    labels = labels + [str(pid)]
+                key = tuple(labels)
+                if key not in target:
+                    target[key] = [list(value[0]), value[1]] if kind == 'histogram' else value
+                elif kind == 'histogram':
+                    counts, total = target[key]
+                    target[key] = [[a + b for a, b in zip(counts, value[0])], total + value[1]]
+                elif kind == 'counter' or metric.get('mode') == 'sum':
+                    target[key] += value
+                elif metric.get('mode') == 'max':
+                    target[key] = max(target[key], value)
+                elif metric.get('mode') == 'min':
+                    target[key] = min(target[key], value)
+    for name, metric in merged.items():
+        metric['series'] = [[list(key), value] for key, value in values[name].items()]
+    return merged
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render(snapshot: Dict[str, Dict[str, Any]]) -> str:
+    """Format a snapshot in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        help_text = metric['help'].replace('\\', '\\\\').replace('\n', '\\n')
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric['labelnames']
+        for labels, value in sorted(metric['series']):
+            if metric['type'] != 'histogram':
+                lines.append(f"{name}{_label_text(labelnames, labels)} {_format_value(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(metric['buckets'] + [math.inf], counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{name}_bucket{_label_text(labelnames, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_label_text(labelnames, labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+def create_metrics_registry_from_env() -> MetricsRegistry:
+    """
+    Build the process-wide registry.
+
+    RAHALAH_METRICS_DIR turns on multi-process aggregation through that
+    directory; RAHALAH_METRICS_FLUSH_INTERVAL sets how often, in seconds,
+    each worker writes its snapshot (1 by default).
+    """
+    registry = MetricsRegistry()
+    directory = os.getenv('RAHALAH_METRICS_DIR')
+    if directory:
+        registry.enable_multiprocess(directory, float(os.getenv('RAHALAH_METRICS_FLUSH_INTERVAL', '1')))
+        atexit.register(registry.flush)
+    return registry
+
+
+metrics = create_metrics_registry_from_env()
+os.register_at_fork(after_in_child=metrics._after_fork)
+
+
+# Agent system instrumentation
+
+def method_of(instance: Any, name: str) -> Callable:
+    """
+    The method ``name`` of ``instance``, to be wrapped and set on the instance.
+
+    Returns the instance attribute if one is already set (another wrapper).
+    Otherwise returns a function that looks the method up on the class at
+    each call, so wrappers attached to or removed from the class later
+    (utils/apply_debugging.py) still take effect for this instance.
+    """
+    if name in vars(instance):
+        return vars(instance)[name]
+    cls = type(instance)
+    method = getattr(cls, name)
+
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def aforward(*args: Any, **kwargs: Any) -> Any:
+            return await getattr(cls, name)(instance, *args, **kwargs)
+        return aforward
+
+    @functools.wraps(method)
+    def forward(*args: Any, **kwargs: Any) -> Any:
+        return getattr(cls, name)(instance, *args, **kwargs)
+    return forward
+
+
+def _timed_method(method: Callable, histogram: Histogram, outcomes: Counter, label: str) -> Callable:
+    duration = histogram.labels(label)
+    succeeded = outcomes.labels(label, 'ok')
+    failed = outcomes.labels(label, 'error')
+
+    @functools.wraps(method)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start_time = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception:
+            failed.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - start_time)
+        succeeded.inc()
+        return result
+
+    return wrapper
+
+
+def _atimed_method(method: Callable, histogram: Histogram, outcomes: Counter, label: str) -> Callable:
+    duration = histogram.labels(label)
+    succeeded = outcomes.labels(label, 'ok')
+    failed = outcomes.labels(label, 'error')
+
+    @functools.wraps(method)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start_time = time.perf_counter()
+        try:
+            result = await method(*args, **kwargs)
+        except Exception:
+            failed.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - start_time)
+        succeeded.inc()
+        return result
+
+    return wrapper
+
+
+def _provider_method(method: Callable, searches: Counter, duration: Histogram, provider: Any) -> Callable:
+    labels = (provider.name, provider.kind)
+
+    def record(result: Any) -> Any:
+        searches.labels(*labels, 'ok' if result.ok else 'failed').inc()
+        duration.labels(*labels).observe(result.elapsed)
+        return result
+
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def awrapper(params: Any) -> Any:
+            try:
+                result = await method(params)
+            except Exception:
+                searches.labels(*labels, 'error').inc()
+                raise
+            return record(result)
+        return awrapper
+
+    @functools.wraps(method)
+    def wrapper(params: Any) -> Any:
+        try:
+            result = method(params)
+        except Exception:
+            searches.labels(*labels, 'error').inc()
+            raise
+        return record(result)
+    return wrapper
+
+
+def instrument_agent_system(master_agent: Any, registry: MetricsRegistry = metrics) -> Any:
+    """
+    Record routing, agent and inventory provider metrics for an agent system.
+
+    Wraps ``route`` on the master agent, ``process_request`` (and
+    ``aprocess_request`` where an agent implements it natively) on every
+    registered agent, and ``search``/``asearch`` on the inventory providers
+    the agents use. Only these instances are affected; calling it again on
+    the same system does nothing.
+
+    Returns:
+        The master agent
+    """
+    from agents.base_agent import BaseAgent
+
+    if getattr(master_agent, '_metrics_registry', None) is registry:
+        return master_agent
+    master_agent._metrics_registry = registry
+
+    routing_duration = registry.histogram('rahalah_routing_duration_seconds', 'Time spent scoring agents for a request')
+    routed = registry.counter('rahalah_routed_requests_total', 'Requests by highest scoring agent', ('agent',))
+    route = method_of(master_agent, 'route')
+
+    @functools.wraps(route)
+    def timed_route(request: Any) -> Any:
+        routing = route(request)
+        routing_duration.observe(routing.timings['routing'])
+        routed.labels(routing.selected_agent or 'none').inc()
+        return routing
+
+    master_agent.route = timed_route
+
+    agent_duration = registry.histogram('rahalah_agent_duration_seconds', 'Time spent in an agent\'s process_request',
+                                        ('agent',))
+    agent_requests = registry.counter('rahalah_agent_requests_total', 'Requests processed by each agent',
+                                      ('agent', 'outcome'))
+    searches = registry.counter('rahalah_provider_searches_total', 'Inventory provider searches',
+                                ('provider', 'kind', 'outcome'))
+    search_duration = registry.histogram('rahalah_provider_search_duration_seconds',
+                                         'Time spent in inventory provider searches', ('provider', 'kind'))
+
+    providers = {}
+    for agent_id, agent in master_agent.specialized_agents.items():
+        agent.process_request = _timed_method(method_of(agent, 'process_request'), agent_duration, agent_requests,
+                                              agent_id)
+        # The default aprocess_request calls process_request, which is already timed
+        if type(agent).aprocess_request is not BaseAgent.aprocess_request:
+            agent.aprocess_request = _atimed_method(method_of(agent, 'aprocess_request'), agent_duration,
+                                                    agent_requests, agent_id)
+        provider = getattr(agent, 'provider', None)
+        if provider is not None:
+            providers[id(provider)] = provider
+
+    for provider in providers.values():
+        provider.search = _provider_method(method_of(provider, 'search'), searches, search_duration, provider)
+        provider.asearch = _provider_method(method_of(provider, 'asearch'), searches, search_duration, provider)
+
+    return master_agent
@@ -0,0 +1,507 @@
+"""
+Columnar store of search results for server-side filtering and paging.
+
+Each search's offers (in the schema of ``agents/offers.py``) are copied once
+into typed NumPy columns: price, duration in minutes, departure time and
+minute of day, stops and an airline code for flights, and rating, stars,
+reviews and an amenity matrix for hotels. Filters then become vectorized
+comparisons, sorts a single stable ``argsort`` over the rows that survive,
+and only the requested page of offer dicts is handed back for encoding.
+
+Searches are kept by an opaque ``search_id`` in a bounded, expiring LRU, so
+the front end can re-filter and page through them without the search being
+run again. Pages can be trimmed to the fields a client needs
+(``project_offers``), and an opaque cursor (``encode_cursor``) lets a client
+ask for the next page of a chat response.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('rahalah.offer_store')
+
+FLIGHTS = 'flights'
+HOTELS = 'hotels'
+PACKAGES = 'packages'
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+
+# Sort names accepted per kind; "-name" sorts descending. Offers missing
+# the value always come last
+SORT_KEYS = {
+    FLIGHTS: ('price', 'duration', 'departure', 'stops'),
+    HOTELS: ('price', 'rating', 'stars', 'reviews'),
+    PACKAGES: ('price', 'savings', 'rating', 'nights'),
+}
+
+def _float_column(offers: Sequence[Dict[str, Any]], key: str) -> np.ndarray:
+    """Numeric column with NaN where the offer has no value."""
+    return np.fromiter((np.nan if offer.get(key) is None else offer[key] for offer in offers),
+                       dtype=np.float64, count=len(offers))
+
+
+def _datetime_column(offers: Sequence[Dict[str, Any]], key: str) -> np.ndarray:
+    """"YYYY-MM-DD HH:MM" column as datetime64[m], NaT where missing or unreadable."""
+    texts = [(offer.get(key) or 'NaT').replace(' ', 'T') for offer in offers]
+    try:
+        return np.array(texts, dtype='datetime64[m]')
+    except ValueError:
+        column = np.full(len(texts), np.datetime64('NaT'), dtype='datetime64[m]')
+        for row, text in enumerate(texts):
+            try:
+                column[row] = np.datetime64(text, 'm')
+            except ValueError:
+                pass
+        return column
+
+
+def _clock_minutes(text: str) -> int:
+    """Minutes since midnight for "HH:MM"; raises ValueError otherwise."""
+    hours, _, minutes = text.strip().partition(':')
+    value = int(hours) * 60 + int(minutes or 0)
+    if not 0 <= value < 24 * 60:
+        raise ValueError(f"Invalid time of day: {text!r}")
+    return value
+
+
+class OfferPage:
+    """One page of a filtered, sorted search."""
+
+    __slots__ = ('total', 'offset', 'limit', 'offers')
+
+    def __init__(self, total: int, offset: int, limit: int, offers: List[Dict[str, Any]]) -> None:
+        self.total = total
+        self.offset = offset
+        self.limit = limit
+        self.offers = offers
+
+    @property
+    def has_more(self) -> bool:
+        return self.offset + len(self.offers) < self.total
+
+
+class OfferIndex:
+    """Typed columns over one search's offers."""
+
+    def __init__(self, kind: str, offers: Sequence[Dict[str, Any]]) -> None:
+        """
+        Args:
+            kind: FLIGHTS or HOTELS
+            offers: Normalized offers; kept as is and returned by reference
+        """
+        if kind not in SORT_KEYS:
+            raise ValueError(f"Unknown offer kind: {kind}")
+        self.kind = kind
+        self.offers = list(offers)
+        self.price = _float_column(self.offers, 'price')
+        if kind == FLIGHTS:
+            self._build_flight_columns()
+        elif kind == HOTELS:
+            self._build_hotel_columns()
+        else:
+            self._build_package_columns()
+
+    def _build_flight_columns(self) -> None:
+        offers = self.offers
+        self.duration = _float_column(offers, 'duration_minutes')
+        self.departure = _datetime_column(offers, 'departure')
+        missing = np.isnat(self.departure)
+        minutes = self.departure.astype(np.int64) % (24 * 60)
+        self.departure_minute = np.where(missing, -1, minutes).astype(np.int16)
+        self.departure_sort = np.where(missing, np.nan, self.departure.astype(np.int64).astype(np.float64))
+        self.stops = np.fromiter((offer.get('stops') or 0 for offer in offers), dtype=np.int8, count=len(offers))
+        codes: Dict[str, int] = {}
+        self.airline = np.fromiter((codes.setdefault(offer.get('airline') or '', len(codes)) for offer in offers),
+                                   dtype=np.int16, count=len(offers))
+        self.airline_names = list(codes)
+
+    def _build_hotel_columns(self) -> None:
+        offers = self.offers
+        self.rating = _float_column(offers, 'rating')
+        self.stars = np.fromiter((offer.get('stars') or 0 for offer in offers), dtype=np.int8, count=len(offers))
+        self.reviews = _float_column(offers, 'reviews')
+        vocabulary: Dict[str, int] = {}
+        for offer in offers:
+            for amenity in offer.get('amenities') or ():
+                vocabulary.setdefault(amenity.lower(), len(vocabulary))
+        self.amenity_names = vocabulary
+        self.amenities = np.zeros((len(offers), len(vocabulary)), dtype=bool)
+        for row, offer in enumerate(offers):
+            for amenity in offer.get('amenities') or ():
+                self.amenities[row, vocabulary[amenity.lower()]] = True
+
+    def _build_package_columns(self) -> None:
+        offers = self.offers
+        self.savings = _float_column(offers, 'savings')
+        self.nights = _float_column(offers, 'nights')
+        self.rating = np.fromiter((np.nan if (offer.get('hotel') or {}).get('rating') is None
+                                   else offer['hotel']['rating'] for offer in offers),
+                                  dtype=np.float64, count=len(offers))
+
+    def __len__(self) -> int:
+        return len(self.offers)
+
+    def _sort_values(self, name: str) -> np.ndarray:
+        if name == 'departure':
+            return self.departure_sort
+        if name in ('duration', 'rating', 'reviews', 'savings', 'nights'):
+            return getattr(self, name)
+        if name == 'stars':
+            return np.where(self.stars > 0, self.stars, np.nan)
+        if name == 'stops':
+            return self.stops.astype(np.float64)
+        return self.price
+
+    def mask(self, filters: Mapping[str, Any]) -> np.ndarray:
+        """
+        Rows matching every filter.
+
+        Args:
+            filters: Parsed filters (see parse_offer_query); keys that do not
+                apply to this kind are ignored
+
+        Returns:
+            Boolean array, one entry per offer
+        """
+        keep = np.ones(len(self.offers), dtype=bool)
+        # NaN compares False, so offers without a price drop out of price filters
+        if filters.get('price_min') is not None:
+            keep &= self.price >= filters['price_min']
+        if filters.get('price_max') is not None:
+            keep &= self.price <= filters['price_max']
+
+        if self.kind == FLIGHTS:
+            if filters.get('max_duration') is not None:
+                keep &= self.duration <= filters['max_duration']
+            if filters.get('max_stops') is not None:
+                keep &= self.stops <= filters['max_stops']
+            if filters.get('depart_after') is not None:
+                keep &= self.departure_minute >= filters['depart_after']
+            if filters.get('depart_before') is not None:
+                keep &= (self.departure_minute >= 0) & (self.departure_minute <= filters['depart_before'])
+            if filters.get('airlines'):
+                wanted = {name.lower() for name in filters['airlines']}
+                codes = [code for code, name in enumerate(self.airline_names) if name.lower() in wanted]
+                keep &= np.isin(self.airline, codes)
+        else:
+            if filters.get('min_rating') is not None:
+                keep &= self.rating >= filters['min_rating']
+        if self.kind == HOTELS:
+            if filters.get('stars'):
+                keep &= np.isin(self.stars, list(filters['stars']))
+            if filters.get('amenities'):
+                columns = [self.amenity_names.get(name.lower()) for name in filters['amenities']]
+                if None in columns:
+                    # Nobody offers one of the amenities
+                    keep[:] = False
+                else:
+                    keep &= self.amenities[:, columns].all(axis=1)
+        return keep
+
+    def query(self,
+              filters: Optional[Mapping[str, Any]] = None,
+              sort: Optional[str] = 'price',
+              offset: int = 0,
+              limit: int = DEFAULT_LIMIT) -> OfferPage:
+        """
+        Filter, sort and page the offers.
+
+        Args:
+            filters: Parsed filters (see parse_offer_query)
+            sort: One of SORT_KEYS for this kind, "-" prefixed for
+                descending, or None to keep the order the offers were stored in
+            offset: Matching offers to skip
+            limit: Offers to return
+
+        Returns:
+            The requested page and the number of matching offers
+        """
+        if not sort:
+            rows = np.flatnonzero(self.mask(filters)) if filters else None
+            total = len(self.offers) if rows is None else len(rows)
+            if rows is None:
+                page = self.offers[offset:offset + limit]
+            else:
+                page = [self.offers[i] for i in rows[offset:offset + limit]]
+            return OfferPage(total, offset, limit, page)
+
+        descending = sort.startswith('-')
+        name = sort.lstrip('-')
+        if name not in SORT_KEYS[self.kind]:
+            raise ValueError(f"Cannot sort {self.kind} by {name!r} "
+                             f"(expected one of {', '.join(SORT_KEYS[self.kind])})")
+
+        rows = np.flatnonzero(self.mask(filters or {}))
+        values = self._sort_values(name)[rows]
+        # Negating keeps NaN last and the stable sort keeps the provider's
+        # order between equal values
+        order = np.argsort(-values if descending else values, kind='stable')
+        page = rows[order[offset:offset + limit]]
+        return OfferPage(len(rows), offset, limit, [self.offers[i] for i in page])
+
+
+def _number(args: Mapping[str, Any], name: str, cast: Callable[[str], Any]) -> Any:
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid value for {name}: {value!r}")
+
+
+def _list(args: Mapping[str, Any], name: str) -> List[str]:
+    value = args.get(name)
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [item.strip() for item in value if item and item.strip()]
+
+
+def parse_offer_query(args: Mapping[str, Any]) -> Tuple[Dict[str, Any], str, int, int]:
+    """
+    Read filters, sort and paging from query string arguments.
+
+    Lists (``airlines``, ``stars``, ``amenities``) are comma separated;
+    ``depart_after``/``depart_before`` are "HH:MM".
+
+    Returns:
+        (filters, sort, offset, limit)
+
+    Raises:
+        ValueError: If an argument cannot be parsed
+    """
+    filters = {
+        'price_min': _number(args, 'price_min', float),
+        'price_max': _number(args, 'price_max', float),
+        'max_duration': _number(args, 'max_duration', int),
+        'max_stops': _number(args, 'max_stops', int),
+        'depart_after': _number(args, 'depart_after', _clock_minutes),
+        'depart_before': _number(args, 'depart_before', _clock_minutes),
+        'min_rating': _number(args, 'min_rating', float),
+        'airlines': _list(args, 'airlines'),
+        'amenities': _list(args, 'amenities'),
+    }
+    try:
+        filters['stars'] = [int(star) for star in _list(args, 'stars')]
+    except ValueError:
+        raise ValueError(f"Invalid value for stars: {args.get('stars')!r}")
+    offset = _number(args, 'offset', int) or 0
+    limit = _number(args, 'limit', int)
+    limit = DEFAULT_LIMIT if limit is None else limit
+    if offset < 0 or not 0 < limit <= MAX_LIMIT:
+        raise ValueError(f"offset must be >= 0 and limit between 1 and {MAX_LIMIT}")
+    return filters, args.get('sort') or 'price', offset, limit
+
+
+def parse_fields(value: Any) -> Optional[List[str]]:
+    """
+    Read a field projection given as a list or a comma separated string.
+
+    Returns:
+        Field paths, or None when every field is wanted
+
+    Raises:
+        ValueError: If the value is neither
+    """
+    if value in (None, '', []):
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, (list, tuple)) or not all(isinstance(field, str) for field in value):
+        raise ValueError("fields must be a list of field names or a comma separated string")
+    fields = [field.strip() for field in value if field.strip()]
+    return fields or None
+
+
+def _projector(fields: Sequence[str]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Compile a projection; dotted paths ("hotel.name") select inside nested
+    objects.
+    """
+    tree: Dict[str, Any] = {}
+    for field in fields:
+        node = tree
+        parts = field.split('.')
+        for part in parts[:-1]:
+            child = node.setdefault(part, {})
+            if child is None:
+                # A parent was already selected whole
+                break
+            node = child
+        else:
+            node[parts[-1]] = None
+
+    def project(value: Dict[str, Any], node: Dict[str, Any]) -> Dict[str, Any]:
+        result = {}
+        for key, child in node.items():
+            if key not in value:
+                continue
+            item = value[key]
+            result[key] = project(item, child) if child and isinstance(item, dict) else item
+        return result
+
+    return lambda offer: project(offer, tree)
+
+
+def project_offers(offers: Sequence[Dict[str, Any]], fields: Optional[Sequence[str]]) -> List[Dict[str, Any]]:
+    """
+    Keep only the given fields of each offer.
+
+    Args:
+        offers: Offers to trim; they are not modified
+        fields: Field paths such as "price" or "flight.airline", or None
+            to return the offers unchanged
+
+    Returns:
+        The projected offers
+    """
+    if not fields:
+        return list(offers)
+    project = _projector(fields)
+    return [project(offer) for offer in offers]
+
+
+def encode_cursor(search_id: str, offset: int, limit: int, fields: Optional[Sequence[str]] = None,
+                  sort: Optional[str] = None) -> str:
+    """Build the opaque cursor for the page starting at ``offset``."""
+    state: Dict[str, Any] = {'s': search_id, 'o': offset, 'l': limit}
+    if fields:
+        state['f'] = list(fields)
+    if sort:
+        state['q'] = sort
+    raw = json.dumps(state, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Read a cursor made by encode_cursor.
+
+    Returns:
+        Dict with search_id, offset, limit, fields and sort
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        state = json.loads(raw)
+        result = {
+            'search_id': str(state['s']),
+            'offset': int(state['o']),
+            'limit': int(state['l']),
+            'fields': parse_fields(state.get('f')),
+            'sort': state.get('q')
+        }
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValueError("Invalid cursor")
+    if result['offset'] < 0 or not 0 < result['limit'] <= MAX_LIMIT:
+        raise ValueError("Invalid cursor")
+    return result
+
+
+def search_id_for(kind: str, offers: Sequence[Dict[str, Any]]) -> str:
+    """
+    Opaque id for a result set; identical results share an id.
+
+    The whole content of every offer is hashed, not just its ``id``: ids
+    repeat across different searches (mock hotels are numbered per city
+    and date, searchapi.io results without a token per position), and two
+    such searches must never share an index.
+    """
+    digest = hashlib.blake2b(kind.encode('utf-8'), digest_size=12)
+    for offer in offers:
+        digest.update(b'\0' + json.dumps(offer, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class OfferStore:
+    """
+    Recent searches' OfferIndexes by search id.
+
+    Bounded by entry count with least-recently-used eviction; entries expire
+    ``ttl`` seconds after they were stored. Thread-safe.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 1800.0,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Args:
+            max_entries: Searches kept
+            ttl: Seconds a search can be queried after it was stored
+            clock: Time source, replaceable for testing
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: 'OrderedDict[str, Tuple[float, OfferIndex]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, kind: str, offers: Sequence[Dict[str, Any]]) -> str:
+        """
+        Index a search's offers and return its search id.
+
+        Storing the same results again refreshes the existing entry
+        instead of building a second index.
+        """
+        search_id = search_id_for(kind, offers)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(search_id)
+            if entry is not None:
+                self._entries[search_id] = (now + self.ttl, entry[1])
+                self._entries.move_to_end(search_id)
+                return search_id
+
+        index = OfferIndex(kind, offers)
+        with self._lock:
+            self._entries[search_id] = (now + self.ttl, index)
+            self._entries.move_to_end(search_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return search_id
+
+    def get(self, search_id: str) -> Optional[OfferIndex]:
+        """Return a stored search, or None if unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(search_id)
+            if entry is None or entry[0] <= self.clock():
+                if entry is not None:
+                    del self._entries[search_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(search_id)
+            self.hits += 1
+            return entry[1]
+
+    def stats(self) -> Dict[str, int]:
+        """Return hits, misses and the number of stored searches."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+def create_offer_store_from_env() -> OfferStore:
+    """
+    Build the offer store configured by environment variables.
+
+    RAHALAH_OFFER_STORE_SIZE bounds the number of searches kept and
+    RAHALAH_OFFER_STORE_TTL how long, in seconds, each stays queryable.
+    """
+    return OfferStore(
+        max_entries=int(os.getenv('RAHALAH_OFFER_STORE_SIZE', '1024')),
+        ttl=float(os.getenv('RAHALAH_OFFER_STORE_TTL', '1800'))
+    )
@@ -0,0 +1,108 @@
+"""
+Compress static assets ahead of time.
+
+Writes ``.gz`` (and ``.br`` when brotli is installed) next to every text
+asset in ``static/``, ``css/`` and ``js/``, at the highest compression level
+since it is paid once rather than per request. The server sends these in
+place of the originals to clients that accept them. Files are skipped when
+their compressed copies are up to date, or when compression would not make
+them smaller::
+
+    python utils/precompress.py
+    python utils/precompress.py --clean
+"""
+
+import argparse
+import mimetypes
+import os
+import sys
+from typing import Dict, Iterator, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from utils.http_encoding import ENCODING_SUFFIXES, available_encodings, compress, is_compressible  # noqa: E402
+
+ASSET_DIRS = ('static', 'css', 'js')
+
+# Highest effort per coding; these run once per asset
+LEVELS = {'gzip': 9, 'br': 11}
+
+
+def iter_assets(directories: List[str]) -> Iterator[str]:
+    """Yield compressible files under the directories, skipping compressed copies."""
+    suffixes = tuple(ENCODING_SUFFIXES.values())
+    for directory in directories:
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in sorted(filenames):
+                if filename.endswith(suffixes):
+                    continue
+                path = os.path.join(dirpath, filename)
+                if is_compressible(mimetypes.guess_type(filename)[0]):
+                    yield path
+
+
+def precompress(directories: List[str], force: bool = False) -> Dict[str, int]:
+    """
+    Write compressed copies of the assets.
+
+    Returns:
+        Counts of files written, up to date and not worth compressing, and
+        original and compressed bytes of what was written
+    """
+    stats = {'written': 0, 'current': 0, 'skipped': 0, 'bytes': 0, 'compressed_bytes': 0}
+    for path in iter_assets(directories):
+        with open(path, 'rb') as handle:
+            body = handle.read()
+        mtime = os.stat(path).st_mtime
+        for coding in available_encodings():
+            target = path + ENCODING_SUFFIXES[coding]
+            if not force and os.path.exists(target) and os.stat(target).st_mtime >= mtime:
+                stats['current'] += 1
+                continue
+            compressed = compress(body, coding, LEVELS[coding])
+            if len(compressed) >= len(body):
+                if os.path.exists(target):
+                    os.remove(target)
+                stats['skipped'] += 1
+                continue
+            with open(target, 'wb') as handle:
+                handle.write(compressed)
+            stats['written'] += 1
+            stats['bytes'] += len(body)
+            stats['compressed_bytes'] += len(compressed)
+    return stats
+
+
+def clean(directories: List[str]) -> int:
+    """Remove compressed copies; returns how many were removed."""
+    removed = 0
+    suffixes = tuple(ENCODING_SUFFIXES.values())
+    for directory in directories:
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename.endswith(suffixes) and os.path.exists(os.path.join(dirpath, filename[:filename.rindex('.')])):
+                    os.remove(os.path.join(dirpath, filename))
+                    removed += 1
+    return removed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompress static assets")
+    parser.add_argument('directories', nargs='*', default=[os.path.join(ROOT_DIR, name) for name in ASSET_DIRS])
+    parser.add_argument('--force', action='store_true', help="Rewrite copies that are up to date")
+    parser.add_argument('--clean', action='store_true', help="Remove compressed copies instead")
+    args = parser.parse_args()
+
+    if args.clean:
+        print(f"Removed {clean(args.directories)} compressed files")
+        return
+    stats = precompress(args.directories, force=args.force)
+    ratio = stats['compressed_bytes'] / stats['bytes'] if stats['bytes'] else 1.0
+    print(f"Wrote {stats['written']} compressed files ({stats['bytes']:,} -> {stats['compressed_bytes']:,} bytes, "
+          f"{ratio:.0%}); {stats['current']} up to date, {stats['skipped']} not worth compressing")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+Sampling profiler for live traffic.
+
+A background thread wakes up ``rate`` times a second, reads the current
+stack of every other thread with ``sys._current_frames()`` and counts it.
+Nothing is installed in the profiled code (no tracing or profiling hooks),
+so the cost is one short stack walk per thread per sample, paid by the
+sampler thread. Counts are kept per wall-clock second for the last
+``window`` seconds, which lets ``collapsed`` and ``speedscope`` report any
+recent interval: collapsed stacks (``a;b;c 12``, one per line) for
+flamegraph.pl and similar tools, or a speedscope sampled profile for
+https://www.speedscope.app.
+
+Threads parked in an idle wait (a server loop in ``select``, a worker
+blocked on a queue) are skipped by default, so the profile shows where
+requests spend their time rather than how long the pool sat idle.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from types import CodeType
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('rahalah.profiler')
+
+# Deepest stack recorded; deeper frames (towards the root) are dropped
+MAX_DEPTH = 128
+
+# Leaf functions of threads that are waiting for work, by (file name, function)
+IDLE_FRAMES = frozenset({
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('socketserver.py', 'serve_forever'),
+    ('queue.py', 'get'),
+    ('base_events.py', '_run_once'),
+    ('thread.py', '_worker'),
+})
+
+Stack = Tuple[CodeType, ...]
+
+
+def frame_label(code: CodeType) -> str:
+    """Name a frame in collapsed output, e.g. ``route (master_agent.py:120)``."""
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples all thread stacks periodically and aggregates them in memory."""
+
+    def __init__(self, rate: float = 100.0, window: int = 300, include_idle: bool = False) -> None:
+        """
+        Args:
+            rate: Samples per second
+            window: Seconds of samples kept
+            include_idle: Also count threads waiting for work
+        """
+        if rate <= 0:
+            raise ValueError("Sample rate must be positive")
+        self.rate = float(rate)
+        self.window = max(1, int(window))
+        self.include_idle = include_idle
+        self._buckets: Deque[Tuple[int, Counter]] = deque(maxlen=self.window)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.samples = 0
+        self.sampling_time = 0.0
+        self.started_at: Optional[float] = None
+
+    @property
+    def interval(self) -> float:
+        return 1.0 / self.rate
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start sampling; does nothing if already running."""
+        if self.running:
+            return
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name='rahalah-profiler', daemon=True)
+        self._thread.start()
+        logger.info(f"Sampling profiler started at {self.rate:g} Hz, keeping {self.window}s")
+
+    def stop(self) -> None:
+        """Stop sampling; collected samples are kept."""
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        if thread is not threading.current_thread():
+            thread.join()
+        logger.info(f"Sampling profiler stopped after {self.samples} samples")
+
+    def reconfigure(self, rate: Optional[float] = None, window: Optional[int] = None) -> None:
+        """Change the sample rate or window without losing recent samples."""
+        if rate is not None:
+            if rate <= 0:
+                raise ValueError("Sample rate must be positive")
+            self.rate = float(rate)
+        if window is not None and max(1, int(window)) != self.window:
+            self.window = max(1, int(window))
+            with self._lock:
+                self._buckets = deque(self._buckets, maxlen=self.window)
+
+    def clear(self) -> None:
+        """Drop all collected samples."""
+        with self._lock:
+            self._buckets.clear()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        next_sample = time.perf_counter()
+        while not self._stop.is_set():
+            began = time.perf_counter()
+            self.sample(skip_thread=own_id)
+            self.sampling_time += time.perf_counter() - began
+            # Keep a fixed schedule, but never try to catch up on missed samples
+            next_sample = max(next_sample + self.interval, time.perf_counter())
+            self._stop.wait(next_sample - time.perf_counter())
+
+    def sample(self, skip_thread: Optional[int] = None) -> None:
+        """Record the current stack of every thread but ``skip_thread``."""
+        stacks: List[Stack] = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == skip_thread:
+                continue
+            code = frame.f_code
+            if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                continue
+            codes = []
+            while frame is not None and len(codes) < MAX_DEPTH:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            codes.reverse()
+            stacks.append(tuple(codes))
+
+        second = int(time.time())
+        with self._lock:
+            if not self._buckets or self._buckets[-1][0] != second:
+                self._buckets.append((second, Counter()))
+            counts = self._buckets[-1][1]
+            for stack in stacks:
+                counts[stack] += 1
+        self.samples += 1
+
+    def counts(self, seconds: Optional[float] = None) -> Counter:
+        """
+        Aggregate sample counts per stack.
+
+        Args:
+            seconds: Only the last this many seconds (the whole window by default)
+        """
+        since = time.time() - seconds if seconds else 0
+        totals: Counter = Counter()
+        with self._lock:
+            for second, counts in self._buckets:
+                if second + 1 > since:
+                    totals.update(counts)
+        return totals
+
+    def collapsed(self, seconds: Optional[float] = None) -> str:
+        """Collapsed stacks, root first, most sampled first: ``a;b;c 12``."""
+        labels: Dict[CodeType, str] = {}
+        lines = []
+        for stack, count in self.counts(seconds).most_common():
+            names = []
+            for code in stack:
+                if code not in labels:
+                    labels[code] = frame_label(code).replace(';', ':')
+                names.append(labels[code])
+            lines.append(f"{';'.join(names)} {count}")
+        return '\n'.join(lines) + ('\n' if lines else '')
+
+    def speedscope(self, seconds: Optional[float] = None, name: str = 'rahalah') -> Dict[str, Any]:
+        """
+        A speedscope sampled profile of the last ``seconds``.
+
+        Each distinct stack is one sample weighted by the time it represents
+        (count / rate), so the file stays small however long the interval.
+        """
+        frame_index: Dict[CodeType, int] = {}
+        frames: List[Dict[str, Any]] = []
+        samples: List[List[int]] = []
+        weights: List[float] = []
+        for stack, count in self.counts(seconds).most_common():
+            indexes = []
+            for code in stack:
+                if code not in frame_index:
+                    frame_index[code] = len(frames)
+                    frames.append({
+                        'name': getattr(code, 'co_qualname', code.co_name),
+                        'file': code.co_filename,
+                        'line': code.co_firstlineno
+                    })
+                indexes.append(frame_index[code])
+            samples.append(indexes)
+            weights.append(count / self.rate)
+        total = sum(weights)
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'rahalah',
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': total,
+                'samples': samples,
+                'weights': weights
+            }]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Sampler settings and self-measured cost."""
+        with self._lock:
+            stacks = sum(len(counts) for _, counts in self._buckets)
+            retained = (self._buckets[-1][0] - self._buckets[0][0] + 1) if self._buckets else 0
+        return {
+            'running': self.running,
+            'rate': self.rate,
+            'window': self.window,
+            'include_idle': self.include_idle,
+            'samples': self.samples,
+            'distinct_stacks': stacks,
+            'retained_seconds': retained,
+            'mean_sample_seconds': self.sampling_time / self.samples if self.samples else 0.0,
+            # Share of one core spent sampling while running
+            'overhead': self.sampling_time * self.rate / self.samples if self.samples else 0.0
+        }
@@ -0,0 +1,432 @@
+"""
+Capture live /process_message traffic and replay it as a load test.
+
+``RequestRecorder`` appends each captured request to a JSON-lines file, one
+compact object per request, written off the request thread through the log
+pipeline (utils/log_pipeline.py)::
+
+    {"ts": 1760790000.123, "method": "POST", "path": "/process_message", "query": "",
+     "headers": {"Content-Type": "application/json"}, "session": "3f0c9a1b2d4e5f60",
+     "body": {"message": "hotel in Dubai"}, "status": 200, "duration": 0.0123}
+
+Only the headers in ``RECORDED_HEADERS`` are kept. The client's session id
+is replaced by a short hash (``session``), so a replay keeps requests of
+one conversation together without storing the id itself. With
+``min_duration`` set, only requests at least that slow are kept. The file
+rotates by size like the debug logs. Recording is controlled by
+``DebugConfig.record_requests`` and ``DebugConfig.record_min_duration``;
+``capture_request`` (Flask) and the ASGI app feed it.
+
+``replay_in_process`` and ``replay_http`` send captured requests again,
+to the Flask app through its test client or to a running server over HTTP,
+with a fixed number of requests in flight. Requests go as fast as they can
+by default, at a fixed ``rate``, or with the recorded gaps between them
+divided by ``speed``. When paced, latency is measured from the time each
+request was due, so a server that falls behind shows it in the
+percentiles instead of silently slowing the replay::
+
+    python utils/replay.py debug_logs/captured_requests.jsonl --concurrency 8 --rate 50
+    python utils/replay.py debug_logs/captured_requests.jsonl* --url http://127.0.0.1:8090 --speed 2
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from utils.log_pipeline import BatchedRotatingFileHandler, LazyJSON, install as install_log_pipeline  # noqa: E402
+
+DEFAULT_CAPTURE_FILE = os.path.join(ROOT_DIR, 'debug_logs', 'captured_requests.jsonl')
+
+# Request headers kept in the capture; they change how the response is built
+RECORDED_HEADERS = ('Content-Type', 'Accept', 'Accept-Encoding')
+
+# Cookie carrying the session id (server.SESSION_COOKIE)
+SESSION_COOKIE = 'rahalah_session'
+
+
+def session_key(session_id: Optional[str]) -> Optional[str]:
+    """Short stable stand-in for a session id."""
+    if not session_id:
+        return None
+    return hashlib.sha256(session_id.encode('utf-8')).hexdigest()[:16]
+
+
+class RequestRecorder:
+    """Appends captured requests to a JSON-lines file."""
+
+    def __init__(self, path: str = DEFAULT_CAPTURE_FILE, min_duration: float = 0.0,
+                 max_bytes: int = 100 * 1024 * 1024, backup_count: int = 5) -> None:
+        """
+        Args:
+            path: File the requests are appended to
+            min_duration: Only record requests that took at least this many seconds
+            max_bytes: Size at which the file is rotated
+            backup_count: Rotated files kept
+        """
+        self.path = path
+        self.min_duration = min_duration
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.enabled = False
+        self.recorded = 0
+        self.skipped = 0
+        self._output: Optional[logging.Logger] = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> logging.Logger:
+        with self._lock:
+            if self._output is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                output = logging.getLogger(f'rahalah.captures.{id(self)}')
+                output.propagate = False
+                output.setLevel(logging.INFO)
+                handler = BatchedRotatingFileHandler(self.path, self.max_bytes, self.backup_count)
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                output.addHandler(handler)
+                install_log_pipeline(output)
+                self._output = output
+        return self._output
+
+    def record(self, method: str, path: str, query: str, headers: Mapping[str, str], body: bytes, status: int,
+               started: float, duration: float, session_id: Optional[str] = None) -> bool:
+        """
+        Append one request, unless it was faster than ``min_duration``.
+
+        Args:
+            method: HTTP method
+            path: Request path
+            query: Raw query string
+            headers: Request headers (case-insensitive mapping)
+            body: Raw request body
+            status: Response status code
+            started: Wall-clock time the request arrived
+            duration: Seconds taken to handle it
+            session_id: The session the server used for it
+
+        Returns:
+            Whether the request was recorded
+        """
+        if duration < self.min_duration:
+            self.skipped += 1
+            return False
+
+        entry: Dict[str, Any] = {
+            'ts': round(started, 3),
+            'method': method,
+            'path': path,
+            'query': query,
+            'headers': {name: headers[name] for name in RECORDED_HEADERS if headers.get(name)},
+            'session': session_key(session_id),
+        }
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            # The session travels as ``session``; replays assign their own ids
+            data.pop('session_id', None)
+            entry['body'] = data
+        elif body:
+            entry['text'] = body.decode('utf-8', errors='replace')
+        entry['status'] = status
+        entry['duration'] = round(duration, 6)
+
+        self._open().info('%s', LazyJSON(entry))
+        self.recorded += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'path': self.path,
+            'min_duration': self.min_duration,
+            'recorded': self.recorded,
+            'skipped': self.skipped
+        }
+
+
+def session_from_cookies(set_cookie_headers: Iterable[str]) -> Optional[str]:
+    """The session id in a response's Set-Cookie headers, if any."""
+    for header in set_cookie_headers:
+        cookie = SimpleCookie()
+        try:
+            cookie.load(header)
+        except Exception:
+            continue
+        if SESSION_COOKIE in cookie:
+            return cookie[SESSION_COOKIE].value
+    return None
+
+
+def create_recorder_from_env() -> RequestRecorder:
+    """
+    Build the process-wide request recorder.
+
+    RAHALAH_RECORD_REQUESTS turns recording on, RAHALAH_CAPTURE_FILE sets
+    the file (debug_logs/captured_requests.jsonl) and
+    RAHALAH_RECORD_MIN_DURATION the shortest request duration recorded, in
+    seconds (0, record everything). RAHALAH_CAPTURE_MAX_BYTES and
+    RAHALAH_CAPTURE_BACKUPS size the rotation.
+    """
+    recorder = RequestRecorder(
+        path=os.getenv('RAHALAH_CAPTURE_FILE') or DEFAULT_CAPTURE_FILE,
+        min_duration=float(os.getenv('RAHALAH_RECORD_MIN_DURATION', '0')),
+        max_bytes=int(os.getenv('RAHALAH_CAPTURE_MAX_BYTES', str(100 * 1024 * 1024))),
+        backup_count=int(os.getenv('RAHALAH_CAPTURE_BACKUPS', '5'))
+    )
+    recorder.enabled = os.getenv('RAHALAH_RECORD_REQUESTS', 'false').lower() in ('true', '1', 'yes')
+    return recorder
+
+
+request_recorder = create_recorder_from_env()
+
+
+# Replay
+
+def load_requests(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    """Read captured requests from one or more files, oldest first; malformed lines are skipped."""
+    entries = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and 'method' in entry and 'path' in entry:
+                    entries.append(entry)
+    entries.sort(key=lambda entry: entry.get('ts', 0))
+    return entries
+
+
+def schedule(entries: List[Dict[str, Any]], rate: Optional[float] = None,
+             speed: Optional[float] = None) -> Optional[List[float]]:
+    """
+    Seconds after the start of the replay at which each request is due.
+
+    Args:
+        entries: Captured requests, oldest first
+        rate: Send this many requests per second
+        speed: Keep the recorded gaps, divided by this factor
+
+    Returns:
+        One offset per request, or None to send them as fast as possible
+    """
+    if rate:
+        return [index / rate for index in range(len(entries))]
+    if speed:
+        first = entries[0].get('ts', 0) if entries else 0
+        return [(entry.get('ts', first) - first) / speed for entry in entries]
+    return None
+
+
+def build_request(entry: Dict[str, Any], run_id: str) -> Tuple[str, str, Dict[str, str], Optional[bytes]]:
+    """Return the method, target, headers and body to send for a captured request."""
+    target = entry['path'] + (f"?{entry['query']}" if entry.get('query') else '')
+    headers = dict(entry.get('headers') or {})
+    if entry.get('session'):
+        headers['X-Session-ID'] = f"replay-{run_id}-{entry['session']}"
+    if 'body' in entry:
+        body: Optional[bytes] = json.dumps(entry['body']).encode('utf-8')
+    elif 'text' in entry:
+        body = entry['text'].encode('utf-8')
+    else:
+        body = None
+    return entry['method'], target, headers, body
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """The value below which ``fraction`` of a sorted list falls."""
+    return ordered[int(fraction * (len(ordered) - 1))] if ordered else 0.0
+
+
+def summarize(latencies: List[float], statuses: Dict[str, int], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Throughput, latency percentiles and outcomes of a replay."""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': dict(sorted(statuses.items())),
+        'elapsed': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 0.50),
+        'p90': percentile(latencies, 0.90),
+        'p99': percentile(latencies, 0.99),
+        'p999': percentile(latencies, 0.999)
+    }
+
+
+def replay_in_process(app: Any, entries: List[Dict[str, Any]], concurrency: int = 1,
+                      offsets: Optional[List[float]] = None) -> Dict[str, Any]:
+    """
+    Replay captured requests through a Flask app's test client.
+
+    Args:
+        app: The Flask app
+        entries: Captured requests, in the order they are sent
+        concurrency: Worker threads, each with one request in flight
+        offsets: When each request is due (see ``schedule``); None sends them back to back
+
+    Returns:
+        The replay summary (see ``summarize``)
+    """
+    run_id = uuid.uuid4().hex[:8]
+    requests = [build_request(entry, run_id) for entry in entries]
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    next_index = 0
+    lock = threading.Lock()
+
+    def worker() -> None:
+        nonlocal next_index, errors
+        client = app.test_client(use_cookies=False)
+        while True:
+            with lock:
+                index = next_index
+                next_index += 1
+            if index >= len(requests):
+                return
+            method, target, headers, body = requests[index]
+            began = time.perf_counter()
+            if offsets is not None:
+                due = start_time + offsets[index]
+                if due > began:
+                    time.sleep(due - began)
+                began = due
+            try:
+                status = str(client.open(target, method=method, headers=headers, data=body).status_code)
+            except Exception:
+                status = 'error'
+            latency = time.perf_counter() - began
+            with lock:
+                latencies.append(latency)
+                statuses[status] = statuses.get(status, 0) + 1
+                if not status.startswith('2'):
+                    errors += 1
+
+    threads = [threading.Thread(target=worker, name=f'rahalah-replay-{n}', daemon=True)
+               for n in range(max(1, concurrency))]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, statuses, errors, time.perf_counter() - start_time)
+
+
+async def replay_http(base_url: str, entries: List[Dict[str, Any]], concurrency: int = 1,
+                      offsets: Optional[List[float]] = None) -> Dict[str, Any]:
+    """
+    Replay captured requests against a running server over keep-alive connections.
+
+    Takes the same arguments as ``replay_in_process``, with the server's
+    base URL in place of the app.
+    """
+    from utils.load_test import Connection
+
+    url = urlsplit(base_url)
+    run_id = uuid.uuid4().hex[:8]
+    requests = [build_request(entry, run_id) for entry in entries]
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index, errors
+        connection = Connection(url.hostname, url.port or 80)
+        try:
+            while next_index < len(requests):
+                index = next_index
+                next_index += 1
+                method, target, headers, body = requests[index]
+                began = time.perf_counter()
+                if offsets is not None:
+                    due = start_time + offsets[index]
+                    if due > began:
+                        await asyncio.sleep(due - began)
+                    began = due
+                try:
+                    status = str(await connection.request(method, target, body, headers))
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    connection.close()
+                    status = 'error'
+                latencies.append(time.perf_counter() - began)
+                statuses[status] = statuses.get(status, 0) + 1
+                if not status.startswith('2'):
+                    errors += 1
+        finally:
+            connection.close()
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return summarize(latencies, statuses, errors, time.perf_counter() - start_time)
+
+
+def _report(title: str, stats: Dict[str, Any]) -> None:
+    print(title)
+    print(f"  {stats['requests']} requests in {stats['elapsed']:.2f}s  {stats['throughput']:8.1f} req/s  "
+          f"errors {stats['errors']}  statuses {stats['statuses']}")
+    print(f"  p50 {stats['p50'] * 1000:8.1f} ms  p90 {stats['p90'] * 1000:8.1f} ms  "
+          f"p99 {stats['p99'] * 1000:8.1f} ms  p99.9 {stats['p999'] * 1000:8.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay captured /process_message requests as a load test")
+    parser.add_argument('files', nargs='+', help="Capture files (rotated ones may be given too)")
+    parser.add_argument('--url', help="Base URL of a running server (default: the Flask app, in process)")
+    parser.add_argument('--concurrency', type=int, default=1, help="Requests in flight")
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument('--rate', type=float, help="Requests per second (default: as fast as possible)")
+    pacing.add_argument('--speed', type=float, help="Replay the recorded timing, this many times faster")
+    parser.add_argument('--requests', type=int,
+                        help="Requests to send, cycling through the capture if it has fewer")
+    args = parser.parse_args()
+
+    entries = load_requests(args.files)
+    if not entries:
+        parser.error("no captured requests in the given files")
+    if args.requests:
+        cycled = entries * (args.requests // len(entries) + 1)
+        if args.speed:
+            # Later passes follow the earlier ones in recorded time
+            span = entries[-1].get('ts', 0) - entries[0].get('ts', 0) + 1
+            cycled = [dict(entry, ts=entry.get('ts', 0) + span * (n // len(entries)))
+                      for n, entry in enumerate(cycled)]
+        entries = cycled[:args.requests]
+    offsets = schedule(entries, args.rate, args.speed)
+
+    recorded = summarize([entry['duration'] for entry in entries if 'duration' in entry], {}, 0, 0)
+    print(f"{len(entries)} requests from {len(args.files)} file(s), "
+          f"{len({entry.get('session') for entry in entries})} sessions; "
+          f"recorded server time p50 {recorded['p50'] * 1000:.1f} ms, p99 {recorded['p99'] * 1000:.1f} ms")
+
+    pace = f"{args.rate:g} req/s" if args.rate else f"{args.speed:g}x recorded speed" if args.speed else "unpaced"
+    if args.url:
+        stats = asyncio.run(replay_http(args.url, entries, args.concurrency, offsets))
+        _report(f"{args.url}, concurrency {args.concurrency}, {pace}", stats)
+    else:
+        # Request logging would dominate the measurements and bury the report
+        logging.disable(logging.ERROR)
+        import server
+        request_recorder.enabled = False
+        stats = replay_in_process(server.app, entries, args.concurrency, offsets)
+        _report(f"in process, concurrency {args.concurrency}, {pace}", stats)
+
+
+if __name__ == '__main__':
+    main()
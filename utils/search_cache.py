@@ -0,0 +1,454 @@
+"""
+Response cache for upstream travel searches.
+
+Search parameters are normalized into a canonical key (credentials such as
+``api_key`` are excluded), results are stored with a per-route TTL and an
+optional stale-while-revalidate window, and the total size of cached
+responses is bounded in bytes with least-recently-used eviction.
+
+Two backends are provided: ``MemoryCacheBackend`` for a single process and
+``SQLiteCacheBackend`` for sharing one cache between several workers on the
+same host.
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from utils.single_flight import AsyncSingleFlight, SingleFlight
+
+logger = logging.getLogger('rahalah.cache')
+
+# Parameters that never take part in the cache key
+EXCLUDED_PARAMS = frozenset({'api_key'})
+
+# Parameters whose values are codes and compared case-insensitively as upper case
+UPPERCASE_PARAMS = frozenset({'departure_id', 'arrival_id', 'currency', 'gl', 'hl'})
+
+
+def normalize_search_key(params: Dict[str, Any], exclude: Iterable[str] = EXCLUDED_PARAMS) -> str:
+    """
+    Build a canonical cache key from search parameters.
+
+    Keys are sorted, string values are stripped, code parameters are upper
+    cased and other strings lower cased, and empty values are dropped, so
+    equivalent searches map to the same key.
+
+    Args:
+        params: The search parameters sent upstream
+        exclude: Parameter names left out of the key
+
+    Returns:
+        The canonical key
+    """
+    normalized = []
+    for name in sorted(params):
+        if name in exclude:
+            continue
+        value = params[name]
+        if value is None or value == '':
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            value = value.upper() if name in UPPERCASE_PARAMS else value.lower()
+        normalized.append(f"{name}={value}")
+    return '&'.join(normalized)
+
+
+class CacheEntry:
+    """A serialized cached value with its freshness deadlines (wall-clock seconds)."""
+
+    __slots__ = ('value', 'expires_at', 'stale_until')
+
+    def __init__(self, value: bytes, expires_at: float, stale_until: float) -> None:
+        self.value = value
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache bounded by the total size of stored values."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        size = len(entry.value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous.value)
+            self._entries[key] = entry
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.value)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= len(entry.value)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    LRU cache stored in a local SQLite database.
+
+    Several worker processes can share one database file; SQLite's locking
+    serializes writers and WAL mode keeps readers from blocking.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS search_cache ('
+                ' key TEXT PRIMARY KEY,'
+                ' value BLOB NOT NULL,'
+                ' size INTEGER NOT NULL,'
+                ' expires_at REAL NOT NULL,'
+                ' stale_until REAL NOT NULL,'
+                ' last_access REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS search_cache_lru ON search_cache (last_access)')
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT value, expires_at, stale_until FROM search_cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute('UPDATE search_cache SET last_access = ? WHERE key = ?', (time.time(), key))
+        return CacheEntry(bytes(row[0]), row[1], row[2])
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        size = len(entry.value)
+        if size > self.max_bytes:
+            return
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?, ?)',
+                (key, sqlite3.Binary(entry.value), size, entry.expires_at, entry.stale_until, time.time())
+            )
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM search_cache').fetchone()[0]
+            while total > self.max_bytes:
+                oldest = conn.execute(
+                    'SELECT key, size FROM search_cache ORDER BY last_access LIMIT 1'
+                ).fetchone()
+                if oldest is None:
+                    break
+                conn.execute('DELETE FROM search_cache WHERE key = ?', (oldest[0],))
+                total -= oldest[1]
+                self.evictions += 1
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def delete(self, key: str) -> None:
+        self._connection().execute('DELETE FROM search_cache WHERE key = ?', (key,))
+
+    @property
+    def size_bytes(self) -> int:
+        return self._connection().execute('SELECT COALESCE(SUM(size), 0) FROM search_cache').fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM search_cache').fetchone()[0]
+
+
+class SearchCache:
+    """
+    TTL cache for search results with stale-while-revalidate.
+
+    A fresh entry is returned directly. An expired entry still inside its
+    stale window is returned immediately while one background refresh per key
+    fetches a new value. Anything else is a miss and is fetched synchronously;
+    concurrent misses for the same key share one fetch through ``SingleFlight``.
+
+    ``aget_or_fetch`` is the asyncio counterpart used by the ASGI app; it
+    shares the same backend and counters.
+    """
+
+    def __init__(self,
+                 backend: Any = None,
+                 default_ttl: float = 300.0,
+                 route_ttls: Optional[Dict[Tuple[str, str], float]] = None,
+                 stale_ttl: float = 600.0,
+                 single_flight: Optional[SingleFlight] = None,
+                 clock: Callable[[], float] = time.time) -> None:
+        """
+        Args:
+            backend: Storage backend (MemoryCacheBackend by default)
+            default_ttl: Seconds a result stays fresh
+            route_ttls: Fresh TTL overrides keyed by (departure_id, arrival_id)
+            stale_ttl: Seconds after expiry a result may still be served stale
+            single_flight: Coalescer for concurrent fetches (one is created if omitted)
+            clock: Wall-clock time source, replaceable for testing
+        """
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.default_ttl = default_ttl
+        self.route_ttls = {(dep.upper(), arr.upper()): ttl for (dep, arr), ttl in (route_ttls or {}).items()}
+        self.stale_ttl = stale_ttl
+        self.single_flight = single_flight if single_flight is not None else SingleFlight()
+        self.async_single_flight = AsyncSingleFlight()
+        self._clock = clock
+        self._refreshing = set()
+        self._refresh_tasks = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def ttl_for(self, params: Dict[str, Any]) -> float:
+        """Return the fresh TTL for a search, honouring per-route overrides."""
+        route = (str(params.get('departure_id', '')).strip().upper(),
+                 str(params.get('arrival_id', '')).strip().upper())
+        return self.route_ttls.get(route, self.default_ttl)
+
+    def _store(self, key: str, params: Dict[str, Any], value: Any) -> None:
+        now = self._clock()
+        expires_at = now + self.ttl_for(params)
+        payload = json.dumps(value, separators=(',', ':')).encode('utf-8')
+        self.backend.set(key, CacheEntry(payload, expires_at, expires_at + self.stale_ttl))
+
+    def _refresh(self, key: str, params: Dict[str, Any], fetch: Callable[[], Any],
+                 cacheable: Callable[[Any], bool]) -> None:
+        """Fetch a new value for a stale entry; runs on a background thread."""
+        try:
+            self._fetch(key, params, fetch, cacheable)
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            logger.warning(f"Background refresh failed for {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _fetch(self, key: str, params: Dict[str, Any], fetch: Callable[[], Any],
+               cacheable: Callable[[Any], bool]) -> Tuple[Any, bool]:
+        """Fetch and store a value, coalescing with any identical fetch in flight."""
+        def fetch_and_store() -> Any:
+            value = fetch()
+            if cacheable(value):
+                self._store(key, params, value)
+            return value
+        return self.single_flight.do(key, fetch_and_store)
+
+    def _lookup(self, key: str) -> Tuple[Optional[CacheEntry], bool]:
+        """
+        Look up a key and update the counters.
+
+        Returns:
+            The usable entry (None on a miss) and whether the caller should
+            start a background refresh for it
+        """
+        entry = self.backend.get(key)
+        now = self._clock()
+
+        if entry is not None and now < entry.expires_at:
+            with self._lock:
+                self.hits += 1
+            return entry, False
+
+        if entry is not None and now < entry.stale_until:
+            with self._lock:
+                self.stale_hits += 1
+                start_refresh = key not in self._refreshing
+                if start_refresh:
+                    self._refreshing.add(key)
+            return entry, start_refresh
+
+        with self._lock:
+            self.misses += 1
+        return None, False
+
+    def get_or_fetch(self,
+                     params: Dict[str, Any],
+                     fetch: Callable[[], Any],
+                     cacheable: Callable[[Any], bool] = lambda value: True) -> Any:
+        """
+        Return the cached result for a search, fetching it if needed.
+
+        Args:
+            params: The search parameters (used for the key and route TTL)
+            fetch: Zero-argument callable that performs the upstream search
+            cacheable: Predicate deciding whether a fetched value is stored
+
+        Returns:
+            A freshly decoded copy of the result, safe for the caller to modify
+        """
+        key = normalize_search_key(params)
+        entry, start_refresh = self._lookup(key)
+        if entry is not None:
+            if start_refresh:
+                threading.Thread(target=self._refresh, args=(key, params, fetch, cacheable),
+                                 name='search-cache-refresh', daemon=True).start()
+            return json.loads(entry.value)
+
+        value, shared = self._fetch(key, params, fetch, cacheable)
+        # Every coalesced caller received the same object
+        return copy.deepcopy(value) if shared else value
+
+    async def _afetch(self, key: str, params: Dict[str, Any], fetch: Callable[[], Awaitable[Any]],
+                      cacheable: Callable[[Any], bool]) -> Tuple[Any, bool]:
+        """Async counterpart of ``_fetch``."""
+        async def fetch_and_store() -> Any:
+            value = await fetch()
+            if cacheable(value):
+                self._store(key, params, value)
+            return value
+        return await self.async_single_flight.do(key, fetch_and_store)
+
+    async def _arefresh(self, key: str, params: Dict[str, Any], fetch: Callable[[], Awaitable[Any]],
+                        cacheable: Callable[[Any], bool]) -> None:
+        """Async counterpart of ``_refresh``; runs as a background task."""
+        try:
+            await self._afetch(key, params, fetch, cacheable)
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            logger.warning(f"Background refresh failed for {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def aget_or_fetch(self,
+                            params: Dict[str, Any],
+                            fetch: Callable[[], Awaitable[Any]],
+                            cacheable: Callable[[Any], bool] = lambda value: True) -> Any:
+        """
+        Async counterpart of ``get_or_fetch`` taking a coroutine function.
+
+        Returns:
+            A freshly decoded copy of the result, safe for the caller to modify
+        """
+        key = normalize_search_key(params)
+        entry, start_refresh = self._lookup(key)
+        if entry is not None:
+            if start_refresh:
+                # Keep a reference so the task is not garbage collected mid-flight
+                task = asyncio.ensure_future(self._arefresh(key, params, fetch, cacheable))
+                self._refresh_tasks.add(task)
+                task.add_done_callback(self._refresh_tasks.discard)
+            return json.loads(entry.value)
+
+        value, shared = await self._afetch(key, params, fetch, cacheable)
+        return copy.deepcopy(value) if shared else value
+
+    def invalidate(self, params: Dict[str, Any]) -> None:
+        """Remove the cached result for a search."""
+        self.backend.delete(normalize_search_key(params))
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit, miss and eviction counters plus the cache size."""
+        # Counters are updated from the agents' thread pool; read them together
+        with self._lock:
+            counters = {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes
+            }
+        return {
+            **counters,
+            'coalesced': self.single_flight.coalesced + self.async_single_flight.coalesced,
+            'evictions': self.backend.evictions,
+            'entries': len(self.backend),
+            'size_bytes': self.backend.size_bytes
+        }
+
+
+def parse_route_ttls(spec: str) -> Dict[Tuple[str, str], float]:
+    """
+    Parse per-route TTLs written as ``DMM-RUH=60,JED-IST=900``.
+
+    Malformed entries are logged and skipped.
+    """
+    route_ttls = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        route, _, ttl = item.partition('=')
+        departure, _, arrival = route.strip().partition('-')
+        try:
+            if not departure or not arrival:
+                raise ValueError("expected DEPARTURE-ARRIVAL=SECONDS")
+            route_ttls[(departure.strip().upper(), arrival.strip().upper())] = float(ttl)
+        except ValueError as e:
+            logger.warning(f"Ignoring search cache route TTL {item!r}: {str(e)}")
+    return route_ttls
+
+
+def create_search_cache_from_env() -> SearchCache:
+    """
+    Build the search cache configured by environment variables.
+
+    RAHALAH_SEARCH_CACHE selects the backend ("memory", the default, or
+    "sqlite"), RAHALAH_SEARCH_CACHE_PATH the SQLite file,
+    RAHALAH_SEARCH_CACHE_MAX_BYTES the size bound and RAHALAH_SEARCH_CACHE_TTL /
+    RAHALAH_SEARCH_CACHE_STALE_TTL the freshness windows in seconds.
+    RAHALAH_SEARCH_CACHE_ROUTE_TTLS overrides the fresh TTL of single routes,
+    e.g. ``DMM-RUH=60,JED-IST=900``.
+    """
+    backend_name = os.getenv('RAHALAH_SEARCH_CACHE', 'memory').lower()
+    max_bytes = int(os.getenv('RAHALAH_SEARCH_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+    if backend_name == 'sqlite':
+        path = os.getenv('RAHALAH_SEARCH_CACHE_PATH', os.path.join('search_results', 'search_cache.sqlite3'))
+        backend = SQLiteCacheBackend(path, max_bytes=max_bytes)
+    else:
+        backend = MemoryCacheBackend(max_bytes=max_bytes)
+    return SearchCache(
+        backend=backend,
+        default_ttl=float(os.getenv('RAHALAH_SEARCH_CACHE_TTL', '300')),
+        route_ttls=parse_route_ttls(os.getenv('RAHALAH_SEARCH_CACHE_ROUTE_TTLS', '')),
+        stale_ttl=float(os.getenv('RAHALAH_SEARCH_CACHE_STALE_TTL', '600'))
+    )
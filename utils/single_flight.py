@@ -0,0 +1,154 @@
+"""
+Request coalescing for concurrent identical upstream calls.
+
+When several threads ask for the same key at once, only the first one (the
+leader) runs the call; the others wait for it and receive the same result,
+or the same exception. ``AsyncSingleFlight`` does the same for coroutines
+running on one event loop; there, if the leader is cancelled, one of its
+waiters runs the call instead of the cancellation spreading to them.
+"""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    """An in-flight call and the outcome shared with its waiters."""
+
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution."""
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run ``fn`` unless a call with the same key is already in flight.
+
+        Args:
+            key: Identity of the call, e.g. a normalized search key
+            fn: Zero-argument callable performing the call
+
+        Returns:
+            A tuple of the result and whether it was shared from another
+            caller's execution; shared results are the same object for every
+            waiter, so callers that modify them should copy first
+
+        Raises:
+            Exception: Whatever ``fn`` raised, re-raised in every waiter
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, int]:
+        """Return execution and coalescing counters."""
+        with self._lock:
+            in_flight = len(self._calls)
+        return {
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'in_flight': in_flight
+        }
+
+
+class _LeaderCancelled(Exception):
+    """Set on a shared call whose leader was cancelled; waiters retry the call."""
+
+
+class AsyncSingleFlight:
+    """Coalesces concurrent coroutine calls with the same key on one event loop."""
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await ``fn()`` unless a call with the same key is already in flight.
+
+        Args:
+            key: Identity of the call
+            fn: Zero-argument coroutine function performing the call
+
+        Returns:
+            A tuple of the result and whether it was shared, as for ``SingleFlight.do``
+        """
+        future = self._calls.get(key)
+        while future is not None:
+            self.coalesced += 1
+            try:
+                # Shield so a cancelled waiter does not cancel the shared call
+                return await asyncio.shield(future), True
+            except _LeaderCancelled:
+                # The leader's caller went away, not ours: run the call again,
+                # or join whoever already has
+                future = self._calls.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.executions += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Cancelling the future would cancel every waiter along with the leader
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self._calls[key]
+        return result, False
+
+    def stats(self) -> Dict[str, int]:
+        """Return execution and coalescing counters."""
+        return {
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._calls)
+        }
@@ -0,0 +1,440 @@
+"""
+Lightweight request tracing.
+
+Every traced request gets a trace id, whether or not it is sampled, and the
+id is attached to the debug log records written while handling it. Whether
+the request's spans are recorded is decided once, when the trace starts
+(head-based sampling): ``Tracer.sample_rate`` of requests are recorded. A
+W3C ``traceparent`` header lends the request its trace id; its sampled flag
+only forces recording when ``Tracer.honor_remote_sampling`` is set, since any
+client can send one. For the others ``span()`` returns a shared no-op object
+after one context variable lookup, so unsampled requests cost next to nothing.
+
+Spans of a sampled trace record wall-clock start and end times, a parent
+and attributes. The current span lives in a ``contextvars`` variable, so it
+follows asyncio tasks and ``asyncio.to_thread``; code that hands work to a
+thread pool should submit it through ``contextvars.copy_context().run``.
+Finished traces are kept in an in-memory ring (``Tracer.recent``), and can
+also be appended as one JSON object per line to a size-rotated file.
+
+``trace_agent_system`` adds spans for routing (with every agent's score),
+agents' ``process_request``, parameter extraction and inventory searches to an
+agent system built by ``AgentFactory``; ``utils/http_client.py`` adds one
+per upstream HTTP attempt.
+"""
+
+import functools
+import inspect
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from utils.log_pipeline import BatchedRotatingFileHandler, LazyJSON, install as install_log_pipeline
+from utils.metrics import method_of
+
+logger = logging.getLogger('rahalah.tracing')
+
+# The span new spans are children of, or a TraceContext for an unsampled trace
+_current: ContextVar[Any] = ContextVar('rahalah_current_span', default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[tuple]:
+    """
+    Parse a W3C traceparent header.
+
+    Returns:
+        (trace id, parent span id, sampled) or None when absent or malformed
+    """
+    if not header:
+        return None
+    parts = header.strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class TraceContext:
+    """The trace id of a request that is not being recorded."""
+
+    __slots__ = ('trace_id',)
+
+    def __init__(self, trace_id: str) -> None:
+        self.trace_id = trace_id
+
+
+class _NoopSpan:
+    """Stands in for a span when nothing is recorded."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+    def set(self, **attributes: Any) -> None:
+        return None
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Trace:
+    """The spans recorded for one request."""
+
+    def __init__(self, trace_id: str, name: str, remote_parent: Optional[str] = None) -> None:
+        self.trace_id = trace_id
+        self.name = name
+        self.remote_parent = remote_parent
+        self.spans: List['Span'] = []
+        self.root: Optional['Span'] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        root = self.root
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'start': root.start if root else None,
+            'duration': root.duration if root else None,
+            'remote_parent': self.remote_parent,
+            'spans': [span.to_dict() for span in list(self.spans)]
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        root = self.root
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'start': root.start if root else None,
+            'duration': root.duration if root else None,
+            'spans': len(self.spans),
+            'errors': sum(1 for span in list(self.spans) if span.error)
+        }
+
+
+class Span:
+    """A timed operation within a trace; use as a context manager."""
+
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'attributes', 'start', 'end', 'duration',
+                 'error', 'thread', '_started', '_token', '_on_finish')
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Dict[str, Any],
+                 on_finish: Optional[Callable[['Span'], None]] = None) -> None:
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start: float = 0.0
+        self.end: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self.thread = ''
+        self._token = None
+        self._on_finish = on_finish
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set(self, **attributes: Any) -> None:
+        """Add attributes to the span."""
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> 'Span':
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.thread = threading.current_thread().name
+        self.trace.spans.append(self)
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        self.duration = time.perf_counter() - self._started
+        self.end = self.start + self.duration
+        if exc is not None:
+            self.error = f"{type(exc).__name__}: {exc}"
+        _current.reset(self._token)
+        if self._on_finish is not None:
+            self._on_finish(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'end': self.end,
+            'duration': self.duration,
+            'thread': self.thread,
+            'error': self.error,
+            'attributes': self.attributes
+        }
+
+
+class _TraceScope:
+    """Context manager that makes a TraceContext current for an unsampled request."""
+
+    __slots__ = ('context', '_token')
+
+    def __init__(self, context: TraceContext) -> None:
+        self.context = context
+
+    @property
+    def trace_id(self) -> str:
+        return self.context.trace_id
+
+    def __enter__(self) -> '_TraceScope':
+        self._token = _current.set(self.context)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        _current.reset(self._token)
+
+    def set(self, **attributes: Any) -> None:
+        return None
+
+
+class Tracer:
+    """Starts traces, samples them and keeps the recent ones."""
+
+    def __init__(self, sample_rate: float = 0.0, capacity: int = 100, export_path: Optional[str] = None,
+                 max_bytes: int = 100 * 1024 * 1024, backup_count: int = 5,
+                 honor_remote_sampling: bool = False) -> None:
+        """
+        Args:
+            sample_rate: Fraction of traces recorded, 0 to 1
+            capacity: Finished traces kept in memory
+            export_path: JSON-lines file finished traces are appended to
+            max_bytes: Size at which the export file is rotated
+            backup_count: Rotated export files kept
+            honor_remote_sampling: Record every request whose traceparent
+                is marked sampled, whatever the sample rate
+        """
+        self.sample_rate = sample_rate
+        self.honor_remote_sampling = honor_remote_sampling
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.recent: Deque[Trace] = deque(maxlen=capacity)
+        self.started = 0
+        self.sampled = 0
+        self._exporter: Optional[logging.Logger] = None
+        self.export_path: Optional[str] = None
+        if export_path:
+            self.export_to(export_path)
+
+    def export_to(self, path: str) -> None:
+        """
+        Append every finished trace to ``path`` as one JSON line, written off
+        the request thread; the file rotates at ``max_bytes``.
+        """
+        exporter = logging.getLogger(f'rahalah.traces.{id(self)}')
+        exporter.propagate = False
+        exporter.setLevel(logging.INFO)
+        handler = BatchedRotatingFileHandler(path, self.max_bytes, self.backup_count)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        exporter.addHandler(handler)
+        install_log_pipeline(exporter)
+        self._exporter = exporter
+        self.export_path = path
+
+    def start_trace(self, name: str, traceparent: Optional[str] = None, **attributes: Any) -> Any:
+        """
+        Begin a trace for a request; use the result as a context manager.
+
+        Args:
+            name: Root span name, e.g. "POST /process_message"
+            traceparent: The request's traceparent header, if any; its
+                trace id is kept, and its sampled flag forces sampling when
+                ``honor_remote_sampling`` is set
+            attributes: Attributes of the root span
+
+        Returns:
+            The root Span when sampled, otherwise a scope that only carries
+            the trace id; both have ``trace_id`` and ``set``
+        """
+        self.started += 1
+        remote = parse_traceparent(traceparent)
+        trace_id = remote[0] if remote else _new_id(128)
+        sampled = ((self.honor_remote_sampling and remote is not None and remote[2])
+                   or (self.sample_rate > 0 and random.random() < self.sample_rate))
+        if not sampled:
+            return _TraceScope(TraceContext(trace_id))
+        self.sampled += 1
+        trace = Trace(trace_id, name, remote_parent=remote[1] if remote else None)
+        root = Span(trace, name, trace.remote_parent, attributes, on_finish=self._finish)
+        trace.root = root
+        return root
+
+    def _finish(self, root: Span) -> None:
+        trace = root.trace
+        self.recent.append(trace)
+        if self._exporter is not None:
+            self._exporter.info('%s', LazyJSON(trace.to_dict()))
+
+    def find(self, trace_id: str) -> Optional[Trace]:
+        for trace in reversed(self.recent):
+            if trace.trace_id == trace_id:
+                return trace
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'sample_rate': self.sample_rate,
+            'honor_remote_sampling': self.honor_remote_sampling,
+            'started': self.started,
+            'sampled': self.sampled,
+            'kept': len(self.recent),
+            'capacity': self.recent.maxlen,
+            'export_path': self.export_path
+        }
+
+
+def span(name: str, **attributes: Any) -> Any:
+    """
+    Start a child of the current span; use as a context manager.
+
+    Returns NOOP_SPAN when the current request is not being recorded.
+    """
+    parent = _current.get()
+    if not isinstance(parent, Span):
+        return NOOP_SPAN
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+def current_trace_id() -> Optional[str]:
+    """The trace id of the request being handled, sampled or not."""
+    current = _current.get()
+    return current.trace_id if current is not None else None
+
+
+def annotate(**attributes: Any) -> None:
+    """Add attributes to the current span, if it is being recorded."""
+    current = _current.get()
+    if isinstance(current, Span):
+        current.set(**attributes)
+
+
+def stamp_trace_id(record: logging.LogRecord) -> bool:
+    """Logging filter that adds ``trace_id`` ("-" outside a trace) to records."""
+    current = _current.get()
+    record.trace_id = current.trace_id if current is not None else '-'
+    return True
+
+
+def traced(method: Callable, name: str, **attributes: Any) -> Callable:
+    """Wrap a function or coroutine function so each call is a span of the current trace."""
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def awrapper(*args: Any, **kwargs: Any) -> Any:
+            if not isinstance(_current.get(), Span):
+                return await method(*args, **kwargs)
+            with span(name, **attributes):
+                return await method(*args, **kwargs)
+        return awrapper
+
+    @functools.wraps(method)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not isinstance(_current.get(), Span):
+            return method(*args, **kwargs)
+        with span(name, **attributes):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+EXTRACTION_METHODS = ('_extract_flight_params', '_extract_hotel_params', '_extract_package_params')
+
+
+def trace_agent_system(master_agent: Any) -> Any:
+    """
+    Record spans for an agent system's work.
+
+    Routing (one span, carrying every agent's score), each agent's
+    ``process_request`` (or native ``aprocess_request``), the shared request
+    parse, each agent's parameter extraction and inventory provider searches
+    become spans of the current trace. Only these instances are affected; calling it again does nothing.
+
+    Returns:
+        The master agent
+    """
+    from agents.base_agent import BaseAgent
+
+    if getattr(master_agent, '_traced', False):
+        return master_agent
+    master_agent._traced = True
+
+    route = method_of(master_agent, 'route')
+
+    @functools.wraps(route)
+    def traced_route(request: Any) -> Any:
+        if not isinstance(_current.get(), Span):
+            return route(request)
+        with span('route') as route_span:
+            routing = route(request)
+            route_span.set(selected_agent=routing.selected_agent, scores=dict(routing.scores))
+            return routing
+
+    master_agent.route = traced_route
+    if master_agent.parser is not None:
+        master_agent.parser.parse = traced(method_of(master_agent.parser, 'parse'), 'extract', agent='shared')
+
+    providers = {}
+    for agent_id, agent in master_agent.specialized_agents.items():
+        agent.process_request = traced(method_of(agent, 'process_request'), 'process_request', agent=agent_id)
+        if type(agent).aprocess_request is not BaseAgent.aprocess_request:
+            agent.aprocess_request = traced(method_of(agent, 'aprocess_request'), 'process_request', agent=agent_id)
+        for method_name in EXTRACTION_METHODS:
+            if hasattr(agent, method_name):
+                setattr(agent, method_name, traced(method_of(agent, method_name), 'extract', agent=agent_id,
+                                                   step=method_name[len('_extract_'):]))
+        provider = getattr(agent, 'provider', None)
+        if provider is not None:
+            providers[id(provider)] = provider
+
+    for provider in providers.values():
+        labels = {'provider': provider.name, 'kind': provider.kind}
+        provider.search = traced(method_of(provider, 'search'), 'provider.search', **labels)
+        provider.asearch = traced(method_of(provider, 'asearch'), 'provider.search', **labels)
+
+    return master_agent
+
+
+def create_tracer_from_env() -> Tracer:
+    """
+    Build the process-wide tracer.
+
+    RAHALAH_TRACE_SAMPLE_RATE is the fraction of requests recorded (0, off,
+    by default), RAHALAH_TRACE_BUFFER how many finished traces are kept in
+    memory (100) and RAHALAH_TRACE_FILE a JSON-lines file to append them to;
+    RAHALAH_TRACE_FILE_MAX_BYTES and RAHALAH_TRACE_FILE_BACKUPS size its
+    rotation. RAHALAH_TRACE_HONOR_TRACEPARENT lets a sampled traceparent
+    header force recording (off by default).
+    """
+    return Tracer(
+        sample_rate=float(os.getenv('RAHALAH_TRACE_SAMPLE_RATE', '0')),
+        capacity=int(os.getenv('RAHALAH_TRACE_BUFFER', '100')),
+        export_path=os.getenv('RAHALAH_TRACE_FILE') or None,
+        max_bytes=int(os.getenv('RAHALAH_TRACE_FILE_MAX_BYTES', str(100 * 1024 * 1024))),
+        backup_count=int(os.getenv('RAHALAH_TRACE_FILE_BACKUPS', '5')),
+        honor_remote_sampling=os.getenv('RAHALAH_TRACE_HONOR_TRACEPARENT', 'false').lower() in ('true', '1', 'yes')
+    )
+
+
+tracer = create_tracer_from_env()